@@ -0,0 +1,37 @@
+"""Agenda: every day a task falls on within a window, recurring tasks included.
+
+    python app.py agenda                         # the next 14 days
+    python app.py agenda --start 2026-01-01 --days 365 --limit 50
+
+Each task contributes a lazy generator of its occurrences in the window
+(recurrence.occurrences), and heapq.merge interleaves them by date. Only
+one pending occurrence per task is held at a time, so the cost up front
+follows the number of tasks, not the length of the window, and taking
+the first N entries only computes those.
+"""
+import heapq
+from datetime import date
+from typing import Iterable, Iterator, Tuple
+
+from recurrence import occurrences
+from reminders import is_pending, parse_due
+
+# What the agenda shows of each task; loads for it can leave the rest out.
+AGENDA_FIELDS = ("title", "priority", "due_date", "status", "recurring")
+
+
+def task_occurrences(record: dict, start: date, end: date) -> Iterator[Tuple[date, int, dict]]:
+    due = parse_due(record["due_date"])
+    if due is None:
+        # A stored date that does not parse (say, from a hand edit) leaves just that task out.
+        return
+    for day in occurrences(due, record.get("recurring"), start, end):
+        yield day, record["id"], record
+
+
+def agenda(records: Iterable[dict], start: date, end: date) -> Iterator[Tuple[date, dict]]:
+    """(day, task) for every occurrence of a pending task from start to end, by day and then task id."""
+    streams = [task_occurrences(record, start, end) for record in records
+               if is_pending(record.get("due_date"), record.get("status"))]
+    for day, _, record in heapq.merge(*streams):
+        yield day, record
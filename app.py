@@ -1,34 +1,80 @@
 import typer
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Confirm
-from datetime import datetime, timedelta
+from datetime import date, datetime
 import json
 import os
+import sys
 from typing import Optional, List
 
+from columnar import TAGS, due_ordinal, due_string, intern_value
+from recurrence import next_due_date
+import timings
+from startup import LazyConsole, run
+from storage import get_backend
+
 app = typer.Typer()
-console = Console()
+# Rich is imported on first print; `list --format json` never loads it.
+console = LazyConsole()
 
 DATA_FILE = "tasks.json"
 
+# What the task table shows; loads for it can leave the description out.
+TABLE_FIELDS = ("title", "priority", "status", "due_date", "tags", "recurring")
+# Stands in for a description left out of a projected load until it is used.
+NOT_LOADED = object()
+
+backend = get_backend(DATA_FILE)
+
 class Task:
-    def __init__(self, title, description, priority, due_date, tags, status="Pending", recurring=None):
+    # Slots instead of a per-instance __dict__; the due date is kept as a date
+    # ordinal and the tags as ids into the shared TAGS codebook, while the
+    # small set of priority/status/recurring values is interned.
+    __slots__ = ("title", "_description", "priority", "_due", "_tags", "status", "recurring", "id")
+
+    def __init__(self, title, description, priority, due_date, tags, status="Pending", recurring=None, id=None):
+        self.id = id
         self.title = title
         self.description = description
-        self.priority = priority
+        self.priority = intern_value(priority)
         self.due_date = due_date
         self.tags = tags
-        self.status = status
-        self.recurring = recurring
+        self.status = intern_value(status)
+        self.recurring = intern_value(recurring)
+
+    @property
+    def description(self):
+        if self._description is NOT_LOADED:
+            self._description = (backend.get(self.id) or {}).get("description", "")
+        return self._description
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+
+    @property
+    def due_date(self):
+        return due_string(self._due)
+
+    @due_date.setter
+    def due_date(self, value):
+        self._due = due_ordinal(value)
+
+    @property
+    def tags(self):
+        # A tuple, since it is rebuilt on every access: edits go through the setter.
+        return tuple(TAGS.value(i) for i in self._tags)
+
+    @tags.setter
+    def tags(self, value):
+        self._tags = tuple(TAGS.code(tag) for tag in value)
 
     def to_dict(self):
         return {
+            "id": self.id,
             "title": self.title,
             "description": self.description,
             "priority": self.priority,
             "due_date": self.due_date,
-            "tags": self.tags,
+            "tags": [*self.tags],
             "status": self.status,
             "recurring": self.recurring
         }
@@ -37,38 +83,101 @@ class Task:
     def from_dict(data):
         return Task(
             title=data["title"],
-            description=data["description"],
+            # Without an id there is nothing to fetch the description by later.
+            description=data.get("description", NOT_LOADED if data.get("id") is not None else ""),
             priority=data["priority"],
             due_date=data["due_date"],
             tags=data["tags"],
             status=data.get("status", "Pending"),
-            recurring=data.get("recurring")
+            recurring=data.get("recurring"),
+            id=data.get("id")
         )
 
 def load_tasks() -> List[Task]:
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return [Task.from_dict(t) for t in json.load(f)]
-    return []
+    records = backend.load()
+    with timings.phase("from_dict"):
+        return [Task.from_dict(t) for t in records]
 
 def save_tasks(tasks: List[Task]):
-    with open(DATA_FILE, "w") as f:
-        json.dump([t.to_dict() for t in tasks], f, indent=2)
+    with timings.phase("to_dict"):
+        records = [t.to_dict() for t in tasks]
+    backend.save(records)
 
 def generate_recurring_task(task: Task):
     if task.recurring and task.due_date:
-        due = datetime.strptime(task.due_date, "%Y-%m-%d")
-        now = datetime.now()
-        while due < now:
-            if task.recurring == "daily":
-                due += timedelta(days=1)
-            elif task.recurring == "weekly":
-                due += timedelta(weeks=1)
-            elif task.recurring == "monthly":
-                due += timedelta(days=30)
-        task.due_date = due.strftime("%Y-%m-%d")
+        due = datetime.strptime(task.due_date, "%Y-%m-%d").date()
+        task.due_date = next_due_date(due, task.recurring, date.today()).strftime("%Y-%m-%d")
     return task
 
+# Rows per table printed by `list --stream`.
+STREAM_CHUNK_SIZE = 200
+
+def task_table(title: Optional[str] = None, show_header: bool = True, streaming: bool = False):
+    from rich import box
+    from rich.table import Table
+    if streaming:
+        # Fixed and ratio widths depend only on the terminal width, so
+        # consecutive chunks line up as one table.
+        table = Table(title=title, show_header=show_header, box=box.SIMPLE, show_edge=False, expand=True)
+        widths = {"Priority": 8, "Status": 9, "Due": 10, "Recurring": 9}
+        ratios = {"Title": 3, "Tags": 2}
+    else:
+        table = Table(title=title, show_header=show_header)
+        widths, ratios = {}, {}
+    table.add_column("ID", style="dim", width=5)
+    table.add_column("Title", style="bold cyan", ratio=ratios.get("Title"))
+    for name in ("Priority", "Status", "Due", "Tags", "Recurring"):
+        table.add_column(name, width=widths.get(name), ratio=ratios.get(name))
+    return table
+
+def task_row(task: Task, today: str):
+    overdue = task.due_date and task.due_date < today
+    return (
+        str(task.id),
+        task.title,
+        task.priority.capitalize(),
+        task.status,
+        f"[red]{task.due_date}[/red]" if overdue else task.due_date or "-",
+        ", ".join(task.tags),
+        task.recurring or "-"
+    )
+
+def print_task_stream(records, today: str):
+    """Print tasks in chunks of STREAM_CHUNK_SIZE rows as the query yields them."""
+    table = task_table("Your Tasks", streaming=True)
+    printed = False
+    for record in records:
+        table.add_row(*task_row(Task.from_dict(record), today))
+        if table.row_count == STREAM_CHUNK_SIZE:
+            console.print(table)
+            table = task_table(show_header=False, streaming=True)
+            printed = True
+    if table.row_count or not printed:
+        console.print(table)
+
+def watch_tasks(query, check_every: float):
+    """Show the tasks `query(today)` gives in a live table, redrawn only when they change."""
+    from rich.live import Live
+    from live_view import LiveRows, watch
+    from storage import store_stamp
+    rows = LiveRows(lambda record, today: task_row(Task.from_dict(record), today))
+    with Live(console=console, auto_refresh=False) as live:
+
+        def refresh():
+            today = datetime.now().strftime("%Y-%m-%d")
+            backend.roll_over(today, lambda t: generate_recurring_task(Task.from_dict(t)).due_date)
+            if rows.update(query(today), today):
+                table = task_table("Your Tasks")
+                for cells in rows.cells():
+                    table.add_row(*cells)
+                live.update(table, refresh=True)
+
+        try:
+            # The day is part of the stamp, so recurring tasks roll over at midnight.
+            watch(lambda: (store_stamp(DATA_FILE), date.today()), refresh, check_every)
+        except KeyboardInterrupt:
+            pass
+
 @app.command()
 def add(
     title: str = typer.Option(..., prompt=True),
@@ -76,7 +185,8 @@ def add(
     priority: str = typer.Option("medium", prompt="Priority (low/medium/high)"),
     due_date: str = typer.Option("", prompt="Due date (YYYY-MM-DD)"),
     tags_input: str = typer.Option("", prompt="Tags (comma-separated, optional)"),
-    recurring: Optional[str] = typer.Option(None, prompt="Recurring? (daily/weekly/monthly/none)", show_default=False)
+    recurring: Optional[str] = typer.Option(None, prompt="Recurring? (daily/weekly/monthly/none)", show_default=False),
+    format: str = typer.Option("text", help="text, or json to print {\"id\": ...} for scripts")
 ):
     try:
         if due_date:
@@ -98,67 +208,105 @@ def add(
         tags=tags,
         recurring=recurring
     )
-    tasks = load_tasks()
-    tasks.append(task)
-    save_tasks(tasks)
-    console.print(f"[green]Task '{title}' added![/green]")
+    task_id = backend.add(task.to_dict())
+    if format == "json":
+        sys.stdout.write(json.dumps({"id": task_id}) + "\n")
+        return
+    console.print(f"[green]Task '{title}' added with ID {task_id}![/green]")
 
 @app.command()
 def list(
-    filter_tag: Optional[str] = typer.Option(None),
+    filter_tag: Optional[List[str]] = typer.Option(None, help="Only tasks with this tag; repeat for several"),
+    tag_mode: str = typer.Option("all", help="all: every --filter-tag must match, any: at least one"),
+    priority: Optional[str] = typer.Option(None),
+    status: Optional[str] = typer.Option(None),
+    due_after: Optional[str] = typer.Option(None, help="Only tasks due after this date (YYYY-MM-DD)"),
+    due_before: Optional[str] = typer.Option(None, help="Only tasks due before this date (YYYY-MM-DD)"),
+    overdue: bool = typer.Option(False, help="Only tasks due before today"),
     search: Optional[str] = typer.Option(None),
-    sort_by: Optional[str] = typer.Option(None)
+    sort_by: Optional[str] = typer.Option(None),
+    limit: Optional[int] = typer.Option(None, min=1, help="Show at most this many tasks"),
+    offset: int = typer.Option(0, min=0, help="Skip this many matching tasks first"),
+    stream: bool = typer.Option(False, help="Print rows in chunks as they are found"),
+    format: str = typer.Option("table", help="table, or json for one JSON task per line"),
+    watch: bool = typer.Option(False, help="Keep the table on screen and update it as the tasks change"),
+    check_every: float = typer.Option(1.0, min=0.1, help="With --watch, seconds between checks for changes")
 ):
-    tasks = load_tasks()
+    for value in (due_after, due_before):
+        if value:
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                console.print("[red]Invalid date format! Use YYYY-MM-DD[/red]")
+                raise typer.Exit()
+    if tag_mode not in ("all", "any"):
+        console.print("[red]--tag-mode must be 'all' or 'any'.[/red]")
+        raise typer.Exit()
+    if format not in ("table", "json"):
+        console.print("[red]--format must be 'table' or 'json'.[/red]")
+        raise typer.Exit()
+    if watch and (format == "json" or stream):
+        console.print("[red]--watch only works with the table format, without --stream.[/red]")
+        raise typer.Exit()
 
-    for t in tasks:
-        if t.recurring:
-            generate_recurring_task(t)
-    save_tasks(tasks)
+    def query(today: str):
+        before = due_before
+        if overdue:
+            before = min(due_before, today) if due_before else today
+        return backend.iter_query(
+            search=search, sort_by=sort_by, limit=limit, offset=offset, tags=filter_tag, tag_mode=tag_mode,
+            priority=priority, status=status, due_after=due_after, due_before=before,
+            fields=None if format == "json" else TABLE_FIELDS
+        )
 
-    if filter_tag:
-        tasks = [t for t in tasks if filter_tag in t.tags]
+    if watch:
+        watch_tasks(query, check_every)
+        return
 
-    if search:
-        tasks = [t for t in tasks if search.lower() in t.title.lower() or search.lower() in t.description.lower() or search.lower() in t.status.lower()]
+    # Only writes when a recurring task actually moved to its next due date.
+    today = datetime.now().strftime("%Y-%m-%d")
+    backend.roll_over(today, lambda t: generate_recurring_task(Task.from_dict(t)).due_date)
 
-    if sort_by == "due":
-        tasks.sort(key=lambda x: x.due_date or "9999-99-99")
-    elif sort_by == "priority":
-        order = {"low": 3, "medium": 2, "high": 1}
-        tasks.sort(key=lambda x: order.get(x.priority, 99))
+    records = query(today)
 
-    table = Table(title="Your Tasks")
-    table.add_column("ID", style="dim", width=5)
-    table.add_column("Title", style="bold cyan")
-    table.add_column("Priority")
-    table.add_column("Status")
-    table.add_column("Due")
-    table.add_column("Tags")
-    table.add_column("Recurring")
-
-    for i, task in enumerate(tasks):
-        due_style = "[red]" if task.due_date and task.due_date < datetime.now().strftime("%Y-%m-%d") else ""
-        table.add_row(
-            str(i + 1),
-            task.title,
-            task.priority.capitalize(),
-            task.status,
-            f"{due_style}{task.due_date}[/red]" if task.due_date else "-",
-            ", ".join(task.tags),
-            task.recurring or "-"
-        )
+    if format == "json":
+        write = sys.stdout.write
+        with timings.phase("print json"):
+            for record in records:
+                write(json.dumps(record) + "\n")
+        return
 
-    console.print(table)
+    if stream:
+        with timings.phase("render"):
+            print_task_stream(records, today)
+        return
+
+    table = task_table("Your Tasks")
+    # Filtering and sorting happen as rows are pulled, so they show up under this phase.
+    with timings.phase("from_dict and rows"):
+        for record in records:
+            table.add_row(*task_row(Task.from_dict(record), today))
+    with timings.phase("render"):
+        console.print(table)
 
 @app.command()
-def update(index: int):
-    tasks = load_tasks()
-    if not (1 <= index <= len(tasks)):
-        console.print("[red]Invalid task index.[/red]")
+def update(
+    task_id: Optional[int] = typer.Argument(None, help="A task to edit interactively"),
+    where: Optional[List[str]] = typer.Option(None, help="Instead, every task matching key=value (tag, status, priority, search); repeat to narrow"),
+    set_fields: Optional[List[str]] = typer.Option(None, "--set", help="field=value to set on the matching tasks; repeat for several"),
+    before: Optional[str] = typer.Option(None, help="Only tasks due before this date (YYYY-MM-DD)"),
+    dry_run: bool = typer.Option(False, help="Only report how many tasks match")
+):
+    if task_id is None:
+        from batch import update_matching
+        update_matching(backend, console, where, set_fields, before, dry_run)
+        return
+    record = backend.get(task_id)
+    if record is None:
+        console.print("[red]Invalid task ID.[/red]")
         raise typer.Exit()
 
-    task = tasks[index - 1]
+    task = Task.from_dict(record)
     console.print(f"Editing: [bold]{task.title}[/bold]")
 
     new_status = typer.prompt("New status (Pending/Completed)", default=task.status)
@@ -170,28 +318,79 @@ def update(index: int):
             console.print("[red]Invalid date format![/red]")
             raise typer.Exit()
 
-    task.status = new_status
-    task.due_date = new_due
-    save_tasks(tasks)
+    backend.update(task_id, {"status": new_status, "due_date": new_due})
     console.print("[green]Task updated![/green]")
 
 @app.command()
-def delete(index: int):
-    tasks = load_tasks()
-    if not (1 <= index <= len(tasks)):
-        console.print("[red]Invalid task index.[/red]")
+def delete(
+    task_id: Optional[int] = typer.Argument(None, help="A task to delete"),
+    where: Optional[List[str]] = typer.Option(None, help="Instead, every task matching key=value (tag, status, priority, search); repeat to narrow"),
+    before: Optional[str] = typer.Option(None, help="Only tasks due before this date (YYYY-MM-DD)"),
+    dry_run: bool = typer.Option(False, help="Only report how many tasks match"),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Do not ask before deleting the matching tasks")
+):
+    if task_id is None:
+        from batch import delete_matching
+        delete_matching(backend, console, where, before, dry_run, yes)
+        return
+    record = backend.get(task_id)
+    if record is None:
+        console.print("[red]Invalid task ID.[/red]")
         raise typer.Exit()
 
-    task = tasks[index - 1]
+    from rich.prompt import Confirm
+    task = Task.from_dict(record)
     if Confirm.ask(f"Are you sure you want to delete '{task.title}'?"):
-        tasks.pop(index - 1)
-        save_tasks(tasks)
+        backend.delete(task_id)
         console.print("[red]Task deleted.[/red]")
 
+@app.command("import")
+def import_tasks(
+    path: str,
+    format: Optional[str] = typer.Option(None, help="jsonl or csv; taken from the file extension by default"),
+    batch_size: int = typer.Option(1000, min=1, help="Rows validated at a time")
+):
+    """Add every task in a JSON Lines or CSV file (such as export's CSV) in one write."""
+    from importer import BulkImport, open_rows
+    if not os.path.exists(path):
+        console.print("[red]Import file does not exist.[/red]")
+        raise typer.Exit()
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format == "ndjson":
+        format = "jsonl"
+    if format not in ("jsonl", "csv"):
+        console.print("[red]Unsupported import format. Use 'jsonl' or 'csv'.[/red]")
+        raise typer.Exit()
+
+    with open(path, "r", newline="") as f:
+        try:
+            bulk = BulkImport(open_rows(f, format), batch_size)
+            added = backend.add_many(bulk.records())
+        except ValueError as e:
+            console.print(f"[red]Failed to import: {e}[/red]")
+            raise typer.Exit()
+    console.print(f"[green]Imported {added} tasks from {path}[/green]")
+    if bulk.error_count:
+        console.print(f"[yellow]Skipped {bulk.error_count} bad rows:[/yellow]")
+        for error in bulk.errors:
+            console.print(f"  {error}", markup=False)
+        if bulk.error_count > len(bulk.errors):
+            console.print(f"  ... and {bulk.error_count - len(bulk.errors)} more")
+
 @app.command()
-def export(format: str = typer.Option("json")):
-    tasks = load_tasks()
-    if format == "json":
+def export(
+    format: str = typer.Option("json", help="json, csv, or ndjson (one task per line, streamed)"),
+    gzip_output: bool = typer.Option(False, "--gzip", help="gzip the ndjson output"),
+    workers: int = typer.Option(0, min=0, help="Processes encoding ndjson in parallel (0: this one)")
+):
+    if format == "ndjson":
+        from exporter import write_ndjson
+        path = "backup_tasks.ndjson.gz" if gzip_output else "backup_tasks.ndjson"
+        with open(path, "wb") as f:
+            count = write_ndjson(backend.iter_query(), f, compress=gzip_output, workers=workers)
+        console.print(f"[green]{count} tasks exported to {path}[/green]")
+    elif format == "json":
+        tasks = load_tasks()
         with open("backup_tasks.json", "w") as f:
             json.dump([t.to_dict() for t in tasks], f, indent=2)
         console.print("[green]Tasks exported to backup_tasks.json[/green]")
@@ -200,12 +399,94 @@ def export(format: str = typer.Option("json")):
         with open("backup_tasks.csv", "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow(["Title", "Description", "Priority", "Status", "Due Date", "Tags", "Recurring"])
-            for t in tasks:
-                writer.writerow([t.title, t.description, t.priority, t.status, t.due_date, ",".join(t.tags), t.recurring])
+            # Rows come straight from the stored records, one at a time.
+            writer.writerows(
+                [t["title"], t["description"], t["priority"], t["status"], t["due_date"], ",".join(t["tags"]), t["recurring"]]
+                for t in backend.iter_query()
+            )
         console.print("[green]Tasks exported to backup_tasks.csv[/green]")
     else:
         console.print("[red]Unsupported export format[/red]")
 
+@app.command()
+def compact():
+    """Fold the journal back into tasks.json (or VACUUM the SQLite store)."""
+    backend.compact()
+    console.print("[green]Task store compacted[/green]")
+
+@app.command()
+def remind(
+    once: bool = typer.Option(False, help="Print what is due or overdue now and exit"),
+    format: str = typer.Option("text", help="text, or json for one JSON event per line"),
+    check_every: float = typer.Option(1.0, min=0.1, help="Seconds between checks for changes to the tasks")
+):
+    """Report tasks due today or overdue, then keep reporting them as they fall due."""
+    from reminders import WATCHED_FIELDS, Reminders, watch
+    from storage import store_stamp
+    if format not in ("text", "json"):
+        console.print("[red]--format must be 'text' or 'json'.[/red]")
+        raise typer.Exit()
+
+    def emit(event):
+        if format == "json":
+            sys.stdout.write(json.dumps(event) + "\n")
+            sys.stdout.flush()
+        elif event["event"] == "overdue":
+            console.print(f"[red]Overdue:[/red] #{event['id']} {event['title']} (was due {event['due_date']})")
+        else:
+            console.print(f"[yellow]Due today:[/yellow] #{event['id']} {event['title']}")
+
+    if once:
+        for event in Reminders().sync(backend.load_fields(WATCHED_FIELDS), date.today()):
+            emit(event)
+        return
+    try:
+        watch(lambda: backend.load_fields(WATCHED_FIELDS), lambda: store_stamp(DATA_FILE), emit, check_every)
+    except KeyboardInterrupt:
+        pass
+
+@app.command()
+def agenda(
+    start: Optional[str] = typer.Option(None, help="First day to show (YYYY-MM-DD); defaults to today"),
+    days: int = typer.Option(14, min=1, help="How many days to show"),
+    limit: Optional[int] = typer.Option(None, min=1, help="Show at most this many entries"),
+    format: str = typer.Option("table", help="table, or json for one JSON entry per line")
+):
+    """List every day a pending task falls on in a window, with each occurrence of recurring tasks."""
+    from itertools import islice
+    from agenda import AGENDA_FIELDS, agenda as occurrences
+    try:
+        first = datetime.strptime(start, "%Y-%m-%d").date() if start else date.today()
+    except ValueError:
+        console.print("[red]Invalid date format! Use YYYY-MM-DD[/red]")
+        raise typer.Exit()
+    if format not in ("table", "json"):
+        console.print("[red]--format must be 'table' or 'json'.[/red]")
+        raise typer.Exit()
+    last = date.fromordinal(first.toordinal() + days - 1)
+    entries = islice(occurrences(backend.load_fields(AGENDA_FIELDS), first, last), limit)
+
+    if format == "json":
+        for day, record in entries:
+            sys.stdout.write(json.dumps({"date": day.isoformat(), "id": record["id"], "title": record["title"],
+                                         "priority": record["priority"], "recurring": record.get("recurring")}) + "\n")
+        return
+
+    from rich.table import Table
+    table = Table(title=f"Agenda {first.isoformat()} to {last.isoformat()}")
+    for name in ("Date", "ID", "Title", "Priority", "Recurring"):
+        table.add_column(name, style="dim" if name == "ID" else None)
+    shown = None
+    for day, record in entries:
+        # Each date is only printed on its first row.
+        label = f"{day:%a} {day.isoformat()}" if day != shown else ""
+        shown = day
+        table.add_row(label, str(record["id"]), record["title"], record["priority"].capitalize(),
+                      record.get("recurring") or "-")
+    console.print(table)
+
+app.command("calendar", help="Same as agenda.")(agenda)
+
 # ✅ FIXED this line
 if __name__ == "__main__":
-    app()
+    run(app)
@@ -0,0 +1,148 @@
+"""Incremental, content-addressed backups of the task store.
+
+Tasks are grouped into chunks of CHUNK_TASKS consecutive ids. Since ids
+are never reused, editing one task only changes the chunk it falls in.
+Each chunk is stored once, compressed, under the SHA-256 of its contents
+(`<dir>/chunks/ab/abcd....gz`), so a chunk that did not change is never
+written again.
+
+`<dir>/manifest.jsonl` gets one line per snapshot, holding only the chunks
+that changed or disappeared since the snapshot before it. Replaying the
+lines up to a snapshot gives its full chunk list, and from that its tasks.
+"""
+import gzip
+import hashlib
+import json
+import lzma
+import os
+from datetime import datetime
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional
+
+from storage import write_atomic
+
+CHUNK_TASKS = 256
+
+COMPRESSORS = {"gzip": (".gz", gzip.compress, gzip.decompress), "lzma": (".xz", lzma.compress, lzma.decompress)}
+
+
+def chunk_of(record: dict) -> int:
+    return (record["id"] - 1) // CHUNK_TASKS
+
+
+def encode_chunk(records: List[dict]) -> bytes:
+    # Canonical form, so equal tasks always hash the same.
+    return b"".join(json.dumps(record, sort_keys=True, separators=(",", ":")).encode() + b"\n"
+                    for record in records)
+
+
+class BackupStore:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.jsonl")
+
+    def snapshots(self) -> List[dict]:
+        """Every snapshot's manifest entry, oldest first."""
+        if not os.path.exists(self.manifest_path):
+            return []
+        entries = []
+        with open(self.manifest_path, "r") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Torn by a crash mid-append; that snapshot never completed.
+                    continue
+        return entries
+
+    def find(self, at: Optional[str] = None) -> Optional[dict]:
+        """The snapshot numbered `at`, or the last one taken at or before the time `at`
+        (YYYY-MM-DD or YYYY-MM-DDTHH:MM[:SS]); the latest one when `at` is None."""
+        snapshots = self.snapshots()
+        if at is None:
+            return snapshots[-1] if snapshots else None
+        if at.isdigit():
+            return next((entry for entry in snapshots if entry["snapshot"] == int(at)), None)
+        moment = datetime.fromisoformat(at)
+        if len(at) == 10:
+            # A bare date means the end of that day.
+            moment = moment.replace(hour=23, minute=59, second=59)
+        taken = [entry for entry in snapshots if datetime.fromisoformat(entry["created"]) <= moment]
+        return taken[-1] if taken else None
+
+    def chunk_map(self, snapshot: Optional[int] = None) -> Dict[int, str]:
+        """Chunk number -> content hash as of `snapshot` (the latest when None)."""
+        chunks = {}
+        for entry in self.snapshots():
+            chunks.update((int(k), digest) for k, digest in entry["changed"].items())
+            for k in entry["removed"]:
+                chunks.pop(k, None)
+            if entry["snapshot"] == snapshot:
+                break
+        return chunks
+
+    def take(self, records: List[dict], stamp=None, compression: str = "gzip") -> dict:
+        """Record a snapshot of `records` (sorted by id), writing only chunks not stored yet.
+
+        With the `stamp` of the store files, a store unchanged since the last
+        snapshot is not even read: the new snapshot just repeats it.
+        """
+        suffix, compress, _ = COMPRESSORS[compression]
+        snapshots = self.snapshots()
+        previous = self.chunk_map()
+        entry = {
+            "snapshot": snapshots[-1]["snapshot"] + 1 if snapshots else 1,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "stamp": stamp,
+            "compression": compression,
+            "changed": {},
+            "removed": [],
+            "tasks": 0,
+            "written": 0,
+        }
+        if stamp is not None and snapshots and snapshots[-1]["stamp"] == stamp:
+            entry["tasks"] = snapshots[-1]["tasks"]
+        else:
+            seen = set()
+            for k, group in groupby(records, key=chunk_of):
+                group = list(group)
+                entry["tasks"] += len(group)
+                seen.add(k)
+                data = encode_chunk(group)
+                digest = hashlib.sha256(data).hexdigest()
+                if previous.get(k) == digest:
+                    continue
+                entry["changed"][str(k)] = digest
+                if self._chunk_path(digest) is None:
+                    blob = compress(data)
+                    path = os.path.join(self.directory, "chunks", digest[:2], digest + suffix)
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    write_atomic(path, blob)
+                    entry["written"] += len(blob)
+            entry["removed"] = sorted(set(previous) - seen)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.manifest_path, "ab") as f:
+            f.write(json.dumps(entry).encode() + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        return entry
+
+    def records(self, snapshot: int) -> Iterator[dict]:
+        """The tasks as of `snapshot`, in id order."""
+        for k, digest in sorted(self.chunk_map(snapshot).items()):
+            path = self._chunk_path(digest)
+            if path is None:
+                raise FileNotFoundError(f"Backup chunk {digest} is missing")
+            decompress = next(d for suffix, _, d in COMPRESSORS.values() if path.endswith(suffix))
+            with open(path, "rb") as f:
+                data = decompress(f.read())
+            for line in data.splitlines():
+                yield json.loads(line)
+
+    def _chunk_path(self, digest: str) -> Optional[str]:
+        """Where the chunk with this hash is stored, in whichever compression; None if it is not."""
+        for suffix, _, _ in COMPRESSORS.values():
+            path = os.path.join(self.directory, "chunks", digest[:2], digest + suffix)
+            if os.path.exists(path):
+                return path
+        return None
@@ -0,0 +1,127 @@
+"""Batch update and delete: `--where key=value` picks tasks, `--set field=value` changes them.
+
+    python app.py update --where tag=sprint-12 --set status=Completed
+    python app.py delete --where status=Completed --before 2026-01-01 --dry-run
+
+The matching tasks are changed with StorageBackend.update_where and
+delete_where, which make one pass over the store (through its indexes,
+where it has them) and one write.
+"""
+from datetime import datetime
+from typing import List, Optional
+
+import typer
+
+from importer import PRIORITIES, STATUSES
+from recurrence import RECURRENCES
+
+# --where key -> query() keyword; tag may be repeated, and a task must have them all.
+WHERE_KEYS = {"tag": "tags", "status": "status", "priority": "priority", "search": "search"}
+SET_FIELDS = ("title", "description", "priority", "status", "due_date", "tags", "recurring")
+
+
+def check_date(value: str, option: str) -> str:
+    try:
+        datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise ValueError(f"{option} must be a date (YYYY-MM-DD), not {value!r}")
+    return value
+
+
+def parse_where(terms: List[str], before: Optional[str] = None) -> dict:
+    """query() keywords for `key=value` terms and a due date to be before."""
+    filters = {}
+    for term in terms:
+        key, sep, value = term.partition("=")
+        key = key.strip().lower()
+        if not sep or key not in WHERE_KEYS:
+            raise ValueError(f"Bad --where {term!r}: use tag=, status=, priority= or search=")
+        if key == "tag":
+            filters.setdefault("tags", []).append(value)
+        else:
+            filters[WHERE_KEYS[key]] = value
+    if before:
+        filters["due_before"] = check_date(before, "--before")
+    return filters
+
+
+def parse_set(terms: List[str]) -> dict:
+    """Task fields for `field=value` terms, checked the way import checks rows."""
+    fields = {}
+    for term in terms:
+        key, sep, value = term.partition("=")
+        key = key.strip().lower().replace("-", "_")
+        key = "due_date" if key == "due" else key
+        if not sep or key not in SET_FIELDS:
+            raise ValueError(f"Bad --set {term!r}: the fields are {', '.join(SET_FIELDS)}")
+        if key == "title" and not value.strip():
+            raise ValueError("--set title= needs a title")
+        if key == "priority":
+            value = value.lower()
+            if value not in PRIORITIES:
+                raise ValueError(f"Priority must be one of {', '.join(PRIORITIES)}")
+        elif key == "status":
+            value = value.capitalize()
+            if value not in STATUSES:
+                raise ValueError(f"Status must be one of {', '.join(STATUSES)}")
+        elif key == "due_date" and value:
+            check_date(value, "--set due_date")
+        elif key == "tags":
+            value = [tag.strip() for tag in value.split(",") if tag.strip()]
+        elif key == "recurring":
+            value = None if value.lower() in ("", "none") else value.lower()
+            if value is not None and value not in RECURRENCES:
+                raise ValueError(f"Recurring must be one of {', '.join(RECURRENCES)} or none")
+        fields[key] = value
+    return fields
+
+
+def matching_filters(console, where: Optional[List[str]], before: Optional[str]) -> dict:
+    try:
+        filters = parse_where(where or [], before)
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit()
+    if not filters:
+        console.print("[red]Give a task ID, or --where / --before to pick the tasks.[/red]")
+        raise typer.Exit()
+    return filters
+
+
+def update_matching(backend, console, where: Optional[List[str]], assignments: Optional[List[str]],
+                    before: Optional[str], dry_run: bool):
+    filters = matching_filters(console, where, before)
+    try:
+        fields = parse_set(assignments or [])
+    except ValueError as e:
+        console.print(f"[red]{e}[/red]")
+        raise typer.Exit()
+    if not fields:
+        console.print("[red]Say what to change with --set field=value.[/red]")
+        raise typer.Exit()
+    if dry_run:
+        matched = backend.query(fields=fields, **filters)
+        changing = sum(any(r.get(k) != v for k, v in fields.items()) for r in matched)
+        console.print(f"[yellow]Dry run: {len(matched)} tasks match, {changing} would change.[/yellow]")
+        return
+    console.print(f"[green]Updated {backend.update_where(fields, **filters)} tasks.[/green]")
+
+
+def delete_matching(backend, console, where: Optional[List[str]], before: Optional[str], dry_run: bool,
+                    yes: bool):
+    filters = matching_filters(console, where, before)
+    if yes and not dry_run:
+        deleted = backend.delete_where(**filters)
+        console.print(f"[red]Deleted {deleted} tasks.[/red]" if deleted else "[yellow]No tasks match.[/yellow]")
+        return
+    # Only the count is shown, so the matches need no fields beyond their ids.
+    matched = len(backend.query(fields=(), **filters))
+    if dry_run:
+        console.print(f"[yellow]Dry run: {matched} tasks match.[/yellow]")
+        return
+    if not matched:
+        console.print("[yellow]No tasks match.[/yellow]")
+        return
+    from rich.prompt import Confirm
+    if Confirm.ask(f"Delete {matched} tasks?"):
+        console.print(f"[red]Deleted {backend.delete_where(**filters)} tasks.[/red]")
@@ -0,0 +1,89 @@
+# benchmark_memory.py
+"""Bytes per task for each in-memory task representation.
+
+Run with an optional task count (default 100000):
+
+    python benchmark_memory.py 100000
+
+Each representation is built from the same parsed JSON, the way load_tasks
+builds it, and only the memory still held afterwards is counted.
+"""
+import gc
+import json
+import random
+import sys
+import tracemalloc
+
+from app import Task
+from columnar import TaskTable
+
+
+class DictTask:
+    """The original Task: a plain class with a per-instance __dict__."""
+
+    def __init__(self, title, description, priority, due_date, tags, status="Pending", recurring=None):
+        self.title = title
+        self.description = description
+        self.priority = priority
+        self.due_date = due_date
+        self.tags = tags
+        self.status = status
+        self.recurring = recurring
+
+    @staticmethod
+    def from_dict(data):
+        return DictTask(
+            title=data["title"],
+            description=data["description"],
+            priority=data["priority"],
+            due_date=data["due_date"],
+            tags=data["tags"],
+            status=data.get("status", "Pending"),
+            recurring=data.get("recurring")
+        )
+
+
+def synthetic_store(count: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    tags = ["work", "home", "urgent", "errand", "sprint-%d" % rng.randint(1, 20), "review"]
+    return json.dumps([
+        {
+            "title": "Task %d" % i,
+            "description": "Details for task %d" % i if rng.random() < 0.5 else "",
+            "priority": rng.choice(["low", "medium", "high"]),
+            "due_date": "2026-%02d-%02d" % (rng.randint(1, 12), rng.randint(1, 28)) if rng.random() < 0.8 else "",
+            "tags": rng.sample(tags, rng.randint(0, 3)),
+            "status": rng.choice(["Pending", "Pending", "Completed"]),
+            "recurring": rng.choice([None, None, None, "daily", "weekly", "monthly"]),
+        }
+        for i in range(count)
+    ])
+
+
+def bytes_per_task(build, text: str, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    result = build(text)
+    gc.collect()
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return held / count
+
+
+REPRESENTATIONS = {
+    "dict-backed Task (before)": lambda text: [DictTask.from_dict(d) for d in json.loads(text)],
+    "slotted Task (after)": lambda text: [Task.from_dict(d) for d in json.loads(text)],
+    "columnar TaskTable": lambda text: TaskTable.from_records(json.loads(text)),
+}
+
+
+def main(count: int = 100000):
+    text = synthetic_store(count)
+    print(f"{count} tasks")
+    for name, build in REPRESENTATIONS.items():
+        print(f"  {name:<28} {bytes_per_task(build, text, count):8.1f} bytes/task")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,181 @@
+# benchmark_scale.py
+"""Timings and peak memory of the main task operations on synthetic stores.
+
+    python benchmark_scale.py                               # 1k, 100k and 1M tasks
+    python benchmark_scale.py --sizes 1000,100000 --save bench.json
+    python benchmark_scale.py --sizes 1000,100000 --compare bench.json --threshold 0.25
+
+Each store is generated with benchmark_memory.synthetic_store (a realistic
+mix of tags, priorities, due dates and recurrences) and added with add_many
+in a scratch directory, using whichever backend TASKS_STORAGE selects.
+
+Every operation runs on a fresh backend, the way a one-shot command would.
+Its time is the best of --repeat runs, and its peak memory is the most
+Python memory it held at once (tracemalloc, in one extra run).
+
+--save writes the results as JSON. --compare checks them against an
+earlier file and exits with status 1 if any operation got slower (or
+used more memory) by more than --threshold, as a fraction of before.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from app import TABLE_FIELDS, Task
+from backups import BackupStore
+from benchmark_memory import synthetic_store
+from exporter import write_ndjson
+from recurrence import roll_forward
+from storage import get_backend
+
+SIZES = (1000, 100000, 1000000)
+REPEAT = 3
+THRESHOLD = 0.25
+DATA_FILE = "tasks.json"
+
+# Differences below these are noise, whatever the ratio.
+MIN_SECONDS = 0.005
+MIN_PEAK_MB = 1.0
+
+
+def load_tasks():
+    return [Task.from_dict(t) for t in get_backend(DATA_FILE).load()]
+
+
+def save_tasks(state):
+    get_backend(DATA_FILE).save(state["records"])
+
+
+def list_query(**kwargs):
+    # The table that `list` prints only needs TABLE_FIELDS.
+    return lambda state: get_backend(DATA_FILE).query(fields=TABLE_FIELDS, **kwargs)
+
+
+def roll_over(state):
+    # A later "today" on every run, so each one has every recurring task to move.
+    state["today"] += timedelta(days=400)
+    today = state["today"]
+    get_backend(DATA_FILE).roll_over(today.isoformat(), lambda t: roll_forward(t["due_date"], t["recurring"], today))
+
+
+def export(state):
+    with open("export.ndjson", "wb") as f:
+        write_ndjson(get_backend(DATA_FILE).iter_query(), f)
+
+
+def backup(state):
+    shutil.rmtree("backups", ignore_errors=True)
+    BackupStore("backups").take(get_backend(DATA_FILE).load())
+
+
+def restore(state):
+    store = BackupStore("backups")
+    get_backend(DATA_FILE).save(list(store.records(store.find()["snapshot"])))
+
+
+OPERATIONS = {
+    "load_tasks": lambda state: load_tasks(),
+    "save_tasks": save_tasks,
+    "list --search": list_query(search="task 12"),
+    "list --filter-tag": list_query(tags=["work"]),
+    "list --filter-tag --tag-mode any": list_query(tags=["work", "urgent"], tag_mode="any"),
+    "list --sort-by due": list_query(sort_by="due"),
+    "list --sort-by priority": list_query(sort_by="priority"),
+    "list --sort-by due --limit 20": list_query(sort_by="due", limit=20),
+    "recurrence rollover": roll_over,
+    "export ndjson": export,
+    "backup": backup,
+    "restore": restore,
+}
+
+
+def run_operation(operation, state, repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        operation(state)
+        times.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    operation(state)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": round(min(times), 4), "peak_mb": round(peak / 2 ** 20, 2)}
+
+
+def benchmark(size: int, repeat: int = REPEAT, progress=None) -> dict:
+    results = {}
+    old_cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        records = json.loads(synthetic_store(size))
+        get_backend(DATA_FILE).add_many(records)
+        state = {"records": get_backend(DATA_FILE).load(), "today": date.today()}
+        for name, operation in OPERATIONS.items():
+            results[name] = run_operation(operation, state, repeat)
+            if progress:
+                progress(size, name, results[name])
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(tmp)
+    return results
+
+
+def regressions(before: dict, after: dict, threshold: float = THRESHOLD) -> list:
+    """(size, operation, metric, before, after) for everything that got worse by more than `threshold`."""
+    found = []
+    for size, operations in after.items():
+        for name, result in operations.items():
+            old = before.get(size, {}).get(name)
+            if old is None:
+                continue
+            for metric, floor in (("seconds", MIN_SECONDS), ("peak_mb", MIN_PEAK_MB)):
+                if result[metric] > old[metric] * (1 + threshold) and result[metric] - old[metric] > floor:
+                    found.append((size, name, metric, old[metric], result[metric]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--save")
+    parser.add_argument("--compare")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    def progress(size, name, result):
+        print(f"  {size:>8} {name:<34} {result['seconds']:9.4f} s {result['peak_mb']:9.2f} MB", flush=True)
+
+    results = {str(size): benchmark(int(size), args.repeat, progress) for size in args.sizes.split(",")}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                                "storage": os.environ.get("TASKS_STORAGE", "json"), "repeat": args.repeat},
+                "results": results,
+            }, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            before = json.load(f)["results"]
+        found = regressions(before, results, args.threshold)
+        for size, name, metric, old, new in found:
+            print(f"REGRESSION {size} {name}: {metric} {old} -> {new}")
+        if found:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
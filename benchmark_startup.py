@@ -0,0 +1,100 @@
+# benchmark_startup.py
+"""Cold-start wall time of common commands, each in a fresh interpreter.
+
+    python benchmark_startup.py                        # print the timings
+    python benchmark_startup.py --save startup_baseline.json --label after
+    python benchmark_startup.py --repo /path/to/other/checkout --save startup_baseline.json --label before
+
+Every command runs against a scratch directory holding TASKS tasks (and
+without a task daemon), once to warm up and then RUNS times; the median is
+reported. --save merges the results into a JSON file under --label, so
+timings from two checkouts can be kept side by side. Use
+python app.py --startup-profile ... to see where the time of one command goes.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmark_memory import synthetic_store
+
+RUNS = 15
+TASKS = 1000
+
+COMMANDS = {
+    "app.py --help": ["app.py", "--help"],
+    "app.py add": ["app.py", "add", "--title", "Benchmark", "--description", "", "--priority", "low",
+                   "--due-date", "", "--tags-input", "", "--recurring", "none"],
+    "app.py list": ["app.py", "list", "--limit", "20"],
+    "app.py list --format json": ["app.py", "list", "--limit", "20", "--format", "json"],
+    "milestone3.py backup": ["milestone3.py", "backup"],
+}
+
+
+def time_command(repo: str, argv, runs: int) -> float:
+    env = {key: value for key, value in os.environ.items() if key != "PYTHONDONTWRITEBYTECODE"}
+    env["TASKS_DAEMON"] = "0"
+    command = [sys.executable, os.path.join(repo, argv[0])] + argv[1:]
+    timings = []
+    for _ in range(runs + 1):
+        started = time.perf_counter()
+        result = subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError("failed: " + " ".join(argv))
+    # The first run also writes bytecode caches and the id index.
+    return statistics.median(timings[1:])
+
+
+def measure(repo: str, runs: int):
+    results = {}
+    old_cwd = os.getcwd()
+    tmp = tempfile.mkdtemp()
+    try:
+        os.chdir(tmp)
+        for name, argv in COMMANDS.items():
+            with open("tasks.json", "w") as f:
+                f.write(synthetic_store(TASKS))
+            try:
+                results[name] = round(time_command(repo, argv, runs), 1)
+            except RuntimeError:
+                # Not available in that checkout.
+                continue
+    finally:
+        os.chdir(old_cwd)
+        shutil.rmtree(tmp)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repo", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--save")
+    parser.add_argument("--label", default="current")
+    args = parser.parse_args()
+
+    results = measure(args.repo, args.runs)
+    for name, ms in results.items():
+        print(f"  {name:<28} {ms:8.1f} ms")
+    if args.save:
+        data = {}
+        if os.path.exists(args.save):
+            with open(args.save) as f:
+                data = json.load(f)
+        data["environment"] = {"python": platform.python_version(), "platform": platform.platform(),
+                               "runs": args.runs, "tasks": TASKS}
+        data.setdefault("results", {})[args.label] = results
+        with open(args.save, "w") as f:
+            json.dump(data, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Thin client for the task daemon (daemon.py), with a minimal CLI for scripts.
+
+Only json and socket are needed to talk to a running daemon, so a command
+costs little more than starting the interpreter. Without a daemon, the
+CLI falls back to reading and writing the task store directly.
+
+    python client.py add "Write report" --priority high --due-date 2025-05-01 --tags work,urgent
+    python client.py list --status pending --sort-by due --limit 20
+    python client.py update 12 --status Completed
+    python client.py delete 12
+
+list prints one JSON task per line; add prints the new task's id.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator, List, Optional
+
+DATA_FILE = "tasks.json"
+
+# Tasks per request when DaemonBackend.add_many streams an import to the daemon.
+ADD_MANY_CHUNK = 1000
+
+
+def socket_path(data_file: str) -> str:
+    return data_file + ".sock"
+
+
+class DaemonError(Exception):
+    pass
+
+
+class DaemonClient:
+    """One connection to the daemon; requests and replies are JSON lines."""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.file = sock.makefile("rwb")
+
+    def call(self, op: str, **args):
+        self.file.write(json.dumps({"op": op, "args": args}).encode() + b"\n")
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("The task daemon closed the connection")
+        reply = json.loads(line)
+        if "error" in reply:
+            if reply["error"] == "KeyError":
+                raise KeyError(reply["key"])
+            raise DaemonError(f"{reply['error']}: {reply['message']}")
+        return reply["result"]
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def connect(data_file: str) -> Optional[DaemonClient]:
+    """Connect to the daemon serving `data_file`, or return None if none is running."""
+    path = socket_path(data_file)
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        # A socket file left behind by a daemon that did not shut down cleanly.
+        sock.close()
+        return None
+    return DaemonClient(sock)
+
+
+class DaemonBackend:
+    """The storage.StorageBackend interface, forwarded to a running task daemon.
+
+    It does not derive from StorageBackend so that a client talking to the
+    daemon never has to import storage (and sqlite3 with it).
+    """
+
+    def __init__(self, client: DaemonClient):
+        self.client = client
+
+    def load(self) -> List[dict]:
+        return self.client.call("load")
+
+    def save(self, records: List[dict]):
+        self.client.call("save", records=records)
+
+    def count(self) -> int:
+        return self.client.call("count")
+
+    def get(self, task_id: int) -> Optional[dict]:
+        return self.client.call("get", task_id=task_id)
+
+    def get_many(self, task_ids: Iterable[int]) -> List[dict]:
+        return self.client.call("get_many", task_ids=list(task_ids))
+
+    def find(self, value: str, fields: List[str]) -> List[dict]:
+        return self.client.call("find", value=value, fields=list(fields))
+
+    def counts(self, today: str) -> dict:
+        return self.client.call("counts", today=today)
+
+    def recount(self, today: str) -> dict:
+        return self.client.call("recount", today=today)
+
+    def add(self, record: dict) -> int:
+        return self.client.call("add", record=record)
+
+    def add_many(self, records: Iterable[dict]) -> int:
+        # Sent ADD_MANY_CHUNK tasks at a time, so neither side holds a huge import
+        # in one message; the daemon's write-behind still batches the writes.
+        count, chunk = 0, []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == ADD_MANY_CHUNK:
+                count += self.client.call("add_many", records=chunk)
+                chunk = []
+        if chunk:
+            count += self.client.call("add_many", records=chunk)
+        return count
+
+    def update(self, task_id: int, fields: dict):
+        self.client.call("update", task_id=task_id, fields=fields)
+
+    def delete(self, task_id: int):
+        self.client.call("delete", task_id=task_id)
+
+    def update_where(self, fields: dict, search: Optional[str] = None, **filters) -> int:
+        return self.client.call("update_where", fields=fields, search=search, **filters)
+
+    def delete_where(self, search: Optional[str] = None, **filters) -> int:
+        return self.client.call("delete_where", search=search, **filters)
+
+    def load_fields(self, fields: Iterable[str]) -> List[dict]:
+        return self.query(fields=fields)
+
+    def query(self, search: Optional[str] = None, sort_by: Optional[str] = None,
+              limit: Optional[int] = None, offset: int = 0, fields: Optional[Iterable[str]] = None,
+              **filters) -> List[dict]:
+        if fields is not None:
+            fields = list(fields)
+        return self.client.call("query", search=search, sort_by=sort_by, limit=limit, offset=offset, fields=fields,
+                                **filters)
+
+    def iter_query(self, search: Optional[str] = None, sort_by: Optional[str] = None,
+                   limit: Optional[int] = None, offset: int = 0, fields: Optional[Iterable[str]] = None,
+                   **filters) -> Iterator[dict]:
+        return iter(self.query(search, sort_by, limit, offset, fields, **filters))
+
+    def roll_over(self, today: str, advance: Callable[[dict], str]) -> int:
+        # `advance` cannot cross the socket; the daemon moves due dates on
+        # with recurrence.roll_forward, which is what every command passes.
+        return self.client.call("roll_over", today=today)
+
+    def compact(self):
+        self.client.call("compact")
+
+
+def due_date_arg(value: str) -> str:
+    """An argparse type for YYYY-MM-DD dates; "" is let through as no date."""
+    if value:
+        try:
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid date {value!r}, use YYYY-MM-DD")
+    return value
+
+
+def recurring_arg(value: str) -> Optional[str]:
+    from recurrence import RECURRENCES
+    if value == "none":
+        return None
+    if value not in RECURRENCES:
+        raise argparse.ArgumentTypeError(f"invalid recurrence {value!r}, use one of {', '.join(RECURRENCES)} or none")
+    return value
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="client.py", description="Script-friendly task commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add")
+    add.add_argument("title")
+    add.add_argument("--description", default="")
+    add.add_argument("--priority", default="medium")
+    add.add_argument("--due-date", default="", type=due_date_arg)
+    add.add_argument("--tags", default="", help="Comma-separated")
+    add.add_argument("--recurring", default=None, type=recurring_arg)
+
+    list_ = commands.add_parser("list")
+    list_.add_argument("--search")
+    list_.add_argument("--tag", action="append", dest="tags")
+    list_.add_argument("--tag-mode", default="all", choices=("all", "any"))
+    list_.add_argument("--priority")
+    list_.add_argument("--status")
+    list_.add_argument("--due-after", type=due_date_arg)
+    list_.add_argument("--due-before", type=due_date_arg)
+    list_.add_argument("--sort-by", choices=("due", "priority"))
+    list_.add_argument("--limit", type=int)
+    list_.add_argument("--offset", type=int, default=0)
+
+    update = commands.add_parser("update")
+    update.add_argument("task_id", type=int)
+    update.add_argument("--status")
+    update.add_argument("--due-date", type=due_date_arg)
+
+    delete = commands.add_parser("delete")
+    delete.add_argument("task_id", type=int)
+    return parser.parse_args(argv)
+
+
+def run(args, backend):
+    """Run one command against a DaemonBackend or a direct StorageBackend."""
+    if args.command == "add":
+        tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+        print(backend.add({
+            "title": args.title, "description": args.description, "priority": args.priority.lower(),
+            "due_date": args.due_date, "tags": tags, "status": "Pending", "recurring": args.recurring,
+        }))
+    elif args.command == "list":
+        from recurrence import roll_forward
+        today = date.today()
+        backend.roll_over(today.isoformat(), lambda t: roll_forward(t["due_date"], t["recurring"], today))
+        for record in backend.iter_query(
+            search=args.search, sort_by=args.sort_by, limit=args.limit, offset=args.offset, tags=args.tags,
+            tag_mode=args.tag_mode, priority=args.priority, status=args.status,
+            due_after=args.due_after, due_before=args.due_before,
+        ):
+            print(json.dumps(record))
+    elif args.command == "update":
+        fields = {}
+        if args.status is not None:
+            fields["status"] = args.status
+        if args.due_date is not None:
+            fields["due_date"] = args.due_date
+        backend.update(args.task_id, fields)
+    elif args.command == "delete":
+        backend.delete(args.task_id)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    client = connect(DATA_FILE) if os.environ.get("TASKS_DAEMON") != "0" else None
+    if client is not None:
+        backend = DaemonBackend(client)
+    else:
+        # storage (and sqlite3 with it) is only imported without a daemon.
+        from storage import get_backend
+        backend = get_backend(DATA_FILE)
+    try:
+        run(args, backend)
+    except KeyError as e:
+        print(f"No task with ID {e.args[0]}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import sys
+from array import array
+from datetime import date
+from typing import Iterable, List, Optional
+
+
+class Codebook:
+    """Two-way mapping between strings and small integer codes.
+
+    Each distinct value is stored once (interned), so a million tasks that
+    share the tag "work" or the status "Pending" share one string.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            value = sys.intern(value)
+            self.codes[value] = code
+            self.values.append(value)
+        return code
+
+    def value(self, code: int) -> str:
+        return self.values[code]
+
+
+# Process-wide tag ids shared by every Task.
+TAGS = Codebook()
+
+
+def intern_value(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+def due_ordinal(due_date):
+    """Encode a YYYY-MM-DD string as a date ordinal (0 for no date).
+
+    Anything that is not a plain YYYY-MM-DD date is returned unchanged so it
+    still round-trips through to_dict.
+    """
+    if not due_date:
+        return 0
+    if len(due_date) == 10 and due_date[4] == "-" and due_date[7] == "-":
+        try:
+            return date.fromisoformat(due_date).toordinal()
+        except ValueError:
+            pass
+    return due_date
+
+
+def due_string(ordinal) -> str:
+    if isinstance(ordinal, str):
+        return ordinal
+    return date.fromordinal(ordinal).isoformat() if ordinal else ""
+
+
+class TaskTable:
+    """Column-oriented, array-backed storage for bulk operations on many tasks.
+
+    Task ids are 0 for tasks that have none yet. Priority, status and
+    recurrence are codes into shared codebooks, due dates are date ordinals
+    (0 for none), and tags use a CSR layout: the tag ids of task i are
+    tag_ids[tag_offsets[i]:tag_offsets[i + 1]]. Only titles and descriptions
+    remain Python strings.
+    """
+
+    def __init__(self):
+        self.ids = array("Q")
+        self.titles = []
+        self.descriptions = []
+        self.priorities = Codebook()
+        self.statuses = Codebook()
+        self.recurrences = Codebook()
+        self.priority = array("H")
+        self.status = array("H")
+        self.recurring = array("H")
+        self.due = array("l")
+        self.tag_offsets = array("L", [0])
+        self.tag_ids = array("L")
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "TaskTable":
+        table = cls()
+        for record in records:
+            table.append(record)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def append(self, record: dict):
+        due = due_ordinal(record.get("due_date"))
+        if isinstance(due, str):
+            raise ValueError(f"Invalid due date: {due!r}")
+        self.ids.append(record.get("id") or 0)
+        self.titles.append(record["title"])
+        self.descriptions.append(record.get("description") or "")
+        self.priority.append(self.priorities.code(record.get("priority") or ""))
+        self.status.append(self.statuses.code(record.get("status") or "Pending"))
+        self.recurring.append(self.recurrences.code(record.get("recurring") or ""))
+        self.due.append(due)
+        self.tag_ids.extend(TAGS.code(tag) for tag in record.get("tags") or [])
+        self.tag_offsets.append(len(self.tag_ids))
+
+    def tags(self, pos: int) -> List[str]:
+        return [TAGS.value(i) for i in self.tag_ids[self.tag_offsets[pos]:self.tag_offsets[pos + 1]]]
+
+    def record(self, pos: int) -> dict:
+        return {
+            "id": self.ids[pos] or None,
+            "title": self.titles[pos],
+            "description": self.descriptions[pos],
+            "priority": self.priorities.value(self.priority[pos]),
+            "due_date": due_string(self.due[pos]),
+            "tags": self.tags(pos),
+            "status": self.statuses.value(self.status[pos]),
+            "recurring": self.recurrences.value(self.recurring[pos]) or None,
+        }
+
+    def records(self) -> Iterable[dict]:
+        return (self.record(pos) for pos in range(len(self)))
+
+    def overdue(self, today: date) -> List[int]:
+        """Positions of tasks with a due date before `today`."""
+        cutoff = today.toordinal()
+        return [pos for pos, due in enumerate(self.due) if 0 < due < cutoff]
+
+    def with_tag(self, tag: str) -> List[int]:
+        code = TAGS.codes.get(tag)
+        if code is None:
+            return []
+        offsets, ids = self.tag_offsets, self.tag_ids
+        return [pos for pos in range(len(self)) if code in ids[offsets[pos]:offsets[pos + 1]]]
+
+    def order_by_due(self) -> List[int]:
+        """Positions sorted by due date, tasks without one last."""
+        due = self.due
+        return sorted(range(len(self)), key=lambda pos: due[pos] or sys.maxsize)
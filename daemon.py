@@ -0,0 +1,160 @@
+"""Resident task server: keeps the store and its indexes in memory and
+answers commands over a Unix domain socket.
+
+    python daemon.py serve      # in the directory holding tasks.json
+    python daemon.py stop
+
+While it runs, app.py, milestone commands and client.py talk to it instead
+of opening tasks.json themselves (see storage.get_backend). Changes are
+answered from memory and written to disk in the background, batched into
+one commit every FLUSH_DELAY seconds; a stop or Ctrl+C writes out whatever
+is still pending before the server exits.
+"""
+import asyncio
+import json
+import os
+import signal
+from datetime import date
+
+import typer
+from rich.console import Console
+
+from client import DATA_FILE, connect, socket_path
+from recurrence import roll_forward
+from storage import JsonFileBackend
+
+app = typer.Typer()
+console = Console()
+
+# How long a change may wait in memory before it is written.
+FLUSH_DELAY = 0.05
+
+# Longest request line accepted; a chunk of an import or a whole save is one line.
+MAX_REQUEST_BYTES = 256 * 1024 * 1024
+
+READ_OPS = ("load", "count", "get", "get_many", "find", "counts", "recount", "query")
+WRITE_OPS = ("add", "add_many", "update", "delete", "update_where", "delete_where", "save", "compact", "roll_over")
+
+
+class TaskServer:
+    def __init__(self, data_file: str, journal: bool = False):
+        self.data_file = data_file
+        self.path = socket_path(data_file)
+        self.backend = JsonFileBackend(data_file, journal=journal, resident=True, write_behind=True)
+        self.dirty = asyncio.Event()
+        self.stopped = asyncio.Event()
+        self.connections = {}
+
+    async def serve(self):
+        self.backend.load()
+        server = await asyncio.start_unix_server(self.handle, path=self.path, limit=MAX_REQUEST_BYTES)
+        writer = asyncio.create_task(self.write_behind())
+        try:
+            async with server:
+                await self.stopped.wait()
+                # Clients that keep their connection open would hold up the shutdown.
+                handlers = list(self.connections.values())
+                for connection in list(self.connections):
+                    connection.close()
+                await asyncio.gather(*handlers, return_exceptions=True)
+        finally:
+            writer.cancel()
+            self.backend.flush()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def stop(self):
+        self.stopped.set()
+
+    async def write_behind(self):
+        while True:
+            await self.dirty.wait()
+            # Let the changes of a burst of commands pile up into one write.
+            await asyncio.sleep(FLUSH_DELAY)
+            self.dirty.clear()
+            self.backend.flush()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(json.dumps(self.reply(json.loads(line))).encode() + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    def reply(self, request: dict) -> dict:
+        op, args = request.get("op"), request.get("args", {})
+        try:
+            return {"result": self.call(op, args)}
+        except KeyError as e:
+            return {"error": "KeyError", "key": e.args[0]}
+        except Exception as e:
+            return {"error": type(e).__name__, "message": str(e)}
+
+    def call(self, op: str, args: dict):
+        if op == "stop":
+            self.stop()
+            return None
+        if op not in READ_OPS and op not in WRITE_OPS:
+            raise ValueError(f"Unknown operation: {op}")
+        backend = self.backend
+        if op == "roll_over":
+            today = date.fromisoformat(args["today"])
+            result = backend.roll_over(args["today"],
+                                       lambda t: roll_forward(t["due_date"], t["recurring"], today))
+        elif op == "query" and args.get("fields") is not None:
+            # Only the fields asked for cross the socket.
+            names = ["id", *args["fields"]]
+            result = [{name: record[name] for name in names if name in record} for record in backend.query(**args)]
+        else:
+            result = getattr(backend, op)(**args)
+        if op in WRITE_OPS:
+            self.dirty.set()
+        return result
+
+
+@app.command()
+def serve():
+    """Serve tasks.json from memory until stopped."""
+    client = connect(DATA_FILE)
+    if client is not None:
+        client.close()
+        console.print("[red]A task daemon is already running for this directory.[/red]")
+        raise typer.Exit()
+    if os.path.exists(socket_path(DATA_FILE)):
+        # Left behind by a daemon that did not shut down cleanly.
+        os.remove(socket_path(DATA_FILE))
+
+    async def main():
+        server = TaskServer(DATA_FILE, journal=os.environ.get("TASKS_STORAGE") == "journal")
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, server.stop)
+        await server.serve()
+
+    console.print(f"[green]Serving {DATA_FILE} on {socket_path(DATA_FILE)}[/green]")
+    asyncio.run(main())
+    console.print("[green]Task daemon stopped[/green]")
+
+
+@app.command()
+def stop():
+    """Stop the task daemon, after it has written out pending changes."""
+    client = connect(DATA_FILE)
+    if client is None:
+        console.print("[red]No task daemon is running.[/red]")
+        raise typer.Exit()
+    client.call("stop")
+    client.close()
+    console.print("[green]Task daemon stopped[/green]")
+
+
+if __name__ == "__main__":
+    app()
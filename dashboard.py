@@ -0,0 +1,118 @@
+"""Streamlit dashboard over tasks.json and multiuser_tasks.json.
+
+    streamlit run dashboard.py
+
+Run it in the folder holding the stores. The parsed store and every
+filtered, sorted view of it are cached for the whole server, keyed on the
+store files' stamp (their mtimes and sizes). Any number of viewers share
+one parse until a command changes the tasks. Filtering, sorting and
+paging all happen here, so a browser only ever receives the page it is
+looking at.
+"""
+import json
+from datetime import date
+from typing import List, Optional, Tuple
+
+import streamlit as st
+
+from indexes import count_records
+from storage import filter_records, get_backend, store_stamp
+
+# Columns shown for each store, in order.
+STORES = {
+    "tasks.json": ("id", "title", "priority", "status", "due_date", "tags", "recurring"),
+    "multiuser_tasks.json": ("id", "title", "description", "assigned_to", "created_by", "status"),
+}
+SORTS = {"id": None, "due date": "due", "priority": "priority"}
+PAGE_SIZES = (25, 50, 100, 250)
+# Seconds between refreshes of the table when auto-refresh is on.
+REFRESH_SECONDS = 5
+
+
+def current_stamp(path: str) -> str:
+    return json.dumps(store_stamp(path))
+
+
+# cache_resource rather than cache_data: every session gets the same objects
+# instead of its own unpickled copy, so nothing here may modify them.
+@st.cache_resource(max_entries=4, show_spinner="Reading tasks...")
+def load_store(path: str, stamp: str) -> List[dict]:
+    """The parsed store as of `stamp`, shared by every session."""
+    return get_backend(path).load()
+
+
+@st.cache_resource(max_entries=64)
+def select(path: str, stamp: str, search: Optional[str], sort_by: Optional[str], tags: Tuple[str, ...],
+           tag_mode: str, priority: Optional[str], status: Optional[str], user: Optional[str]) -> List[dict]:
+    """The tasks matching a set of filters, in display order."""
+    records = load_store(path, stamp)
+    if user:
+        records = [r for r in records if user in (r.get("assigned_to"), r.get("created_by"))]
+    return filter_records(records, search, sort_by, tags=list(tags) or None, tag_mode=tag_mode,
+                          priority=priority, status=status)
+
+
+@st.cache_resource(max_entries=8)
+def summary(path: str, stamp: str, today: str) -> dict:
+    return count_records(load_store(path, stamp), today)
+
+
+@st.cache_resource(max_entries=8)
+def tag_names(path: str, stamp: str) -> List[str]:
+    return sorted({tag for record in load_store(path, stamp) for tag in record.get("tags") or []})
+
+
+def page_rows(rows: List[dict], columns: Tuple[str, ...], page: int, page_size: int) -> List[dict]:
+    """Page `page` (from 1) of `rows`, with only the shown columns and tags joined up."""
+    shown = []
+    for record in rows[(page - 1) * page_size:page * page_size]:
+        row = {name: record.get(name) for name in columns}
+        if "tags" in row:
+            row["tags"] = ", ".join(row["tags"] or [])
+        shown.append(row)
+    return shown
+
+
+def main():
+    st.set_page_config(page_title="Tasks", layout="wide")
+    sidebar = st.sidebar
+    path = sidebar.radio("Store", tuple(STORES))
+    columns = STORES[path]
+    stamp = current_stamp(path)
+    search = sidebar.text_input("Search").strip() or None
+    tags, tag_mode, priority, user = (), "all", None, None
+    if "tags" in columns:
+        tags = tuple(sidebar.multiselect("Tags", tag_names(path, stamp)))
+        tag_mode = "any" if sidebar.toggle("Match any tag") else "all"
+    if "priority" in columns:
+        priority = sidebar.selectbox("Priority", (None, "high", "medium", "low"), format_func=lambda p: p or "any")
+    status = sidebar.selectbox("Status", (None, "Pending", "Completed"), format_func=lambda s: s or "any")
+    if "assigned_to" in columns:
+        user = sidebar.text_input("Assigned to or created by").strip() or None
+    sort_by = SORTS[sidebar.selectbox("Sort by", tuple(SORTS))] if "due_date" in columns else None
+    page_size = sidebar.selectbox("Rows per page", PAGE_SIZES, index=1)
+    refresh = sidebar.toggle(f"Refresh every {REFRESH_SECONDS} s")
+
+    @st.fragment(run_every=REFRESH_SECONDS if refresh else None)
+    def tasks_view():
+        # Re-stamped on every run, so an auto-refresh picks up changes from other commands.
+        stamp = current_stamp(path)
+        counts = summary(path, stamp, date.today().isoformat())
+        total, pending, completed, overdue = st.columns(4)
+        total.metric("Tasks", counts["total"])
+        pending.metric("Pending", counts["pending"])
+        completed.metric("Completed", counts["completed"])
+        overdue.metric("Overdue", counts["overdue"])
+
+        rows = select(path, stamp, search, sort_by, tags, tag_mode, priority, status, user)
+        pages = max(1, -(-len(rows) // page_size))
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, step=1)
+        st.caption(f"{len(rows)} matching tasks")
+        st.dataframe(page_rows(rows, columns, page, page_size), column_order=columns, hide_index=True,
+                     width="stretch")
+
+    tasks_view()
+
+
+if __name__ == "__main__":
+    main()
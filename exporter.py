@@ -0,0 +1,51 @@
+"""Streaming NDJSON export: one JSON task per line, optionally gzipped.
+
+Records are encoded CHUNK_SIZE at a time. With workers > 0, the chunks
+are encoded (and compressed) on a process pool, at most two per worker in
+flight, and written in their original order, so memory stays constant
+however many tasks there are. Each chunk is compressed as its own gzip
+member; concatenated members are a valid gzip file.
+"""
+import gzip
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List
+
+CHUNK_SIZE = 5000
+
+
+def encode_chunk(records: List[dict], compress: bool = False) -> bytes:
+    data = "".join([json.dumps(record) + "\n" for record in records]).encode()
+    # mtime=0 keeps the output identical for identical tasks.
+    return gzip.compress(data, compresslevel=6, mtime=0) if compress else data
+
+
+def chunks(records: Iterable[dict], size: int = CHUNK_SIZE) -> Iterator[List[dict]]:
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_ndjson(records: Iterable[dict], f, compress: bool = False, workers: int = 0) -> int:
+    """Write `records` to the binary file `f`; returns the number written."""
+    count = 0
+    if workers <= 0:
+        for chunk in chunks(records, CHUNK_SIZE):
+            f.write(encode_chunk(chunk, compress))
+            count += len(chunk)
+        return count
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in chunks(records, CHUNK_SIZE):
+            if len(pending) == 2 * workers:
+                f.write(pending.popleft().result())
+            pending.append(pool.submit(encode_chunk, chunk, compress))
+            count += len(chunk)
+        while pending:
+            f.write(pending.popleft().result())
+    return count
@@ -0,0 +1,156 @@
+"""Streaming bulk import of tasks from JSON Lines or CSV files.
+
+Rows are read one at a time and checked BATCH_SIZE at a time, so memory
+use does not grow with the size of the input. Bad rows are collected as
+RowErrors (up to MAX_ERRORS of them; the rest are only counted) and
+skipped, while the good ones go on to StorageBackend.add_many.
+"""
+import csv
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, List, Tuple
+
+from recurrence import RECURRENCES
+
+BATCH_SIZE = 1000
+MAX_ERRORS = 50
+
+PRIORITIES = ("low", "medium", "high")
+STATUSES = ("Pending", "Completed")
+
+# Header names used by `app.py export --format csv` and `milestone3.py backup --format csv`.
+CSV_FIELDS = {
+    "title": "title",
+    "description": "description",
+    "priority": "priority",
+    "status": "status",
+    "due date": "due_date",
+    "due_date": "due_date",
+    "tags": "tags",
+    "recurring": "recurring",
+}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported, with the line it came from."""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+
+def read_jsonl(f) -> Iterator[Tuple[int, object]]:
+    """(line number, parsed value) for every non-blank line; unparsable lines yield the RowError."""
+    for line_no, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, RowError(line_no, f"not valid JSON ({e.msg})")
+
+
+def read_csv(f) -> Iterator[Tuple[int, object]]:
+    """(line number, row dict) for every CSV row, with the header mapped to task fields."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [CSV_FIELDS.get(name.strip().lower()) for name in header]
+    if "title" not in fields:
+        raise ValueError("CSV header has no Title column")
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield reader.line_num, {field: value for field, value in zip(fields, row) if field}
+
+
+def clean_record(row) -> dict:
+    """The task record for one input row, or ValueError saying what is wrong with it."""
+    if not isinstance(row, dict):
+        raise ValueError("expected an object with task fields")
+    title = row.get("title")
+    if not isinstance(title, str) or not title.strip():
+        raise ValueError("missing title")
+    priority = (row.get("priority") or "medium").lower()
+    if priority not in PRIORITIES:
+        raise ValueError(f"invalid priority {priority!r}")
+    status = row.get("status") or "Pending"
+    if status not in STATUSES:
+        raise ValueError(f"invalid status {status!r}")
+    due_date = row.get("due_date") or ""
+    if due_date:
+        try:
+            datetime.strptime(due_date, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid due date {due_date!r}, use YYYY-MM-DD")
+    tags = row.get("tags") or []
+    if isinstance(tags, str):
+        tags = [tag.strip() for tag in tags.split(",") if tag.strip()]
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise ValueError("tags must be a list of strings")
+    recurring = row.get("recurring")
+    # Exports write "-", "" or "None" for tasks that do not recur.
+    if recurring in (None, "", "-", "none", "None"):
+        recurring = None
+    elif recurring not in RECURRENCES:
+        raise ValueError(f"invalid recurrence {recurring!r}")
+    description = row.get("description") or ""
+    if not isinstance(description, str):
+        raise ValueError("description must be text")
+    return {
+        "title": title,
+        "description": description,
+        "priority": priority,
+        "due_date": due_date,
+        "tags": tags,
+        "status": status,
+        "recurring": recurring,
+    }
+
+
+def validate_batch(rows: List[Tuple[int, object]]) -> Tuple[List[dict], List[RowError]]:
+    records, errors = [], []
+    for line_no, row in rows:
+        if isinstance(row, RowError):
+            errors.append(row)
+            continue
+        try:
+            records.append(clean_record(row))
+        except ValueError as e:
+            errors.append(RowError(line_no, str(e)))
+    return records, errors
+
+
+class BulkImport:
+    """Feeds the valid records of `rows` to add_many, keeping track of the bad ones."""
+
+    def __init__(self, rows: Iterable[Tuple[int, object]], batch_size: int = BATCH_SIZE):
+        self.rows = rows
+        self.batch_size = batch_size
+        self.errors = []
+        self.error_count = 0
+
+    def records(self) -> Iterator[dict]:
+        batch = []
+        for row in self.rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                yield from self._check(batch)
+                batch = []
+        if batch:
+            yield from self._check(batch)
+
+    def _check(self, batch) -> List[dict]:
+        records, errors = validate_batch(batch)
+        self.error_count += len(errors)
+        self.errors.extend(errors[:MAX_ERRORS - len(self.errors)])
+        return records
+
+
+def open_rows(f, format: str) -> Iterator[Tuple[int, object]]:
+    if format == "jsonl":
+        return read_jsonl(f)
+    if format == "csv":
+        return read_csv(f)
+    raise ValueError(f"Unsupported import format {format!r}, use jsonl or csv")
@@ -0,0 +1,619 @@
+import bisect
+import json
+from collections import Counter
+import os
+import sqlite3
+import struct
+from typing import Iterable, Iterator, List, Optional, Set
+
+SEARCH_FIELDS = ("title", "description", "status")
+
+TRIGRAM_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trigrams (
+    gram TEXT NOT NULL,
+    task_id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_trigrams_gram ON trigrams(gram, task_id);
+CREATE INDEX IF NOT EXISTS idx_trigrams_task ON trigrams(task_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Bumped when the sidecar layout changes; older sidecars are rebuilt.
+TRIGRAM_VERSION = 2
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def record_trigrams(record: dict) -> Set[str]:
+    """Trigrams of the lowercased searchable fields, taken per field."""
+    grams = set()
+    for field in SEARCH_FIELDS:
+        value = record.get(field)
+        if field == "status" and not value:
+            value = "Pending"
+        grams |= trigrams((value or "").lower())
+    return grams
+
+
+class Sidecar:
+    """What the SQLite sidecar indexes share: the stamp of the store they were
+    last synced with, and put/delete, alone or a batch at a time.
+
+    Subclasses open self.conn and implement _put and _delete, which run
+    inside a transaction opened for them.
+    """
+
+    conn: sqlite3.Connection
+
+    @property
+    def stamp(self) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'stamp'").fetchone()
+        return row[0] if row else None
+
+    def set_stamp(self, stamp: Optional[str]):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('stamp', ?)", (stamp,))
+
+    def put(self, record: dict):
+        """Index a new task, or re-index an existing one after it changed."""
+        with self.conn:
+            self._put(record)
+
+    def delete(self, task_id: int):
+        with self.conn:
+            self._delete(task_id)
+
+    def apply(self, changes: Iterable[dict]):
+        """Apply a batch of put/delete changes in one transaction, rather than one each."""
+        with self.conn:
+            for change in changes:
+                if change["op"] == "put":
+                    self._put(change["task"])
+                else:
+                    self._delete(change["id"])
+
+    def _put(self, record: dict):
+        raise NotImplementedError
+
+    def _delete(self, task_id: int):
+        raise NotImplementedError
+
+    def close(self):
+        self.conn.close()
+
+
+class TrigramIndex(Sidecar):
+    """Persisted trigram postings for case-insensitive substring search.
+
+    Every 3-character substring of a task's lowercased title, description
+    and status maps to the ids of the tasks containing it. A search only
+    intersects the postings of its own trigrams, and the caller then
+    verifies the few candidates against the real text.
+
+    The index remembers the stamp of the store it was last synced with, so
+    a store changed behind its back is detected and the index rebuilt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != TRIGRAM_VERSION:
+            self.conn.executescript("DROP TABLE IF EXISTS trigrams; DROP TABLE IF EXISTS meta;")
+            self.conn.execute("PRAGMA user_version = %d" % TRIGRAM_VERSION)
+        self.conn.executescript(TRIGRAM_SCHEMA)
+
+    def rebuild(self, records: List[dict]):
+        with self.conn:
+            self.conn.execute("DELETE FROM trigrams")
+            self.conn.executemany(
+                "INSERT INTO trigrams (gram, task_id) VALUES (?, ?)",
+                ((gram, record["id"]) for record in records for gram in record_trigrams(record)),
+            )
+
+    def _put(self, record: dict):
+        self.conn.execute("DELETE FROM trigrams WHERE task_id = ?", (record["id"],))
+        self.conn.executemany(
+            "INSERT INTO trigrams (gram, task_id) VALUES (?, ?)",
+            ((gram, record["id"]) for gram in record_trigrams(record)),
+        )
+
+    def _delete(self, task_id: int):
+        self.conn.execute("DELETE FROM trigrams WHERE task_id = ?", (task_id,))
+
+    def candidates(self, needle: str) -> Optional[List[int]]:
+        """Sorted ids of tasks that may contain `needle`, or None if it is too short to index."""
+        grams = trigrams(needle.lower())
+        if not grams:
+            return None
+        rows = self.conn.execute(
+            "SELECT task_id FROM trigrams WHERE gram IN (" + ", ".join("?" * len(grams)) + ")"
+            " GROUP BY task_id HAVING COUNT(DISTINCT gram) = ? ORDER BY task_id",
+            [*grams, len(grams)],
+        )
+        return [row[0] for row in rows]
+
+
+FIELD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings (
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    task_id INTEGER NOT NULL,
+    PRIMARY KEY (field, value, task_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_postings_task ON postings(task_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class FieldIndex(Sidecar):
+    """Persisted exact-match postings from field values to task ids.
+
+    Answers "tasks whose assigned_to or created_by is alice" with one
+    B-tree range per field, so the cost follows the number of matching
+    tasks rather than the size of the store. The indexed fields are kept in
+    the index itself, so any writer can keep it in step; passing a
+    different set of fields forces a rebuild. Like TrigramIndex, it stores
+    the stamp of the store it was last synced with.
+    """
+
+    def __init__(self, path: str, fields: Optional[List[str]] = None):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(FIELD_SCHEMA)
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'fields'").fetchone()
+        self.fields = json.loads(row[0]) if row else []
+        if fields is not None and sorted(fields) != self.fields:
+            self.fields = sorted(fields)
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fields', ?)",
+                                  (json.dumps(self.fields),))
+                self.conn.execute("DELETE FROM meta WHERE key = 'stamp'")
+
+    def _postings(self, record: dict):
+        return [(field, record[field], record["id"]) for field in self.fields if record.get(field) is not None]
+
+    def rebuild(self, records: List[dict]):
+        with self.conn:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO postings (field, value, task_id) VALUES (?, ?, ?)",
+                (posting for record in records for posting in self._postings(record)),
+            )
+
+    def _put(self, record: dict):
+        self.conn.execute("DELETE FROM postings WHERE task_id = ?", (record["id"],))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO postings (field, value, task_id) VALUES (?, ?, ?)",
+            self._postings(record),
+        )
+
+    def _delete(self, task_id: int):
+        self.conn.execute("DELETE FROM postings WHERE task_id = ?", (task_id,))
+
+    def lookup(self, value: str, fields: List[str]) -> List[int]:
+        """Sorted ids of tasks whose value in any of `fields` is `value`."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT task_id FROM postings WHERE field IN (" + ", ".join("?" * len(fields)) + ")"
+            " AND value = ? ORDER BY task_id",
+            [*fields, value],
+        )
+        return [row[0] for row in rows]
+
+
+# Fields a report breaks the task counts down by, besides status.
+COUNT_DIMENSIONS = ("assigned_to", "created_by", "due_date")
+
+COUNT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counts (
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (dimension, value, status)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS counted (
+    task_id INTEGER PRIMARY KEY,
+    keys TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def count_keys(record: dict) -> List[tuple]:
+    """The (dimension, value, status) counters one task adds 1 to."""
+    status = record.get("status") or "Pending"
+    keys = [("all", "", status)]
+    for dimension in COUNT_DIMENSIONS:
+        value = record.get(dimension)
+        if value:
+            keys.append((dimension, value, status))
+    return keys
+
+
+def summarize_counts(rows: Iterable[tuple], today: str) -> dict:
+    """Turn (dimension, value, status, n) counter rows into report totals.
+
+    Overdue counts unfinished tasks due before `today`. It is a sum over
+    the counters of each distinct due date, so it costs one step per due
+    date in use rather than one lookup; "dated" is how many tasks have a
+    due date at all, so stores without them can leave overdue out.
+    """
+    summary = {"total": 0, "completed": 0, "pending": 0, "overdue": 0, "dated": 0,
+               "by_status": {}, "by_assignee": {}, "by_creator": {}}
+    groups = {"assigned_to": summary["by_assignee"], "created_by": summary["by_creator"]}
+    for dimension, value, status, n in rows:
+        if not n:
+            continue
+        completed = status.lower() == "completed"
+        if dimension == "all":
+            summary["total"] += n
+            summary["completed"] += n if completed else 0
+            summary["by_status"][status] = summary["by_status"].get(status, 0) + n
+        elif dimension == "due_date":
+            summary["dated"] += n
+            if value < today and not completed:
+                summary["overdue"] += n
+        else:
+            group = groups[dimension].setdefault(value, {"total": 0, "completed": 0})
+            group["total"] += n
+            group["completed"] += n if completed else 0
+    summary["pending"] = summary["total"] - summary["completed"]
+    for group in (summary["by_status"], summary["by_assignee"], summary["by_creator"]):
+        ordered = dict(sorted(group.items()))
+        group.clear()
+        group.update(ordered)
+    return summary
+
+
+def count_records(records: Iterable[dict], today: str) -> dict:
+    """Report totals computed from scratch, the reference the counters must match."""
+    counter = Counter(key for record in records for key in count_keys(record))
+    return summarize_counts(((*key, n) for key, n in counter.items()), today)
+
+
+class CountIndex(Sidecar):
+    """Persisted task counters by status, assignee, creator and due date.
+
+    Each task adds 1 to the counters named by count_keys(); the keys it was
+    last counted under are kept next to them, so a put or delete only has
+    to move the task between a handful of counters. A report then reads
+    the counters instead of the tasks. Like the other sidecars, it stores
+    the stamp of the store it was last synced with.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(COUNT_SCHEMA)
+
+    def rows(self) -> List[tuple]:
+        return self.conn.execute("SELECT dimension, value, status, n FROM counts WHERE n != 0").fetchall()
+
+    def rebuild(self, records: List[dict]):
+        counter = Counter()
+        counted = []
+        for record in records:
+            keys = count_keys(record)
+            counter.update(keys)
+            counted.append((record["id"], json.dumps(keys)))
+        with self.conn:
+            self.conn.execute("DELETE FROM counts")
+            self.conn.execute("DELETE FROM counted")
+            self.conn.executemany("INSERT INTO counts (dimension, value, status, n) VALUES (?, ?, ?, ?)",
+                                  ((*key, n) for key, n in counter.items()))
+            self.conn.executemany("INSERT INTO counted (task_id, keys) VALUES (?, ?)", counted)
+
+    def _move(self, keys: Iterable[tuple], step: int):
+        self.conn.executemany(
+            "INSERT INTO counts (dimension, value, status, n) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (dimension, value, status) DO UPDATE SET n = n + excluded.n",
+            [(*key, step) for key in keys],
+        )
+
+    def _uncount(self, task_id: int):
+        row = self.conn.execute("SELECT keys FROM counted WHERE task_id = ?", (task_id,)).fetchone()
+        if row:
+            self._move((tuple(key) for key in json.loads(row[0])), -1)
+            self.conn.execute("DELETE FROM counted WHERE task_id = ?", (task_id,))
+
+    def _put(self, record: dict):
+        keys = count_keys(record)
+        self._uncount(record["id"])
+        self._move(keys, 1)
+        self.conn.execute("INSERT INTO counted (task_id, keys) VALUES (?, ?)", (record["id"], json.dumps(keys)))
+
+    def _delete(self, task_id: int):
+        self._uncount(task_id)
+
+
+def iter_bits(bits: int):
+    """Yield the positions of the set bits in `bits`, lowest first."""
+    text = bin(bits)[:1:-1]
+    pos = text.find("1")
+    while pos != -1:
+        yield pos
+        pos = text.find("1", pos + 1)
+
+
+def bits_from_positions(positions) -> int:
+    positions = list(positions)
+    if not positions:
+        return 0
+    buf = bytearray(max(positions) // 8 + 1)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buf, "little")
+
+
+def drop_bit(bits: int, pos: int) -> int:
+    """Remove bit `pos` from `bits`, shifting every higher bit down by one."""
+    return ((bits >> (pos + 1)) << pos) | (bits & ((1 << pos) - 1))
+
+
+class BitmapIndex:
+    """In-memory bitsets over task positions, plus a sorted due-date list.
+
+    Tags, priority and status each map a value to an int whose bit `pos`
+    is set when the task at `pos` has that value, so AND/OR of several
+    filters are single big-int operations. `due` holds (due_date, pos)
+    pairs in order, so date ranges and overdue checks are two bisections.
+    """
+
+    def __init__(self, records: List[dict]):
+        self.tags = {}
+        self.priority = {}
+        self.status = {}
+        self.due_dates = [record.get("due_date") or "" for record in records]
+        self.due = sorted((due, pos) for pos, due in enumerate(self.due_dates) if due)
+        # Collect positions first: OR-ing bits in one at a time would copy
+        # the whole bitset for every task.
+        postings = {}
+        for pos, record in enumerate(records):
+            for bitsets, key in self._keys(record):
+                postings.setdefault((id(bitsets), key), (bitsets, key, []))[2].append(pos)
+        for bitsets, key, positions in postings.values():
+            bitsets[key] = bits_from_positions(positions)
+
+    def _keys(self, record: dict):
+        for tag in record.get("tags") or []:
+            yield self.tags, tag
+        yield self.priority, (record.get("priority") or "").lower()
+        yield self.status, (record.get("status") or "Pending").lower()
+
+    def _set(self, record: dict, pos: int, on: bool):
+        bit = 1 << pos
+        for bitsets, key in self._keys(record):
+            if on:
+                bitsets[key] = bitsets.get(key, 0) | bit
+            else:
+                bitsets[key] &= ~bit
+
+    def add(self, record: dict):
+        pos = len(self.due_dates)
+        self._set(record, pos, True)
+        self.due_dates.append(record.get("due_date") or "")
+        if record.get("due_date"):
+            bisect.insort(self.due, (record["due_date"], pos))
+
+    def replace(self, pos: int, old: dict, new: dict):
+        self._set(old, pos, False)
+        self._set(new, pos, True)
+        old_due, new_due = old.get("due_date") or "", new.get("due_date") or ""
+        if old_due != new_due:
+            if old_due:
+                self.due.remove((old_due, pos))
+            if new_due:
+                bisect.insort(self.due, (new_due, pos))
+            self.due_dates[pos] = new_due
+
+    def delete(self, pos: int):
+        for bitsets in (self.tags, self.priority, self.status):
+            for key, bits in bitsets.items():
+                bitsets[key] = drop_bit(bits, pos)
+        self.due = [(due, p - (p > pos)) for due, p in self.due if p != pos]
+        self.due_dates.pop(pos)
+
+    def plan(self, tags: Optional[List[str]] = None, tag_mode: str = "all",
+             priority: Optional[str] = None, status: Optional[str] = None,
+             due_after: Optional[str] = None, due_before: Optional[str] = None) -> List[tuple]:
+        """Return (estimated rows, filter name, bitset or due slice) steps, most selective first."""
+        steps = []
+        if tags:
+            bits = 0 if tag_mode == "any" else -1
+            for tag in tags:
+                if tag_mode == "any":
+                    bits |= self.tags.get(tag, 0)
+                else:
+                    bits &= self.tags.get(tag, 0)
+            steps.append((bits.bit_count(), "tags", bits))
+        if priority:
+            bits = self.priority.get(priority.lower(), 0)
+            steps.append((bits.bit_count(), "priority", bits))
+        if status:
+            bits = self.status.get(status.lower(), 0)
+            steps.append((bits.bit_count(), "status", bits))
+        if due_after or due_before:
+            lo = bisect.bisect_right(self.due, (due_after, float("inf"))) if due_after else 0
+            hi = bisect.bisect_left(self.due, (due_before,)) if due_before else len(self.due)
+            steps.append((max(hi - lo, 0), "due", (lo, hi)))
+        steps.sort(key=lambda step: step[0])
+        return steps
+
+    def select(self, tags: Optional[List[str]] = None, tag_mode: str = "all",
+               priority: Optional[str] = None, status: Optional[str] = None,
+               due_after: Optional[str] = None, due_before: Optional[str] = None) -> Optional[List[int]]:
+        """Ascending positions matching every filter, or None when no filter is given."""
+        steps = self.plan(tags, tag_mode, priority, status, due_after, due_before)
+        if not steps:
+            return None
+        bits = None
+        for estimate, name, value in steps:
+            if name == "due":
+                if bits is not None and bits.bit_count() < estimate:
+                    # Fewer candidates left than dates in range: check those directly.
+                    value = bits_from_positions(
+                        pos for pos in iter_bits(bits)
+                        if self.due_dates[pos]
+                        and (not due_after or self.due_dates[pos] > due_after)
+                        and (not due_before or self.due_dates[pos] < due_before)
+                    )
+                else:
+                    lo, hi = value
+                    value = bits_from_positions(pos for _, pos in self.due[lo:hi])
+            bits = value if bits is None else bits & value
+            if not bits:
+                return []
+        return list(iter_bits(bits))
+
+
+class IdIndex:
+    """Fixed-width on-disk map from task id to the byte span of its current record.
+
+    The slot for id N sits at HEADER_SIZE + N * SLOT.size, so looking up,
+    moving or dropping one task is a single seek and a 16-byte read or
+    write, however large the store is. A slot holds the file the record
+    lives in (SNAPSHOT or JOURNAL), its offset and its length (0 means no
+    such task), and the length of the record's head, the part before its
+    wide fields (see storage.encode_row), or 0 if that is not known. The
+    JSON header records the store stamp the index
+    is in sync with, the number of live tasks and how much dead space the
+    snapshot has accumulated.
+    """
+
+    HEADER_SIZE = 256
+    SLOT = struct.Struct("<QIBHx")
+    SNAPSHOT = 1
+    JOURNAL = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self.file = open(path, mode)
+        self.file.seek(0)
+        header = self.file.read(self.HEADER_SIZE).rstrip(b" \0")
+        try:
+            self.header = json.loads(header) if header else {}
+        except ValueError:
+            self.header = {}
+
+    @property
+    def stamp(self) -> Optional[str]:
+        return self.header.get("stamp")
+
+    @property
+    def count(self) -> int:
+        return self.header.get("count", 0)
+
+    @property
+    def garbage(self) -> int:
+        """Bytes of the snapshot taken up by tombstones and superseded records."""
+        return self.header.get("garbage", 0)
+
+    def add_garbage(self, size: int):
+        self.header["garbage"] = self.garbage + size
+
+    @property
+    def next_id(self) -> int:
+        """One past the highest id ever given a slot, so ids are never reused."""
+        size = os.fstat(self.file.fileno()).st_size
+        return max(1, (size - self.HEADER_SIZE) // self.SLOT.size)
+
+    @staticmethod
+    def fit_head(head: int) -> int:
+        # Heads too long for their two bytes are stored as unknown.
+        return head if head <= 0xFFFF else 0
+
+    def _write_header(self):
+        text = json.dumps(self.header).encode()
+        if len(text) > self.HEADER_SIZE:
+            raise ValueError("IdIndex header too large")
+        self.file.seek(0)
+        self.file.write(text.ljust(self.HEADER_SIZE, b" "))
+
+    def set_stamp(self, stamp: Optional[str]):
+        self.header["stamp"] = stamp
+        self._write_header()
+        self.file.flush()
+
+    def get(self, task_id: int) -> Optional[tuple]:
+        """Return (where, offset, length) for a live task, else None."""
+        if task_id < 1:
+            return None
+        self.file.seek(self.HEADER_SIZE + task_id * self.SLOT.size)
+        data = self.file.read(self.SLOT.size)
+        if len(data) < self.SLOT.size:
+            return None
+        offset, length, where, _ = self.SLOT.unpack(data)
+        return (where, offset, length) if length else None
+
+    def live(self) -> List[tuple]:
+        """(task_id, where, offset, length, head) for every live task, in id order."""
+        self.file.seek(self.HEADER_SIZE)
+        table = self.file.read()
+        slots = self.SLOT.iter_unpack(table[:len(table) - len(table) % self.SLOT.size])
+        return [(task_id, where, offset, length, head)
+                for task_id, (offset, length, where, head) in enumerate(slots) if length]
+
+    def iter_live(self, block: int = 4096) -> Iterator[tuple]:
+        """Like live(), but reads the slots `block` at a time instead of all at once."""
+        task_id = 0
+        position = self.HEADER_SIZE
+        while True:
+            self.file.seek(position)
+            table = self.file.read(block * self.SLOT.size)
+            table = table[:len(table) - len(table) % self.SLOT.size]
+            if not table:
+                return
+            position += len(table)
+            for offset, length, where, head in self.SLOT.iter_unpack(table):
+                if length:
+                    yield task_id, where, offset, length, head
+                task_id += 1
+
+    def set(self, task_id: int, where: int, offset: int, length: int, head: int = 0):
+        if self.get(task_id) is None:
+            self.header["count"] = self.count + 1
+        self._write_slot(task_id, where, offset, length, head)
+
+    def clear(self, task_id: int):
+        if self.get(task_id) is not None:
+            self.header["count"] = self.count - 1
+            self._write_slot(task_id, 0, 0, 0)
+
+    def _write_slot(self, task_id: int, where: int, offset: int, length: int, head: int = 0):
+        end = self.HEADER_SIZE + task_id * self.SLOT.size
+        size = os.fstat(self.file.fileno()).st_size
+        if size < end:
+            # Zero-fill any gap so every slot below task_id reads as empty.
+            self.file.seek(max(size, self.HEADER_SIZE))
+            self.file.write(bytes(end - max(size, self.HEADER_SIZE)))
+        self.file.seek(end)
+        self.file.write(self.SLOT.pack(offset, length, where, self.fit_head(head)))
+
+    def rebuild(self, spans: List[tuple], next_id: int = 1):
+        """Replace every slot with `spans`, a list of (task_id, where, offset, length, head)."""
+        slots = max([next_id] + [span[0] + 1 for span in spans])
+        table = bytearray(slots * self.SLOT.size)
+        for task_id, where, offset, length, head in spans:
+            self.SLOT.pack_into(table, task_id * self.SLOT.size, offset, length, where, self.fit_head(head))
+        self.header["count"] = len(spans)
+        self.header["garbage"] = 0
+        self._write_header()
+        self.file.truncate(self.HEADER_SIZE)
+        self.file.seek(self.HEADER_SIZE)
+        self.file.write(table)
+
+    def close(self):
+        self.file.close()
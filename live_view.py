@@ -0,0 +1,60 @@
+"""`list --watch`: a task table that stays on screen and follows changes to the store.
+
+The tasks stay loaded between refreshes. Every CHECK_INTERVAL seconds the
+store files are stat'ed (store_stamp), and only when that changed, or the
+day did, are the tasks queried again; with the journal on, that replays
+just the lines appended since the last look. The cells of each row are
+kept per task and only rebuilt for tasks that changed, and when nothing
+on screen changed nothing is redrawn.
+"""
+import time
+from typing import Callable, Iterable, List
+
+# Seconds between checks for changes made by other commands.
+CHECK_INTERVAL = 1.0
+
+
+class LiveRows:
+    """The rows on screen, in order, with their cells cached by task id."""
+
+    def __init__(self, make_row: Callable[[dict, str], tuple]):
+        self.make_row = make_row
+        # task id -> (record, cells)
+        self.rows = {}
+        self.order = []
+        self.today = None
+
+    def update(self, records: Iterable[dict], today: str) -> bool:
+        """Take in the tasks to show now, rebuilding the cells of new and changed ones; True if the table changed."""
+        if today != self.today:
+            # Overdue dates are coloured against today.
+            self.rows, self.today = {}, today
+        rows = {}
+        order = []
+        changed = False
+        for record in records:
+            task_id = record["id"]
+            row = self.rows.get(task_id)
+            if row is None or row[0] != record:
+                row = (record, self.make_row(record, today))
+                changed = True
+            rows[task_id] = row
+            order.append(task_id)
+        changed = changed or order != self.order
+        self.rows, self.order = rows, order
+        return changed
+
+    def cells(self) -> List[tuple]:
+        return [self.rows[task_id][1] for task_id in self.order]
+
+
+def watch(stamp: Callable[[], object], refresh: Callable[[], None], check_every: float = CHECK_INTERVAL,
+          sleep: Callable[[float], None] = time.sleep):
+    """Call `refresh` now and then each time `stamp` changes, checking every `check_every` seconds, until interrupted."""
+    last = None
+    while True:
+        current = stamp()
+        if current != last:
+            last = current
+            refresh()
+        sleep(check_every)
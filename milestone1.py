@@ -1,29 +1,35 @@
 # milestone1.py
 import typer
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Confirm
 from datetime import datetime
-import json
-import os
-from typing import List
+from typing import List, Optional
+
+from columnar import intern_value
+import timings
+from startup import LazyConsole, run
+from storage import get_backend
 
 app = typer.Typer()
-console = Console()
+console = LazyConsole()
 
 DATA_FILE = "tasks.json"
 
+backend = get_backend(DATA_FILE)
+
 class Task:
-    def __init__(self, title, description, priority, due_date, tags, status="Pending"):
+    __slots__ = ("title", "description", "priority", "due_date", "tags", "status", "id")
+
+    def __init__(self, title, description, priority, due_date, tags, status="Pending", id=None):
+        self.id = id
         self.title = title
         self.description = description
-        self.priority = priority
+        self.priority = intern_value(priority)
         self.due_date = due_date
         self.tags = tags
-        self.status = status
+        self.status = intern_value(status)
 
     def to_dict(self):
         return {
+            "id": self.id,
             "title": self.title,
             "description": self.description,
             "priority": self.priority,
@@ -40,18 +46,17 @@ class Task:
             priority=data["priority"],
             due_date=data["due_date"],
             tags=data["tags"],
-            status=data.get("status", "Pending")
+            status=data.get("status", "Pending"),
+            id=data.get("id")
         )
 
 def load_tasks() -> List[Task]:
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return [Task.from_dict(t) for t in json.load(f)]
-    return []
+    records = backend.load()
+    with timings.phase("from_dict"):
+        return [Task.from_dict(t) for t in records]
 
 def save_tasks(tasks: List[Task]):
-    with open(DATA_FILE, "w") as f:
-        json.dump([t.to_dict() for t in tasks], f, indent=2)
+    backend.save([t.to_dict() for t in tasks])
 
 @app.command()
 def add():
@@ -71,14 +76,14 @@ def add():
     tags = [tag.strip() for tag in tags_input.split(",") if tag.strip()]
 
     task = Task(title, description, priority.lower(), due_date, tags)
-    tasks = load_tasks()
-    tasks.append(task)
-    save_tasks(tasks)
+    backend.add(task.to_dict())
     console.print(f"[green]Task '{title}' added![/green]")
 
 @app.command()
 def list():
     tasks = load_tasks()
+    from rich.table import Table
+    today = datetime.now().strftime("%Y-%m-%d")
     table = Table(title="Your Tasks")
     table.add_column("ID", style="dim", width=5)
     table.add_column("Title", style="bold cyan")
@@ -87,27 +92,38 @@ def list():
     table.add_column("Due")
     table.add_column("Tags")
 
-    for i, task in enumerate(tasks):
-        due_style = "[red]" if task.due_date and task.due_date < datetime.now().strftime("%Y-%m-%d") else ""
+    for task in tasks:
+        overdue = task.due_date and task.due_date < today
         table.add_row(
-            str(i + 1),
+            str(task.id),
             task.title,
             task.priority.capitalize(),
             task.status,
-            f"{due_style}{task.due_date}[/red]" if task.due_date else "-",
+            f"[red]{task.due_date}[/red]" if overdue else task.due_date or "-",
             ", ".join(task.tags)
         )
 
-    console.print(table)
+    with timings.phase("render"):
+        console.print(table)
 
 @app.command()
-def update(index: int):
-    tasks = load_tasks()
-    if not (1 <= index <= len(tasks)):
-        console.print("[red]Invalid task index.[/red]")
+def update(
+    task_id: Optional[int] = typer.Argument(None, help="A task to edit interactively"),
+    where: Optional[List[str]] = typer.Option(None, help="Instead, every task matching key=value (tag, status, priority, search); repeat to narrow"),
+    set_fields: Optional[List[str]] = typer.Option(None, "--set", help="field=value to set on the matching tasks; repeat for several"),
+    before: Optional[str] = typer.Option(None, help="Only tasks due before this date (YYYY-MM-DD)"),
+    dry_run: bool = typer.Option(False, help="Only report how many tasks match")
+):
+    if task_id is None:
+        from batch import update_matching
+        update_matching(backend, console, where, set_fields, before, dry_run)
+        return
+    record = backend.get(task_id)
+    if record is None:
+        console.print("[red]Invalid task ID.[/red]")
         raise typer.Exit()
 
-    task = tasks[index - 1]
+    task = Task.from_dict(record)
     console.print(f"Editing: [bold]{task.title}[/bold]")
     task.status = typer.prompt("New status (Pending/Completed)", default=task.status)
     task.due_date = typer.prompt("New due date (YYYY-MM-DD)", default=task.due_date)
@@ -119,21 +135,31 @@ def update(index: int):
             console.print("[red]Invalid date format![/red]")
             raise typer.Exit()
 
-    save_tasks(tasks)
+    backend.update(task_id, {"status": task.status, "due_date": task.due_date})
     console.print("[green]Task updated![/green]")
 
 @app.command()
-def delete(index: int):
-    tasks = load_tasks()
-    if not (1 <= index <= len(tasks)):
-        console.print("[red]Invalid task index.[/red]")
+def delete(
+    task_id: Optional[int] = typer.Argument(None, help="A task to delete"),
+    where: Optional[List[str]] = typer.Option(None, help="Instead, every task matching key=value (tag, status, priority, search); repeat to narrow"),
+    before: Optional[str] = typer.Option(None, help="Only tasks due before this date (YYYY-MM-DD)"),
+    dry_run: bool = typer.Option(False, help="Only report how many tasks match"),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Do not ask before deleting the matching tasks")
+):
+    if task_id is None:
+        from batch import delete_matching
+        delete_matching(backend, console, where, before, dry_run, yes)
+        return
+    record = backend.get(task_id)
+    if record is None:
+        console.print("[red]Invalid task ID.[/red]")
         raise typer.Exit()
 
-    task = tasks[index - 1]
+    from rich.prompt import Confirm
+    task = Task.from_dict(record)
     if Confirm.ask(f"Are you sure you want to delete '{task.title}'?"):
-        tasks.pop(index - 1)
-        save_tasks(tasks)
+        backend.delete(task_id)
         console.print("[red]Task deleted.[/red]")
 
 if __name__ == "__main__":
-    app()
+    run(app)
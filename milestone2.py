@@ -1,29 +1,36 @@
 import typer
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Confirm
-from datetime import datetime, timedelta
-import json
-import os
+from datetime import date, datetime
 from typing import Optional, List
 
+from columnar import intern_value
+from recurrence import next_due_date
+import timings
+from startup import LazyConsole, run
+from storage import get_backend
+
 app = typer.Typer()
-console = Console()
+console = LazyConsole()
 
 DATA_FILE = "tasks.json"
 
+backend = get_backend(DATA_FILE)
+
 class Task:
-    def __init__(self, title, description, priority, due_date, tags, status="Pending", recurring=None):
+    __slots__ = ("title", "description", "priority", "due_date", "tags", "status", "recurring", "id")
+
+    def __init__(self, title, description, priority, due_date, tags, status="Pending", recurring=None, id=None):
+        self.id = id
         self.title = title
         self.description = description
-        self.priority = priority
+        self.priority = intern_value(priority)
         self.due_date = due_date
         self.tags = tags
-        self.status = status
-        self.recurring = recurring
+        self.status = intern_value(status)
+        self.recurring = intern_value(recurring)
 
     def to_dict(self):
         return {
+            "id": self.id,
             "title": self.title,
             "description": self.description,
             "priority": self.priority,
@@ -42,31 +49,22 @@ class Task:
             due_date=data["due_date"],
             tags=data["tags"],
             status=data.get("status", "Pending"),
-            recurring=data.get("recurring")
+            recurring=data.get("recurring"),
+            id=data.get("id")
         )
 
 def load_tasks() -> List[Task]:
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return [Task.from_dict(t) for t in json.load(f)]
-    return []
+    records = backend.load()
+    with timings.phase("from_dict"):
+        return [Task.from_dict(t) for t in records]
 
 def save_tasks(tasks: List[Task]):
-    with open(DATA_FILE, "w") as f:
-        json.dump([t.to_dict() for t in tasks], f, indent=2)
+    backend.save([t.to_dict() for t in tasks])
 
 def generate_recurring_task(task: Task):
     if task.recurring and task.due_date:
-        due = datetime.strptime(task.due_date, "%Y-%m-%d")
-        now = datetime.now()
-        while due < now:
-            if task.recurring == "daily":
-                due += timedelta(days=1)
-            elif task.recurring == "weekly":
-                due += timedelta(weeks=1)
-            elif task.recurring == "monthly":
-                due += timedelta(days=30)
-        task.due_date = due.strftime("%Y-%m-%d")
+        due = datetime.strptime(task.due_date, "%Y-%m-%d").date()
+        task.due_date = next_due_date(due, task.recurring, date.today()).strftime("%Y-%m-%d")
     return task
 
 @app.command()
@@ -75,25 +73,15 @@ def list(
     search: Optional[str] = typer.Option(None),
     sort_by: Optional[str] = typer.Option(None)
 ):
-    tasks = load_tasks()
-
-    for t in tasks:
-        if t.recurring:
-            generate_recurring_task(t)
-    save_tasks(tasks)
-
-    if filter_tag:
-        tasks = [t for t in tasks if filter_tag in t.tags]
-
-    if search:
-        tasks = [t for t in tasks if search.lower() in t.title.lower() or search.lower() in t.description.lower() or search.lower() in t.status.lower()]
+    # Only writes when a recurring task actually moved to its next due date.
+    today = datetime.now().strftime("%Y-%m-%d")
+    backend.roll_over(today, lambda t: generate_recurring_task(Task.from_dict(t)).due_date)
 
-    if sort_by == "due":
-        tasks.sort(key=lambda x: x.due_date or "9999-99-99")
-    elif sort_by == "priority":
-        order = {"low": 3, "medium": 2, "high": 1}
-        tasks.sort(key=lambda x: order.get(x.priority, 99))
+    records = backend.query(search=search, sort_by=sort_by, tags=[filter_tag] if filter_tag else None)
+    with timings.phase("from_dict"):
+        tasks = [Task.from_dict(t) for t in records]
 
+    from rich.table import Table
     table = Table(title="Your Tasks")
     table.add_column("ID", style="dim", width=5)
     table.add_column("Title", style="bold cyan")
@@ -103,19 +91,20 @@ def list(
     table.add_column("Tags")
     table.add_column("Recurring")
 
-    for i, task in enumerate(tasks):
-        due_style = "[red]" if task.due_date and task.due_date < datetime.now().strftime("%Y-%m-%d") else ""
+    for task in tasks:
+        overdue = task.due_date and task.due_date < today
         table.add_row(
-            str(i + 1),
+            str(task.id),
             task.title,
             task.priority.capitalize(),
             task.status,
-            f"{due_style}{task.due_date}[/red]" if task.due_date else "-",
+            f"[red]{task.due_date}[/red]" if overdue else task.due_date or "-",
             ", ".join(task.tags),
             task.recurring or "-"
         )
 
-    console.print(table)
+    with timings.phase("render"):
+        console.print(table)
 
 if __name__ == "__main__":
-    app()
+    run(app)
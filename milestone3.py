@@ -1,25 +1,55 @@
 import typer
-from rich.console import Console
-from rich.prompt import Confirm
 import json
 import os
 import csv
-from typing import List
-from datetime import datetime
+from typing import Optional
 
-from milestone2 import Task, load_tasks, save_tasks
+from startup import LazyConsole, run
 
 app = typer.Typer()
-console = Console()
+console = LazyConsole()
 
 BACKUP_JSON = "backup_tasks.json"
 BACKUP_CSV = "backup_tasks.csv"
+BACKUP_NDJSON = "backup_tasks.ndjson"
+BACKUP_DIR = "backups"
 
 @app.command()
-def backup(format: str = typer.Option("json", help="Backup format: json or csv")):
-    tasks = load_tasks()
+def backup(
+    format: str = typer.Option("json", help="A full copy as json, csv or ndjson, or incremental for a snapshot in backups/"),
+    compression: str = typer.Option("gzip", help="Chunk compression for incremental backups: gzip or lzma"),
+    gzip_output: bool = typer.Option(False, "--gzip", help="gzip an ndjson backup"),
+    workers: int = typer.Option(0, min=0, help="Processes encoding an ndjson backup in parallel (0: this one)")
+):
+    # milestone2 brings in the whole task store; only import it once a command runs.
+    from milestone2 import DATA_FILE, backend, load_tasks
+
+    if format == "incremental":
+        from backups import COMPRESSORS, BackupStore
+        from storage import store_stamp
+        if compression not in COMPRESSORS:
+            console.print("[red]Unsupported compression. Use 'gzip' or 'lzma'.[/red]")
+            raise typer.Exit()
+        store = BackupStore(BACKUP_DIR)
+        stamp = store_stamp(DATA_FILE)
+        latest = store.find()
+        # Not even read when nothing changed since the last snapshot.
+        records = [] if latest and latest["stamp"] == stamp else backend.load()
+        entry = store.take(records, stamp, compression)
+        console.print(f"[green]Snapshot {entry['snapshot']}: {entry['tasks']} tasks, "
+                      f"{len(entry['changed'])} changed chunks, {entry['written']} bytes written[/green]")
+        return
+
+    if format == "ndjson":
+        from exporter import write_ndjson
+        path = BACKUP_NDJSON + ".gz" if gzip_output else BACKUP_NDJSON
+        with open(path, "wb") as f:
+            write_ndjson(backend.iter_query(), f, compress=gzip_output, workers=workers)
+        console.print(f"[green]Tasks backed up to {path}[/green]")
+        return
 
     if format == "json":
+        tasks = load_tasks()
         with open(BACKUP_JSON, "w") as f:
             json.dump([t.to_dict() for t in tasks], f, indent=2)
         console.print(f"[green]Tasks backed up to {BACKUP_JSON}[/green]")
@@ -28,26 +58,50 @@ def backup(format: str = typer.Option("json", help="Backup format: json or csv")
         with open(BACKUP_CSV, "w", newline="") as f:
             writer = csv.writer(f)
             writer.writerow(["Title", "Description", "Priority", "Status", "Due Date", "Tags", "Recurring"])
-            for t in tasks:
+            for t in backend.iter_query():
                 writer.writerow([
-                    t.title,
-                    t.description,
-                    t.priority,
-                    t.status,
-                    t.due_date,
-                    ",".join(t.tags),
-                    t.recurring or "-"
+                    t["title"],
+                    t["description"],
+                    t["priority"],
+                    t["status"],
+                    t["due_date"],
+                    ",".join(t["tags"]),
+                    t["recurring"] or "-"
                 ])
         console.print(f"[green]Tasks backed up to {BACKUP_CSV}[/green]")
     else:
-        console.print("[red]Unsupported format. Use 'json' or 'csv'.[/red]")
+        console.print("[red]Unsupported format. Use 'incremental', 'json', 'csv' or 'ndjson'.[/red]")
+
+@app.command()
+def snapshots():
+    """List the incremental backups restore --at can go back to."""
+    from backups import BackupStore
+    from rich.table import Table
+    table = Table(title="Snapshots")
+    for name in ("Snapshot", "Taken", "Tasks", "Changed chunks", "Bytes written"):
+        table.add_column(name)
+    for entry in BackupStore(BACKUP_DIR).snapshots():
+        table.add_row(str(entry["snapshot"]), entry["created"], str(entry["tasks"]),
+                      str(len(entry["changed"]) + len(entry["removed"])), str(entry["written"]))
+    console.print(table)
 
 @app.command()
-def restore(file: str = typer.Option(..., prompt=True)):
+def restore(
+    file: Optional[str] = typer.Option(None, help="A full json backup to restore; asked for unless --at is given"),
+    at: Optional[str] = typer.Option(None, help="Instead, a snapshot: its number, latest, or a date/time to restore the last one taken by then"),
+    yes: bool = typer.Option(False, "--yes", "-y", help="Do not ask before replacing the current tasks")
+):
+    """Replace every task with a json backup, or with an incremental snapshot (--at)."""
+    if at is not None:
+        restore_snapshot(None if at == "latest" else at, yes)
+        return
+    if file is None:
+        file = typer.prompt("File")
     if not os.path.exists(file):
         console.print("[red]Backup file does not exist.[/red]")
         raise typer.Exit()
 
+    from milestone2 import Task, save_tasks
     ext = file.split(".")[-1]
 
     try:
@@ -55,6 +109,8 @@ def restore(file: str = typer.Option(..., prompt=True)):
             with open(file, "r") as f:
                 data = json.load(f)
                 tasks = [Task.from_dict(d) for d in data]
+                if not confirm_replace(yes, f"the {len(tasks)} tasks in {file}"):
+                    return
                 save_tasks(tasks)
                 console.print(f"[green]Tasks restored from {file}[/green]")
         else:
@@ -62,5 +118,34 @@ def restore(file: str = typer.Option(..., prompt=True)):
     except Exception as e:
         console.print(f"[red]Failed to restore: {e}[/red]")
 
+def confirm_replace(yes: bool, source: str) -> bool:
+    if yes:
+        return True
+    from rich.prompt import Confirm
+    return Confirm.ask(f"Replace all current tasks with {source}?")
+
+def restore_snapshot(at: Optional[str], yes: bool):
+    from backups import BackupStore
+    from milestone2 import backend
+    store = BackupStore(BACKUP_DIR)
+    try:
+        entry = store.find(at)
+    except ValueError:
+        console.print("[red]--at must be a snapshot number, latest or a date (YYYY-MM-DD[THH:MM]).[/red]")
+        raise typer.Exit()
+    if entry is None:
+        console.print("[red]No such snapshot.[/red]")
+        raise typer.Exit()
+    try:
+        records = list(store.records(entry["snapshot"]))
+    except (OSError, ValueError) as e:
+        console.print(f"[red]Failed to restore: {e}[/red]")
+        raise typer.Exit()
+    if not confirm_replace(yes, f"the {len(records)} tasks of snapshot {entry['snapshot']} ({entry['created']})"):
+        return
+    backend.save(records)
+    console.print(f"[green]Restored {len(records)} tasks from snapshot {entry['snapshot']} "
+                  f"({entry['created']})[/green]")
+
 if __name__ == "__main__":
-    app()
+    run(app)
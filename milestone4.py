@@ -1,28 +1,38 @@
 import typer
-from rich.console import Console
-from rich.table import Table
-from rich.prompt import Confirm
 import json
 import os
-from typing import Optional, List
 from datetime import datetime
 
+from columnar import intern_value
+import timings
+from startup import LazyConsole, run
+from storage import get_backend
+
 app = typer.Typer()
-console = Console()
+console = LazyConsole()
 
 DATA_FILE = "multiuser_tasks.json"
 USERS_FILE = "users.json"
 
+# Per-user views look tasks up by assignee and creator instead of scanning.
+USER_FIELDS = ("assigned_to", "created_by")
+
+backend = get_backend(DATA_FILE, indexed_fields=USER_FIELDS)
+
 class Task:
-    def __init__(self, title, description, assigned_to, created_by, status="Pending"):
+    __slots__ = ("title", "description", "assigned_to", "created_by", "status", "id")
+
+    def __init__(self, title, description, assigned_to, created_by, status="Pending", id=None):
+        self.id = id
         self.title = title
         self.description = description
-        self.assigned_to = assigned_to
-        self.created_by = created_by
-        self.status = status
+        self.assigned_to = intern_value(assigned_to)
+        self.created_by = intern_value(created_by)
+        self.status = intern_value(status)
 
     def to_dict(self):
         return {
+            "id": self.id,
             "title": self.title,
             "description": self.description,
             "assigned_to": self.assigned_to,
@@ -37,10 +47,13 @@ class Task:
             description=data["description"],
             assigned_to=data["assigned_to"],
             created_by=data["created_by"],
-            status=data["status"]
+            status=data["status"],
+            id=data.get("id")
         )
 
 class User:
+    __slots__ = ("username",)
+
     def __init__(self, username):
         self.username = username
 
@@ -52,55 +65,52 @@ class User:
         return User(username=data["username"])
 
 def load_tasks():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r") as f:
-            return [Task.from_dict(t) for t in json.load(f)]
-    return []
+    return [Task.from_dict(t) for t in backend.load()]
 
 def save_tasks(tasks):
-    with open(DATA_FILE, "w") as f:
-        json.dump([t.to_dict() for t in tasks], f, indent=2)
+    backend.save([t.to_dict() for t in tasks])
 
 def load_users():
+    """Registered users keyed by username, in registration order."""
     if os.path.exists(USERS_FILE):
         with open(USERS_FILE, "r") as f:
-            return [User.from_dict(u) for u in json.load(f)]
-    return []
+            return {u["username"]: User.from_dict(u) for u in json.load(f)}
+    return {}
 
 def save_users(users):
     with open(USERS_FILE, "w") as f:
-        json.dump([u.to_dict() for u in users], f, indent=2)
+        json.dump([u.to_dict() for u in users.values()], f, indent=2)
 
 @app.command()
 def register(username: str):
     users = load_users()
-    if any(u.username == username for u in users):
+    if username in users:
         console.print("[red]User already exists.[/red]")
         raise typer.Exit()
-    users.append(User(username))
+    users[username] = User(username)
     save_users(users)
     console.print(f"[green]User '{username}' registered successfully![/green]")
 
 @app.command()
 def add(username: str, title: str, description: str, assign_to: str):
     users = load_users()
-    if not any(u.username == username for u in users):
+    if username not in users:
         console.print("[red]Invalid creator username.[/red]")
         raise typer.Exit()
-    if not any(u.username == assign_to for u in users):
+    if assign_to not in users:
         console.print("[red]Assignee user does not exist.[/red]")
         raise typer.Exit()
-    tasks = load_tasks()
     task = Task(title, description, assign_to, username)
-    tasks.append(task)
-    save_tasks(tasks)
+    backend.add(task.to_dict())
     console.print(f"[green]Task '{title}' assigned to '{assign_to}'.[/green]")
 
 @app.command()
 def list(username: str):
-    tasks = load_tasks()
-    user_tasks = [t for t in tasks if t.assigned_to == username or t.created_by == username]
+    records = backend.find(username, USER_FIELDS)
+    with timings.phase("from_dict"):
+        user_tasks = [Task.from_dict(t) for t in records]
 
+    from rich.table import Table
     table = Table(title=f"Tasks for {username}")
     table.add_column("Title", style="bold cyan")
     table.add_column("Description")
@@ -111,19 +121,44 @@ def list(username: str):
     for task in user_tasks:
         table.add_row(task.title, task.description, task.assigned_to, task.created_by, task.status)
 
-    console.print(table)
+    with timings.phase("render"):
+        console.print(table)
 
-@app.command()
-def report():
-    tasks = load_tasks()
-    total = len(tasks)
-    completed = sum(1 for t in tasks if t.status.lower() == "completed")
-    pending = total - completed
+def count_table(title: str, label: str, groups: dict):
+    from rich.table import Table
+    table = Table(title=title)
+    table.add_column(label, style="bold cyan")
+    table.add_column("Total")
+    table.add_column("Completed")
+    table.add_column("Pending")
+    for name, group in groups.items():
+        table.add_row(name, str(group["total"]), str(group["completed"]), str(group["total"] - group["completed"]))
+    return table
 
-    console.print(f"[bold blue]Total Tasks:[/bold blue] {total}")
-    console.print(f"[green]Completed Tasks:[/green] {completed}")
-    console.print(f"[yellow]Pending Tasks:[/yellow] {pending}")
+@app.command()
+def report(verify: bool = typer.Option(False, help="Recount every task and fix the stored counters if they drifted")):
+    # Served from counters kept up to date on every change, not by loading the tasks.
+    today = datetime.now().strftime("%Y-%m-%d")
+    counts = backend.counts(today)
+    if verify:
+        recounted = backend.recount(today)
+        if recounted != counts:
+            console.print("[red]Stored counters had drifted; rebuilt them from the tasks.[/red]")
+        else:
+            console.print("[green]Stored counters match the tasks.[/green]")
+        counts = recounted
+
+    console.print(f"[bold blue]Total Tasks:[/bold blue] {counts['total']}")
+    console.print(f"[green]Completed Tasks:[/green] {counts['completed']}")
+    console.print(f"[yellow]Pending Tasks:[/yellow] {counts['pending']}")
+    # Tasks created here have no due date; only stores that have some get an overdue count.
+    if counts["dated"]:
+        console.print(f"[red]Overdue Tasks:[/red] {counts['overdue']}")
+    if counts["by_assignee"]:
+        console.print(count_table("By Assignee", "Assignee", counts["by_assignee"]))
+    if counts["by_creator"]:
+        console.print(count_table("By Creator", "Creator", counts["by_creator"]))
 
 # ✅ Ready for milestone 5 next
 if __name__ == "__main__":
-    app()
+    run(app)
@@ -1,13 +1,22 @@
 import typer
-from rich.console import Console
+import copy
 import json
 import os
+import time
+
+from startup import LazyConsole, run
 
 app = typer.Typer()
-console = Console()
+console = LazyConsole()
 
 SETTINGS_FILE = "settings.json"
 
+# How long the cached settings are trusted before settings.json is stat'ed again.
+SETTINGS_RECHECK_SECONDS = 1.0
+
+# Used for message types without a colour, or whose colour does not parse.
+DEFAULT_COLOR = "white"
+
 # Default theme config
 def default_settings():
     return {
@@ -20,20 +29,74 @@ def default_settings():
         }
     }
 
+def settings_stamp():
+    try:
+        st = os.stat(SETTINGS_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def parse_style(color: str):
+    # Rich is imported here rather than at the top, so starting up doesn't pay for it.
+    from rich.errors import StyleSyntaxError
+    from rich.style import Style
+    try:
+        return Style.parse(color)
+    except StyleSyntaxError:
+        return Style.parse(DEFAULT_COLOR)
+
+class SettingsCache:
+    """settings.json parsed once per process, with a Rich Style per message type built on first use.
+
+    The file is re-read only when its mtime or size changed, and checked at
+    most once every SETTINGS_RECHECK_SECONDS, so printing adds no I/O.
+    """
+
+    def __init__(self):
+        self.settings = None
+        self.styles = {}
+        self.stamp = None
+        self.checked_at = 0.0
+
+    def get(self):
+        now = time.monotonic()
+        if self.settings is not None and now - self.checked_at < SETTINGS_RECHECK_SECONDS:
+            return self.settings
+        stamp = settings_stamp()
+        if stamp is None:
+            save_settings(default_settings())
+        elif stamp != self.stamp:
+            with open(SETTINGS_FILE, "r") as f:
+                self.update(json.load(f), stamp)
+        self.checked_at = now
+        return self.settings
+
+    def update(self, settings, stamp):
+        self.settings = settings
+        self.stamp = stamp
+        self.styles = {}
+        self.checked_at = time.monotonic()
+
+    def style(self, type_: str):
+        style = self.styles.get(type_)
+        if style is None:
+            style = self.styles[type_] = parse_style(self.settings["color_scheme"].get(type_, DEFAULT_COLOR))
+        return style
+
+settings_cache = SettingsCache()
+
 def load_settings():
-    if not os.path.exists(SETTINGS_FILE):
-        save_settings(default_settings())
-    with open(SETTINGS_FILE, "r") as f:
-        return json.load(f)
+    # A copy, so callers can edit it and hand it to save_settings.
+    return copy.deepcopy(settings_cache.get())
 
 def save_settings(settings):
     with open(SETTINGS_FILE, "w") as f:
         json.dump(settings, f, indent=2)
+    settings_cache.update(copy.deepcopy(settings), settings_stamp())
 
 def themed_print(message: str, type_: str = "info"):
-    settings = load_settings()
-    color = settings["color_scheme"].get(type_, "white")
-    console.print(f"[{color}]{message}[/{color}]")
+    settings_cache.get()
+    console.print(message, style=settings_cache.style(type_))
 
 @app.command()
 def change_theme():
@@ -91,4 +154,4 @@ def test_error_handling():
         themed_print("File not found.", "error")
 
 if __name__ == "__main__":
-    app()
+    run(app)
@@ -1,8 +1,60 @@
 # milestone6.py
-import unittest
+import asyncio
+import gzip
+import io
+import itertools
 import json
+import multiprocessing
 import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from collections import Counter
+from contextlib import redirect_stderr, redirect_stdout
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+import streamlit
+from streamlit.testing.v1 import AppTest
+from typer.testing import CliRunner
+
+import agenda
+import app as task_app
+import backups
+import batch
+import benchmark_scale
+import client
+import exporter
+import live_view
+import milestone3
+import milestone4
+import milestone5
+import recurrence
+import reminders
+import startup
+import storage
+import timings
+from columnar import TaskTable
+from daemon import TaskServer
+from importer import BulkImport, read_csv, read_jsonl
+from indexes import count_records
 from milestone1 import Task, load_tasks, save_tasks, DATA_FILE
+from recurrence import next_due_date, RECURRENCE_DAYS
+from storage import JsonFileBackend, SqliteBackend, filter_records, get_backend
+
+class TempDirTestCase(unittest.TestCase):
+    """Runs each test in a fresh temporary directory, so the stores it creates are thrown away."""
+
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        shutil.rmtree(self.tmp)
 
 class TestTaskManager(unittest.TestCase):
 
@@ -14,8 +66,9 @@ class TestTaskManager(unittest.TestCase):
         save_tasks(self.test_tasks)
 
     def tearDown(self):
-        if os.path.exists(DATA_FILE):
-            os.remove(DATA_FILE)
+        for path in (DATA_FILE, DATA_FILE + ".lock", DATA_FILE + ".ids", DATA_FILE + ".queue"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def test_task_save_and_load(self):
         loaded_tasks = load_tasks()
@@ -30,6 +83,1144 @@ class TestTaskManager(unittest.TestCase):
         self.assertEqual(task.title, new_task.title)
         self.assertEqual(task.due_date, new_task.due_date)
 
+class TestJournalStorage(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = JsonFileBackend("tasks.json", journal=True)
+
+    def make_task(self, title):
+        return task_app.Task(title, "", "medium", "", []).to_dict()
+
+    def test_mutations_replay_over_snapshot(self):
+        self.backend.save([self.make_task("A"), self.make_task("B")])
+        self.assertEqual(self.backend.add(self.make_task("C")), 3)
+        self.backend.update(1, {"status": "Completed"})
+        self.backend.delete(2)
+
+        loaded = JsonFileBackend("tasks.json", journal=True).load()
+        self.assertEqual([t["title"] for t in loaded], ["A", "C"])
+        self.assertEqual(loaded[0]["status"], "Completed")
+        with open("tasks.json") as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    def test_compact_folds_journal(self):
+        self.backend.add(self.make_task("A"))
+        self.assertTrue(os.path.exists(self.backend.journal_path))
+        self.backend.compact()
+        self.assertFalse(os.path.exists(self.backend.journal_path))
+        self.assertEqual([t["title"] for t in JsonFileBackend("tasks.json").load()], ["A"])
+
+    def test_torn_record_is_skipped(self):
+        self.backend.add(self.make_task("A"))
+        with open(self.backend.journal_path, "a") as f:
+            f.write('{"op":"add","ta')
+        self.backend.add(self.make_task("B"))
+        loaded = JsonFileBackend("tasks.json", journal=True).load()
+        self.assertEqual([t["title"] for t in loaded], ["A", "B"])
+
+class TestTaskIds(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        with open("tasks.json", "w") as f:
+            json.dump([{"title": t, "description": "", "priority": "low", "due_date": "", "tags": [],
+                        "status": "Pending", "recurring": None} for t in ("A", "B", "C")], f, indent=2)
+        self.backend = JsonFileBackend("tasks.json")
+
+    def test_files_without_ids_are_numbered_in_order(self):
+        self.assertEqual([t["id"] for t in self.backend.load()], [1, 2, 3])
+        self.assertEqual(JsonFileBackend("tasks.json").get(2)["title"], "B")
+        with open("tasks.json") as f:
+            self.assertEqual([t["id"] for t in json.load(f)], [1, 2, 3])
+
+    def test_single_task_changes_are_written_in_place(self):
+        self.backend.get(1)
+        size = os.path.getsize("tasks.json")
+        self.backend.update(2, {"status": "Completed"})
+        self.backend.delete(1)
+        self.assertEqual(os.path.getsize("tasks.json"), size)
+
+        self.backend.update(3, {"description": "a much longer description than before"})
+        self.assertEqual(self.backend.add(self.backend.get(2)), 4)
+        self.backend.delete(4)
+        self.assertEqual(self.backend.add(self.backend.get(2)), 5)
+
+        fresh = JsonFileBackend("tasks.json")
+        self.assertEqual([(t["id"], t["status"]) for t in fresh.load()], [(2, "Completed"), (3, "Pending"), (5, "Completed")])
+        self.assertEqual(JsonFileBackend("tasks.json").get(3)["description"], "a much longer description than before")
+        self.assertIsNone(JsonFileBackend("tasks.json").get(4))
+        self.assertEqual(fresh.count(), 3)
+
+    def test_journal_spans_resolve(self):
+        backend = JsonFileBackend("tasks.json", journal=True)
+        backend.update(1, {"title": "A2"})
+        self.assertEqual(backend.add(backend.get(3)), 4)
+        fresh = JsonFileBackend("tasks.json", journal=True)
+        self.assertEqual(fresh.get(1)["title"], "A2")
+        self.assertEqual(fresh.get(4)["title"], "C")
+        self.assertEqual(fresh.get(2)["title"], "B")
+        fresh.compact()
+        self.assertEqual(JsonFileBackend("tasks.json").get(4)["id"], 4)
+
+def add_and_complete(args):
+    count, group_commit = args
+    backend = JsonFileBackend("tasks.json", group_commit=group_commit)
+    ids = [backend.add(task_app.Task("T", "", "low", "", []).to_dict()) for _ in range(count)]
+    for task_id in ids[::2]:
+        backend.update(task_id, {"status": "Completed"})
+    return ids
+
+class TestConcurrentWriters(TempDirTestCase):
+
+    def test_no_lost_updates(self):
+        for group_commit in (False, True):
+            for name in os.listdir("."):
+                os.remove(name)
+            with multiprocessing.Pool(4) as pool:
+                ids = [i for chunk in pool.map(add_and_complete, [(25, group_commit)] * 4) for i in chunk]
+            loaded = JsonFileBackend("tasks.json").load()
+            self.assertEqual(sorted(ids), [t["id"] for t in loaded])
+            self.assertEqual(sum(t["status"] == "Completed" for t in loaded), 52)
+
+    def test_save_replaces_atomically(self):
+        backend = JsonFileBackend("tasks.json")
+        backend.save([task_app.Task("A", "", "low", "", []).to_dict()])
+        inode = os.stat("tasks.json").st_ino
+        backend.save([task_app.Task("B", "", "low", "", []).to_dict()])
+        self.assertNotEqual(os.stat("tasks.json").st_ino, inode)
+        self.assertFalse([name for name in os.listdir(".") if name.endswith(".tmp")])
+
+    def test_queued_add_and_import_get_different_ids(self):
+        JsonFileBackend("tasks.json").save([task_app.Task("seed", "", "low", "", []).to_dict()])
+        enqueue = JsonFileBackend._enqueue
+        imported = [task_app.Task("imported", "", "low", "", []).to_dict(),
+                    task_app.Task("saved", "", "low", "", []).to_dict()]
+
+        def enqueue_then_import(self, changes):
+            # Another process writes after this add is queued, but before it is committed.
+            token = enqueue(self, changes)
+            other = JsonFileBackend("tasks.json")
+            other.add_many([imported[0]])
+            other.save(other.load() + [dict(imported[1], id=None)])
+            return token
+
+        queued = JsonFileBackend("tasks.json", group_commit=True)
+        with mock.patch.object(JsonFileBackend, "_enqueue", enqueue_then_import):
+            self.assertEqual(queued.add(task_app.Task("queued", "", "low", "", []).to_dict()), 2)
+        records = JsonFileBackend("tasks.json").load()
+        self.assertEqual([(t["id"], t["title"]) for t in records], [(1, "seed"), (2, "queued"), (3, "imported"), (4, "saved")])
+        self.assertEqual(JsonFileBackend("tasks.json").add(task_app.Task("next", "", "low", "", []).to_dict()), 5)
+
+    def test_torn_in_place_write_is_redone(self):
+        JsonFileBackend("tasks.json").save([task_app.Task("T%d" % i, "", "low", "", []).to_dict() for i in range(5)])
+
+        def overwrite_and_crash(self, index, changes):
+            with open("tasks.json", "r+b") as f:
+                f.seek(index.get(2)[1])
+                f.write(b'{"id":2,"tit')
+            raise OSError("power cut")
+
+        def append_and_crash(self, index, changes):
+            with open("tasks.json", "r+b") as f:
+                f.seek(-3, os.SEEK_END)
+                f.write(b',\n{"id":6,"ti')
+                f.truncate()
+            raise OSError("power cut")
+
+        writer = JsonFileBackend("tasks.json")
+        with mock.patch.object(JsonFileBackend, "_patch", overwrite_and_crash), self.assertRaises(OSError):
+            writer.update(2, {"title": "Renamed"})
+        self.assertTrue(os.path.exists("tasks.json.redo"))
+        self.assertEqual([t["title"] for t in JsonFileBackend("tasks.json").load()], ["T0", "Renamed", "T2", "T3", "T4"])
+        self.assertFalse(os.path.exists("tasks.json.redo"))
+        with mock.patch.object(JsonFileBackend, "_patch", append_and_crash), self.assertRaises(OSError):
+            writer.add(task_app.Task("New", "", "low", "", []).to_dict())
+        # The next write finishes it before going ahead.
+        JsonFileBackend("tasks.json").update(4, {"status": "Completed"})
+        records = JsonFileBackend("tasks.json").load()
+        self.assertEqual([(t["id"], t["title"], t["status"]) for t in records][-3:],
+                         [(4, "T3", "Completed"), (5, "T4", "Pending"), (6, "New", "Pending")])
+        self.assertEqual(JsonFileBackend("tasks.json").get(6)["title"], "New")
+
+class TestUserViews(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.fields = ("assigned_to", "created_by")
+        self.backend = JsonFileBackend("multiuser_tasks.json", indexed_fields=self.fields)
+        for title, assignee, creator in (("A", "bob", "alice"), ("B", "alice", "alice"),
+                                         ("C", "carol", "bob"), ("D", "carol", "carol")):
+            self.backend.add({"title": title, "description": "", "assigned_to": assignee,
+                              "created_by": creator, "status": "Pending"})
+
+    def titles(self, username, backend=None):
+        return [t["title"] for t in (backend or self.backend).find(username, self.fields)]
+
+    def test_find_uses_field_index(self):
+        self.assertEqual(self.titles("alice"), ["A", "B"])
+        self.assertEqual(self.titles("bob"), ["A", "C"])
+        self.assertEqual(self.titles("dave"), [])
+        self.assertTrue(os.path.exists(self.backend.field_index_path))
+
+    def test_index_follows_other_writers(self):
+        self.titles("alice")
+        # A writer that was not told about the index still keeps it fresh.
+        other = JsonFileBackend("multiuser_tasks.json", journal=True)
+        other.update(3, {"assigned_to": "alice"})
+        other.delete(1)
+        index = self.backend._field_index(fresh_only=True)
+        self.assertIsNotNone(index)
+        index.close()
+        self.assertEqual(self.titles("alice", JsonFileBackend("multiuser_tasks.json", indexed_fields=self.fields)),
+                         ["B", "C"])
+        self.assertEqual(self.titles("alice"), [t["title"] for t in JsonFileBackend("multiuser_tasks.json").find("alice", self.fields)])
+
+    def test_counters_follow_mutations(self):
+        today = "2025-04-10"
+        self.backend.counts(today)
+        self.backend.update(2, {"status": "Completed", "due_date": "2025-04-01"})
+        self.backend.add({"title": "E", "description": "", "assigned_to": "bob", "created_by": "alice",
+                          "status": "Pending", "due_date": "2025-04-01"})
+        other = JsonFileBackend("multiuser_tasks.json", journal=True)
+        other.update(1, {"assigned_to": "carol"})
+        other.delete(4)
+        counts = JsonFileBackend("multiuser_tasks.json").counts(today)
+        self.assertEqual(counts, count_records(self.backend.load(), today))
+        self.assertEqual((counts["total"], counts["completed"], counts["overdue"], counts["dated"]), (4, 1, 1, 2))
+        self.assertEqual(counts["by_assignee"]["carol"], {"total": 2, "completed": 0})
+
+    def test_report_leaves_out_overdue_without_due_dates(self):
+        result = CliRunner().invoke(milestone4.app, ["report"])
+        self.assertIn("Total Tasks: 4", result.output)
+        self.assertNotIn("Overdue", result.output)
+        self.backend.update(2, {"due_date": "2000-01-01"})
+        self.assertIn("Overdue Tasks: 1", CliRunner().invoke(milestone4.app, ["report"]).output)
+
+    def test_recount_repairs_drift(self):
+        today = "2025-04-10"
+        index = self.backend._count_index()
+        index.put({"id": 99, "title": "ghost", "assigned_to": "dave"})
+        index.close()
+        self.assertIn("dave", self.backend.counts(today)["by_assignee"])
+        self.assertEqual(self.backend.recount(today), count_records(self.backend.load(), today))
+        self.assertNotIn("dave", self.backend.counts(today)["by_assignee"])
+
+    def test_batched_writes_keep_indexes_in_step(self):
+        today = "2025-04-10"
+        for task_id in (1, 2, 3):
+            self.backend.update(task_id, {"due_date": "2025-04-01", "recurring": "weekly"})
+        self.backend.counts(today)
+        self.titles("alice")
+        self.backend.query(search="b")
+        # One write changing several tasks keeps every sidecar in step with a single commit each.
+        self.assertEqual(self.backend.roll_over(today, lambda t: "2025-04-15"), 3)
+        self.assertEqual(len(self.backend._secondary_indexes()), 3)
+        fresh = {"counts": self.backend.counts(today), "alice": self.titles("alice"),
+                 "search": [t["title"] for t in self.backend.query(search="b")]}
+        for path in (self.backend.index_path, self.backend.field_index_path, self.backend.count_index_path):
+            os.remove(path)
+        rebuilt = JsonFileBackend("multiuser_tasks.json", indexed_fields=self.fields)
+        self.assertEqual(fresh, {"counts": rebuilt.counts(today), "alice": self.titles("alice", rebuilt),
+                                 "search": [t["title"] for t in rebuilt.query(search="b")]})
+
+    def test_sqlite_find(self):
+        backend = SqliteBackend("multiuser_tasks.db")
+        backend.save(self.backend.load())
+        self.assertEqual(self.titles("carol", backend), ["C", "D"])
+        backend.update(1, {"status": "Completed"})
+        backend.delete(3)
+        self.assertEqual(backend.counts("2025-01-01"), count_records(backend.load(), "2025-01-01"))
+        backend.conn.close()
+
+class TestTrigramSearch(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = JsonFileBackend("tasks.json", journal=True)
+        self.backend.save([
+            task_app.Task("Write Report", "quarterly numbers", "low", "", []).to_dict(),
+            task_app.Task("Buy milk", "", "high", "", []).to_dict(),
+        ])
+
+    def assertSearchMatchesScan(self, needle):
+        expected = filter_records(self.backend.load(), search=needle)
+        self.assertEqual(self.backend.query(search=needle), expected)
+
+    def test_search_is_case_insensitive_substring(self):
+        self.assertEqual([t["title"] for t in self.backend.query(search="REPO")], ["Write Report"])
+        self.assertEqual([t["title"] for t in self.backend.query(search="pending")], ["Write Report", "Buy milk"])
+        self.assertEqual(self.backend.query(search="ilk b"), [])
+        self.assertSearchMatchesScan("mi")
+
+    def test_index_follows_mutations(self):
+        self.backend.query(search="milk")
+        self.backend.add(task_app.Task("Milk the cow", "", "low", "", []).to_dict())
+        self.backend.delete(1)
+        self.backend.update(2, {"status": "Completed", "due_date": ""})
+        index = self.backend._search_index(fresh_only=True)
+        self.assertIsNotNone(index)
+        self.assertEqual(index.candidates("milk"), [2, 3])
+        index.close()
+        for needle in ("milk", "cow", "completed", "report"):
+            self.assertSearchMatchesScan(needle)
+
+    def test_external_rewrite_triggers_rebuild(self):
+        self.backend.query(search="milk")
+        JsonFileBackend("tasks.json").save([task_app.Task("Walk dog", "", "low", "", []).to_dict()])
+        self.assertEqual([t["title"] for t in self.backend.query(search="dog")], ["Walk dog"])
+
+class TestBitmapIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = JsonFileBackend("tasks.json", journal=True, resident=True)
+        self.backend.save([
+            task_app.Task("A", "", "high", "2025-04-01", ["work", "urgent"]).to_dict(),
+            task_app.Task("B", "", "low", "", ["home"]).to_dict(),
+            task_app.Task("C", "", "High", "2025-06-01", ["work"], status="Completed").to_dict(),
+            task_app.Task("D", "", "medium", "2025-05-01", ["urgent"]).to_dict(),
+        ])
+        self.queries = [
+            {"tags": ["work"]}, {"tags": ["work", "urgent"]}, {"tags": ["home", "urgent"], "tag_mode": "any"},
+            {"priority": "high"}, {"status": "COMPLETED"}, {"due_before": "2025-05-15"},
+            {"due_after": "2025-04-01", "due_before": "2025-07-01", "tags": ["work"]},
+            {"tags": ["urgent"], "due_after": "2025-01-01", "priority": "medium"},
+        ]
+
+    def assertQueriesMatchScan(self):
+        for query in self.queries:
+            self.assertEqual(self.backend.query(**query), filter_records(self.backend.load(), **query), query)
+
+    def test_bitmaps_follow_mutations(self):
+        self.assertQueriesMatchScan()
+        self.assertIsNotNone(self.backend._bitmaps)
+        self.backend.delete(1)
+        self.backend.add(task_app.Task("E", "", "high", "2025-04-20", ["work", "urgent"]).to_dict())
+        self.backend.update(3, {"status": "Pending", "due_date": "2025-03-01"})
+        self.assertQueriesMatchScan()
+
+    def test_plan_orders_by_selectivity(self):
+        self.backend.query(tags=["work"])
+        steps = self.backend._bitmaps.plan(tags=["urgent"], priority="medium", due_before="2025-12-31")
+        self.assertEqual([name for _, name, _ in steps], ["priority", "tags", "due"])
+
+class TestCompactTask(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [
+            task_app.Task("A", "x", "high", "2025-04-20", ["work", "home"], recurring="weekly").to_dict(),
+            task_app.Task("B", "", "low", "", [], status="Completed").to_dict(),
+            task_app.Task("C", "", "medium", "2025-01-05", ["work"]).to_dict(),
+        ]
+
+    def test_task_round_trips(self):
+        for record in self.records:
+            self.assertEqual(task_app.Task.from_dict(record).to_dict(), record)
+        task = task_app.Task("D", "", "low", "someday", ["x"])
+        self.assertEqual(task.due_date, "someday")
+        self.assertFalse(hasattr(task, "__dict__"))
+        with self.assertRaises(AttributeError):
+            task.tags.append("y")
+        task.tags = [*task.tags, "y"]
+        self.assertEqual(task.to_dict()["tags"], ["x", "y"])
+
+    def test_task_table_columns(self):
+        table = TaskTable.from_records(self.records)
+        self.assertEqual(len(table), 3)
+        self.assertEqual(list(table.records()), self.records)
+        self.assertEqual(table.overdue(date(2025, 3, 1)), [2])
+        self.assertEqual(table.with_tag("work"), [0, 2])
+        self.assertEqual(table.order_by_due(), [2, 0, 1])
+
+class TestPaging(unittest.TestCase):
+
+    def test_top_k_matches_full_sort(self):
+        records = [
+            {"title": str(i), "description": "", "priority": ["low", "medium", "high"][i % 3],
+             "due_date": "" if i % 7 == 0 else "2025-%02d-01" % (i % 12 + 1), "tags": [], "status": "Pending"}
+            for i in range(60)
+        ]
+        for sort_by in ("due", "priority"):
+            full = filter_records(records, sort_by=sort_by)
+            for offset, limit in ((0, 5), (10, 7), (55, 10)):
+                self.assertEqual(filter_records(records, sort_by=sort_by, limit=limit, offset=offset),
+                                 full[offset:offset + limit])
+        self.assertEqual(filter_records(records, limit=3, offset=4), records[4:7])
+
+class TestSqliteBackend(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = SqliteBackend("tasks.db")
+        self.backend.save([
+            task_app.Task("Write report", "Quarterly", "low", "2025-05-01", ["work", "urgent"]).to_dict(),
+            task_app.Task("Buy milk", "", "high", "", ["home"]).to_dict(),
+            task_app.Task("Ship release", "", "medium", "2025-04-01", ["work"], recurring="weekly").to_dict(),
+        ])
+
+    def tearDown(self):
+        self.backend.conn.close()
+        super().tearDown()
+
+    def test_query_matches_json_backend(self):
+        json_backend = JsonFileBackend("tasks.json")
+        json_backend.save(self.backend.load())
+        for kwargs in ({"tags": ["work"]}, {"search": "REPORT"}, {"sort_by": "due"}, {"sort_by": "priority"},
+                       {"tags": ["urgent", "home"], "tag_mode": "any"}, {"tags": ["work", "urgent"]},
+                       {"priority": "LOW", "status": "pending"}, {"due_after": "2025-04-01"},
+                       {"due_before": "2025-05-01", "tags": ["work"]},
+                       {"sort_by": "due", "limit": 2, "offset": 1}, {"limit": 1, "offset": 1},
+                       {"sort_by": "priority", "offset": 2}):
+            self.assertEqual(self.backend.query(**kwargs), json_backend.query(**kwargs))
+
+    def test_single_row_changes(self):
+        self.backend.update(2, {"status": "Completed"})
+        self.backend.delete(1)
+        self.assertEqual(self.backend.count(), 2)
+        self.assertIsNone(self.backend.get(1))
+        self.assertEqual(self.backend.get(2)["title"], "Buy milk")
+        self.assertEqual(self.backend.get(2)["status"], "Completed")
+        self.assertEqual(self.backend.get(3)["tags"], ["work"])
+        self.assertEqual([t["title"] for t in self.backend.query(search="COMPLETED")], ["Buy milk"])
+        self.assertEqual(self.backend.query(search="report"), [])
+        self.backend.delete(3)
+        self.assertEqual(self.backend.add(self.backend.get(2)), 4)
+
+    def test_roll_over_only_touches_stale_recurring(self):
+        self.backend.roll_over("2025-04-10", lambda t: "2025-04-15")
+        self.assertEqual([t["due_date"] for t in self.backend.load()], ["2025-05-01", "", "2025-04-15"])
+
+class TestSettingsCache(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        milestone5.settings_cache = milestone5.SettingsCache()
+
+    def test_themed_print_does_no_io(self):
+        milestone5.themed_print("first", "success")
+        self.assertTrue(os.path.exists(milestone5.SETTINGS_FILE))
+        with mock.patch("builtins.open") as opened, mock.patch("os.stat") as stat:
+            for _ in range(100):
+                milestone5.themed_print("again", "error")
+        opened.assert_not_called()
+        stat.assert_not_called()
+        self.assertEqual(milestone5.settings_cache.style("success").color.name, "green")
+
+    def test_external_change_is_picked_up(self):
+        settings = milestone5.load_settings()
+        settings["color_scheme"]["info"] = "magenta on white"
+        with open(milestone5.SETTINGS_FILE, "w") as f:
+            json.dump(settings, f)
+        with mock.patch.object(milestone5, "SETTINGS_RECHECK_SECONDS", 0):
+            self.assertEqual(milestone5.load_settings()["color_scheme"]["info"], "magenta on white")
+        self.assertEqual(milestone5.settings_cache.style("info").bgcolor.name, "white")
+
+    def test_rich_is_not_imported_at_start_up(self):
+        import subprocess
+        check = "import sys, milestone5; print(sorted(m for m in sys.modules if m.startswith('rich')))"
+        output = subprocess.run([sys.executable, "-c", check], cwd=self.old_cwd, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), "[]")
+        self.assertEqual(milestone5.parse_style("not a colour").color.name, "white")
+
+class TestDaemon(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        JsonFileBackend("tasks.json").add(Task("Existing", "", "low", "", [], "Pending").to_dict())
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        started = threading.Event()
+
+        async def run():
+            self.server = TaskServer("tasks.json")
+            started.set()
+            await self.server.serve()
+
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(run(),))
+        self.thread.start()
+        started.wait()
+        while not os.path.exists(client.socket_path("tasks.json")):
+            self.thread.join(0.01)
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.server.stop)
+            self.thread.join()
+        self.loop.close()
+        super().tearDown()
+
+    def test_commands_are_forwarded(self):
+        backend = get_backend("tasks.json")
+        self.assertIsInstance(backend, client.DaemonBackend)
+        task_id = backend.add(Task("Daemon", "", "high", "2025-04-20", ["work"], "Pending").to_dict())
+        self.assertEqual(task_id, 2)
+        backend.update(task_id, {"status": "Completed"})
+        self.assertEqual([t["title"] for t in backend.query(status="Completed")], ["Daemon"])
+        self.assertEqual([t["id"] for t in backend.query(search="daem")], [2])
+        with self.assertRaises(KeyError):
+            backend.delete(99)
+        backend.delete(1)
+        self.assertEqual(backend.count(), 1)
+
+    def test_changes_reach_the_file(self):
+        backend = get_backend("tasks.json")
+        backend.add(task_app.Task("Later", "", "low", "2025-04-01", [], "Pending", "weekly").to_dict())
+        self.assertEqual(backend.roll_over("2025-04-10", None), 1)
+        self.loop.call_soon_threadsafe(self.server.stop)
+        self.thread.join()
+        self.assertFalse(os.path.exists(client.socket_path("tasks.json")))
+        records = JsonFileBackend("tasks.json").load()
+        self.assertEqual([t["title"] for t in records], ["Existing", "Later"])
+        self.assertEqual(records[1]["due_date"], "2025-04-15")
+        self.assertIsInstance(get_backend("tasks.json"), JsonFileBackend)
+
+
+class TestStartup(TempDirTestCase):
+
+    def test_json_output(self):
+        runner = CliRunner()
+        result = runner.invoke(task_app.app, ["add", "--title", "Plain", "--description", "", "--priority", "low",
+                                              "--due-date", "", "--tags-input", "a,b", "--recurring", "none",
+                                              "--format", "json"])
+        self.assertEqual(json.loads(result.output), {"id": 1})
+        result = runner.invoke(task_app.app, ["list", "--format", "json"])
+        records = [json.loads(line) for line in result.output.splitlines()]
+        self.assertEqual([(t["id"], t["title"], t["tags"]) for t in records], [(1, "Plain", ["a", "b"])])
+
+    def test_client_rejects_bad_input_before_the_store(self):
+        for argv in (["add", "X", "--due-date", "2020/01/05", "--recurring", "daily"],
+                     ["add", "X", "--recurring", "yearly"], ["update", "1", "--due-date", "tomorrow"],
+                     ["list", "--due-after", "2020-13-01"]):
+            with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                client.main(argv)
+        self.assertEqual(os.listdir("."), [])
+        with mock.patch.dict(os.environ, {"TASKS_DAEMON": "0"}), redirect_stdout(io.StringIO()):
+            client.main(["add", "X", "--due-date", "2020-01-05", "--recurring", "none"])
+        self.assertEqual(JsonFileBackend("tasks.json").get(1)["recurring"], None)
+
+    def test_profile_report(self):
+        lines = [
+            "import time: self [us] | cumulative | imported package",
+            "import time:       300 |        300 |     click.core",
+            "import time:       200 |        500 |   click",
+            "import time:      1500 |       2000 |   typer.main",
+            "import time:       500 |       3000 | typer",
+            "import time:      1200 |       1200 | storage",
+            "import time:        10 |         10 | tiny",
+        ]
+        entries = startup.parse_importtime(lines)
+        self.assertEqual(entries[0], (2, "click.core", 0.3, 0.3))
+        report = startup.format_profile("app.py add", entries, 10.0).splitlines()
+        self.assertEqual([line.split()[-1] for line in report[2:]],
+                         ["typer", "typer.main", "storage", "imports", "command"])
+        self.assertEqual(report[2].split()[:2], ["3.0", "0.5"])
+
+
+class TestBulkImport(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.backend = JsonFileBackend("tasks.json")
+        self.backend.add(task_app.Task("Existing", "", "low", "", []).to_dict())
+
+    def test_jsonl_skips_bad_rows(self):
+        lines = [
+            json.dumps({"title": "Imported", "priority": "High", "due_date": "2025-04-20", "tags": ["work"]}),
+            "",
+            "{not json",
+            json.dumps({"title": "Bad date", "due_date": "2025-02-30"}),
+            json.dumps({"title": "Weekly", "recurring": "weekly", "status": "Completed"}),
+        ]
+        bulk = BulkImport(read_jsonl(lines), batch_size=2)
+        self.assertEqual(self.backend.add_many(bulk.records()), 2)
+        self.assertEqual([str(e) for e in bulk.errors][1], "line 4: invalid due date '2025-02-30', use YYYY-MM-DD")
+        self.assertEqual([e.line for e in bulk.errors], [3, 4])
+
+        fresh = JsonFileBackend("tasks.json")
+        self.assertEqual([(t["id"], t["title"], t["priority"]) for t in fresh.load()],
+                         [(1, "Existing", "low"), (2, "Imported", "high"), (3, "Weekly", "medium")])
+        self.assertEqual(fresh.get(3)["recurring"], "weekly")
+        self.assertEqual([t["id"] for t in fresh.query(search="import")], [2])
+        self.assertEqual(fresh.add(task_app.Task("After", "", "low", "", []).to_dict()), 4)
+
+    def test_exported_csv_round_trips(self):
+        self.backend.update(1, {"tags": ["a", "b"], "recurring": "daily", "due_date": "2025-04-01"})
+        result = CliRunner().invoke(task_app.app, ["export", "--format", "csv"])
+        self.assertEqual(result.exit_code, 0)
+        with open("backup_tasks.csv", newline="") as f:
+            self.assertEqual(self.backend.add_many(BulkImport(read_csv(f)).records()), 1)
+        copy = JsonFileBackend("tasks.json").get(2)
+        original = JsonFileBackend("tasks.json").get(1)
+        self.assertEqual({**copy, "id": 1}, original)
+
+    def test_failed_import_leaves_store_alone(self):
+        def records():
+            yield task_app.Task("Half", "", "low", "", []).to_dict()
+            raise ValueError("CSV header has no Title column")
+
+        with self.assertRaises(ValueError):
+            self.backend.add_many(records())
+        fresh = JsonFileBackend("tasks.json")
+        self.assertEqual([t["title"] for t in fresh.load()], ["Existing"])
+        self.assertEqual(fresh.add(task_app.Task("Next", "", "low", "", []).to_dict()), 3)
+
+
+class TestIncrementalBackups(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = backups.BackupStore("backups")
+        self.records = [task_app.Task("T%d" % i, "", "low", "", []).to_dict() for i in range(1, 601)]
+        for i, record in enumerate(self.records, 1):
+            record["id"] = i
+
+    def test_only_changed_chunks_are_written(self):
+        first = self.store.take(self.records, stamp=["a"])
+        self.assertEqual(len(first["changed"]), 3)
+        changed = [dict(r) for r in self.records[:-100]]
+        changed[300]["status"] = "Completed"
+        second = self.store.take(changed, stamp=["b"], compression="lzma")
+        self.assertEqual(sorted(second["changed"]), ["1"])
+        self.assertEqual(second["removed"], [2])
+        self.assertEqual(self.store.take([], stamp=["b"])["changed"], {})
+
+        self.assertEqual(list(self.store.records(1)), self.records)
+        self.assertEqual(list(self.store.records(3)), changed)
+        self.assertEqual(self.store.find("2")["snapshot"], 2)
+        self.assertIsNone(self.store.find("2000-01-01"))
+        self.assertEqual(self.store.find()["snapshot"], 3)
+
+    def test_restore_at(self):
+        runner = CliRunner()
+        task_app.backend.save(self.records[:10])
+        self.assertEqual(runner.invoke(milestone3.app, ["backup", "--format", "incremental"]).exit_code, 0)
+        task_app.backend.delete(3)
+        task_app.backend.update(4, {"status": "Completed"})
+        self.assertEqual(runner.invoke(milestone3.app, ["backup", "--format", "incremental"]).exit_code, 0)
+        before = JsonFileBackend("tasks.json").load()
+        result = runner.invoke(milestone3.app, ["restore", "--at", "1"], input="n\n")
+        self.assertIn("Replace all current tasks with the 10 tasks of snapshot 1", result.output)
+        self.assertEqual(JsonFileBackend("tasks.json").load(), before)
+        result = runner.invoke(milestone3.app, ["restore", "--at", "1"], input="y\n")
+        self.assertIn("Restored 10 tasks from snapshot 1", result.output)
+        self.assertEqual(JsonFileBackend("tasks.json").load(), self.records[:10])
+        runner.invoke(milestone3.app, ["restore", "--at", "latest", "--yes"])
+        restored = JsonFileBackend("tasks.json").load()
+        self.assertEqual([t["id"] for t in restored], [1, 2, 4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(restored[2]["status"], "Completed")
+
+    def test_plain_backup_and_restore_use_a_json_copy(self):
+        runner = CliRunner()
+        task_app.backend.save(self.records[:3])
+        self.assertEqual(runner.invoke(milestone3.app, ["backup"]).exit_code, 0)
+        self.assertTrue(os.path.exists(milestone3.BACKUP_JSON))
+        self.assertFalse(os.path.exists(milestone3.BACKUP_DIR))
+        task_app.backend.delete(2)
+        result = runner.invoke(milestone3.app, ["restore"], input=milestone3.BACKUP_JSON + "\ny\n")
+        self.assertIn("restored from", result.output)
+        self.assertEqual([t["title"] for t in JsonFileBackend("tasks.json").load()], [r["title"] for r in self.records[:3]])
+
+
+class TestNdjsonExport(TempDirTestCase):
+
+    def test_export_streams_from_the_store(self):
+        records = [task_app.Task("T%d" % i, "", "low", "", ["x"]).to_dict() for i in range(10)]
+        for journal in (False, True):
+            for name in os.listdir("."):
+                os.remove(name)
+            JsonFileBackend("tasks.json", journal=journal).save([dict(r) for r in records])
+            writer = JsonFileBackend("tasks.json", journal=journal)
+            writer.update(3, {"description": "much longer than it was " * 10})
+            writer.delete(5)
+            writer.add(dict(records[0], title="New"))
+            expected = JsonFileBackend("tasks.json", journal=journal).load()
+            with mock.patch.object(JsonFileBackend, "load") as load:
+                streamed = JsonFileBackend("tasks.json", journal=journal).iter_query()
+                self.assertEqual(list(streamed), expected)
+                self.assertEqual([t["id"] for t in JsonFileBackend("tasks.json", journal=journal).iter_query(limit=2, offset=3)], [4, 6])
+            load.assert_not_called()
+        # An index left behind by an outside edit is not trusted.
+        with open("tasks.json", "a") as f:
+            f.write(" ")
+        self.assertEqual(list(JsonFileBackend("tasks.json", journal=True).iter_query()), expected)
+
+    def test_parallel_output_matches_serial(self):
+        records = [task_app.Task("T%d" % i, "", "low", "", ["x"]).to_dict() for i in range(23)]
+        with mock.patch.object(exporter, "CHUNK_SIZE", 5):
+            serial, parallel = io.BytesIO(), io.BytesIO()
+            self.assertEqual(exporter.write_ndjson(iter(records), serial), 23)
+            self.assertEqual(exporter.write_ndjson(iter(records), parallel, compress=True, workers=2), 23)
+        self.assertEqual(gzip.decompress(parallel.getvalue()), serial.getvalue())
+        self.assertEqual([json.loads(line) for line in serial.getvalue().splitlines()], records)
+
+
+class TestScaleBenchmark(unittest.TestCase):
+
+    def test_every_operation_is_measured(self):
+        results = benchmark_scale.benchmark(300, repeat=1)
+        self.assertEqual(list(results), list(benchmark_scale.OPERATIONS))
+        for result in results.values():
+            self.assertGreater(result["seconds"], 0)
+            self.assertGreaterEqual(result["peak_mb"], 0)
+
+    def test_regressions_past_threshold(self):
+        before = {"1000": {"load_tasks": {"seconds": 0.1, "peak_mb": 10.0},
+                           "backup": {"seconds": 0.001, "peak_mb": 1.0}}}
+        after = {"1000": {"load_tasks": {"seconds": 0.14, "peak_mb": 10.5},
+                          "backup": {"seconds": 0.004, "peak_mb": 1.5},
+                          "restore": {"seconds": 9.0, "peak_mb": 9.0}},
+                 "100000": {"load_tasks": {"seconds": 9.0, "peak_mb": 900.0}}}
+        # Only load_tasks slowed down beyond 25% by more than the noise floor; new rows are not compared.
+        self.assertEqual(benchmark_scale.regressions(before, after, 0.25),
+                         [("1000", "load_tasks", "seconds", 0.1, 0.14)])
+        self.assertEqual(benchmark_scale.regressions(before, after, 0.5), [])
+
+
+class TestTimings(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        JsonFileBackend("tasks.json").save([task_app.Task("Task %d" % i, "", "low", "2025-04-%02d" % (i + 1),
+                                                          ["work"] if i % 2 else []).to_dict() for i in range(20)])
+
+    def test_off_by_default(self):
+        items = [1, 2]
+        self.assertIs(timings.phase("load"), timings.phase("parse"))
+        self.assertIs(timings.timed("filter", items), items)
+        JsonFileBackend("tasks.json").query(search="task 1", sort_by="due")
+        self.assertEqual((timings.phases, dict(timings.counters)), ([], {}))
+
+    def test_summary_and_trace(self):
+        stderr = io.StringIO()
+        command = lambda: JsonFileBackend("tasks.json").query(sort_by="due", tags=["work"])
+        with mock.patch.object(sys, "argv", ["app.py", "--timings", "list"]), \
+                mock.patch.dict(os.environ, {timings.TRACE_ENV: "trace.json"}), redirect_stderr(stderr):
+            timings.run(command)
+        self.assertFalse(timings.enabled)
+        lines = stderr.getvalue().splitlines()
+        self.assertEqual(lines[0], "Timings: app.py list")
+        phases = [line.split()[2:] for line in lines[2:] if not line.split()[1].isalpha()]
+        # Filtering is pulled by the sort, so it nests under it.
+        self.assertEqual([" ".join(p) for p in phases], ["command", "load", "read", "parse", "replay journal", "sort",
+                                                        "filter"])
+        counters = {line.split(None, 1)[1].strip(): line.split()[0] for line in lines if line.split()[1] in ("MB", "tasks")}
+        self.assertEqual((counters["tasks loaded"], counters["tasks matched"]), ("20", "10"))
+        with open("trace.json") as f:
+            events = json.load(f)["traceEvents"]
+        self.assertEqual({e["name"] for e in events if e["ph"] == "X"},
+                         {"command", "load", "read", "parse", "replay journal", "sort", "filter"})
+        command_event = next(e for e in events if e["name"] == "command")
+        for event in events:
+            self.assertLessEqual(command_event["ts"], event["ts"])
+        self.assertEqual(next(e for e in events if e["ph"] == "C")["args"]["tasks matched"], 10)
+
+
+class TestReminders(unittest.TestCase):
+
+    def task(self, task_id, due_date, recurring=None, status="Pending"):
+        return {"id": task_id, "title": "T%d" % task_id, "due_date": due_date, "recurring": recurring, "status": status}
+
+    def test_events_as_days_pass(self):
+        r = reminders.Reminders()
+        tasks = [self.task(1, "2025-04-10"), self.task(2, "2025-04-12"), self.task(3, "2025-04-09", "weekly"),
+                 self.task(4, "2025-04-01", status="Completed"), self.task(5, "")]
+        first = r.sync(tasks, date(2025, 4, 10))
+        self.assertEqual([(e["event"], e["id"], e["due_date"]) for e in first], [("due", 1, "2025-04-10")])
+        self.assertEqual(r.next_day(), date(2025, 4, 11))
+        self.assertEqual(r.due(date(2025, 4, 10)), [])
+        later = r.due(date(2025, 4, 16))
+        # Days slept through are not replayed: task 1 is overdue once, and task 3
+        # (due again on the 16th, computed without stepping) is due today.
+        self.assertEqual(sorted((e["event"], e["id"], e["due_date"]) for e in later),
+                         [("due", 3, "2025-04-16"), ("overdue", 1, "2025-04-10"), ("overdue", 2, "2025-04-12")])
+        self.assertEqual(r.next_day(), date(2025, 4, 23))
+        self.assertEqual(r.due(date(2025, 4, 17)), [])
+
+    def test_bad_due_dates_are_skipped(self):
+        r = reminders.Reminders()
+        tasks = [self.task(1, "2025/04/10"), self.task(2, "2025-04-10"), self.task(3, "soon", "daily"), self.task(4, 5)]
+        self.assertEqual([e["id"] for e in r.sync(tasks, date(2025, 4, 10))], [2])
+        self.assertEqual([e["id"] for e in r.due(date(2025, 4, 11))], [2])
+        self.assertIsNone(r.next_day())
+
+    def test_only_changed_tasks_are_rescheduled(self):
+        r = reminders.Reminders()
+        tasks = [self.task(i, "2025-05-01") for i in range(1, 101)]
+        r.sync(tasks, date(2025, 4, 10))
+        heap_size = len(r.heap)
+        tasks[4] = self.task(5, "2025-04-10")
+        tasks[6] = self.task(7, "2025-05-01", status="Completed")
+        del tasks[9]
+        events = r.sync(tasks, date(2025, 4, 10))
+        self.assertEqual([(e["event"], e["id"]) for e in events], [("due", 5)])
+        self.assertEqual(len(r.heap), heap_size + 1)
+        self.assertEqual(r.next_day(), date(2025, 4, 11))
+        self.assertEqual([e["id"] for e in r.due(date(2025, 5, 1))], [5] + [i for i in range(1, 101) if i not in (5, 7, 10)])
+
+    def test_watch_sleeps_until_the_next_day_and_follows_changes(self):
+        clock = [datetime(2025, 4, 10, 23, 0)]
+        store = {"tasks": [self.task(1, "2025-04-10")], "stamp": 1}
+        sleeps, events = [], []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if len(sleeps) == 2:
+                store["tasks"] = store["tasks"] + [self.task(2, "2025-04-11")]
+                store["stamp"] += 1
+            if len(sleeps) == 3:
+                raise KeyboardInterrupt
+            clock[0] += timedelta(seconds=seconds)
+
+        with self.assertRaises(KeyboardInterrupt):
+            reminders.watch(lambda: store["tasks"], lambda: store["stamp"], events.append, check_every=86400,
+                            clock=lambda: clock[0], sleep=sleep)
+        # An hour to midnight, when task 1 goes overdue; then nothing is scheduled
+        # until task 2 turns up, already overdue by the time it is noticed.
+        self.assertEqual(sleeps, [3600, 86400, 86400])
+        self.assertEqual([(e["event"], e["id"]) for e in events], [("due", 1), ("overdue", 1), ("overdue", 2)])
+
+
+class TestDashboard(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.script = os.path.join(self.old_cwd, "dashboard.py")
+        JsonFileBackend("tasks.json").save([task_app.Task("Task %d" % i, "", "high" if i % 3 else "low", "", ["work"])
+                                            .to_dict() for i in range(120)])
+        streamlit.cache_resource.clear()
+
+    def test_pages_are_filtered_and_sliced_server_side(self):
+        at = AppTest.from_file(self.script, default_timeout=30).run()
+        self.assertFalse(at.exception)
+        self.assertEqual(at.metric[0].value, "120")
+        self.assertEqual(len(at.dataframe[0].value), 50)
+        at.sidebar.selectbox[0].select("low").run()
+        self.assertEqual(at.caption[0].value, "40 matching tasks")
+        at.number_input[0].set_value(1).run()
+        self.assertEqual(at.dataframe[0].value["title"].tolist()[:2], ["Task 0", "Task 3"])
+
+    def test_sessions_share_one_parse_until_the_store_changes(self):
+        with mock.patch.object(storage, "get_backend", wraps=storage.get_backend) as opened:
+            for _ in range(2):
+                AppTest.from_file(self.script, default_timeout=30).run()
+            self.assertEqual(opened.call_count, 1)
+            JsonFileBackend("tasks.json").add(task_app.Task("New", "", "low", "", []).to_dict())
+            at = AppTest.from_file(self.script, default_timeout=30).run()
+            self.assertEqual(opened.call_count, 2)
+        self.assertEqual(at.metric[0].value, "121")
+
+
+class TestBatchChanges(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.records = [task_app.Task("T%d" % i, "", "low", "2025-%02d-01" % (i % 12 + 1),
+                                      ["sprint-12"] if i % 3 == 0 else ["backlog"],
+                                      "Completed" if i % 4 == 0 else "Pending").to_dict() for i in range(60)]
+
+    def expected(self, update=None, delete=False):
+        records = [dict(r, id=i + 1) for i, r in enumerate(self.records)]
+        matched = lambda r: "sprint-12" in r["tags"] and r["due_date"] < "2025-07-01"
+        if delete:
+            return [r for r in records if not matched(r)]
+        return [dict(r, **update) if matched(r) else r for r in records]
+
+    def test_backends_match_a_plain_filter(self):
+        filters = {"tags": ["sprint-12"], "due_before": "2025-07-01"}
+        for make in (lambda: JsonFileBackend("tasks.json"), lambda: JsonFileBackend("tasks.json", journal=True),
+                     lambda: SqliteBackend("tasks.db")):
+            for name in os.listdir("."):
+                os.remove(name)
+            backend = make()
+            backend.save([dict(r) for r in self.records])
+            matched = len(backend.query(**filters))
+            with mock.patch.object(JsonFileBackend, "_commit", autospec=True, side_effect=JsonFileBackend._commit) as commit:
+                self.assertEqual(backend.update_where({"status": "Completed", "priority": "high"}, **filters), matched)
+            if isinstance(backend, JsonFileBackend):
+                # Every change goes out in one write.
+                self.assertEqual(commit.call_count, 1)
+            self.assertEqual(self.summary(make().load()), self.summary(self.expected({"status": "Completed", "priority": "high"})))
+            self.assertEqual(backend.update_where({"status": "Completed", "priority": "high"}, **filters), 0)
+            self.assertEqual(backend.delete_where(**filters), matched)
+            self.assertEqual(self.summary(make().load()), self.summary(self.expected(delete=True)))
+
+    def summary(self, records):
+        return [(r["id"], r["title"], r["priority"], r["status"], r["tags"]) for r in records]
+
+    def test_cli_dry_run_changes_nothing(self):
+        task_app.backend.save([dict(r) for r in self.records])
+        before = JsonFileBackend("tasks.json").load()
+        runner = CliRunner()
+        result = runner.invoke(task_app.app, ["update", "--where", "tag=sprint-12", "--before", "2025-07-01",
+                                              "--set", "status=completed", "--dry-run"])
+        self.assertIn("10 tasks match, 5 would change", result.output)
+        result = runner.invoke(task_app.app, ["delete", "--where", "tag=sprint-12", "--dry-run"])
+        self.assertIn("20 tasks match", result.output)
+        self.assertEqual(JsonFileBackend("tasks.json").load(), before)
+        result = runner.invoke(task_app.app, ["delete", "--where", "tag=sprint-12", "--before", "2025-07-01", "--yes"])
+        self.assertIn("Deleted 10 tasks", result.output)
+        self.assertEqual(JsonFileBackend("tasks.json").load(), self.expected(delete=True))
+
+    def test_confirmed_delete_skips_the_query(self):
+        task_app.backend.save([dict(r) for r in self.records])
+        with mock.patch.object(type(task_app.backend), "query", side_effect=AssertionError("queried")):
+            result = CliRunner().invoke(task_app.app, ["delete", "--where", "tag=sprint-12",
+                                                       "--before", "2025-07-01", "--yes"])
+        self.assertIn("Deleted 10 tasks", result.output)
+        self.assertEqual(JsonFileBackend("tasks.json").load(), self.expected(delete=True))
+
+    def test_bad_terms(self):
+        self.assertEqual(batch.parse_where(["tag=a", "tag=b", "status=Pending"], "2025-01-01"),
+                         {"tags": ["a", "b"], "status": "Pending", "due_before": "2025-01-01"})
+        self.assertEqual(batch.parse_set(["due=", "tags=a, b", "recurring=none", "priority=HIGH"]),
+                         {"due_date": "", "tags": ["a", "b"], "recurring": None, "priority": "high"})
+        for terms in (["colour=red"], ["status"]):
+            with self.assertRaises(ValueError):
+                batch.parse_where(terms)
+        for terms in (["status=done"], ["due_date=tomorrow"], ["recurring=yearly"], ["id=4"]):
+            with self.assertRaises(ValueError):
+                batch.parse_set(terms)
+
+
+class TestLiveList(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.records = [task_app.Task("T%d" % i, "", "low", "2025-04-%02d" % (i + 1), ["wall"] if i % 2 else [])
+                        .to_dict() for i in range(10)]
+
+    def test_only_the_journal_tail_is_replayed(self):
+        writer = JsonFileBackend("tasks.json", journal=True)
+        writer.save([dict(r) for r in self.records])
+        writer.update(1, {"title": "First"})
+        watcher = JsonFileBackend("tasks.json", journal=True, resident=True)
+        self.assertEqual(len(watcher.query(tags=["wall"])), 5)
+        writer.update(2, {"tags": []})
+        writer.add(dict(self.records[0], title="New", tags=["wall"]))
+        writer.delete(4)
+        with mock.patch.object(JsonFileBackend, "_replay", autospec=True) as replay:
+            records = watcher.load()
+        replay.assert_not_called()
+        self.assertEqual(records, JsonFileBackend("tasks.json", journal=True).load())
+        self.assertEqual([r["title"] for r in watcher.query(tags=["wall"])], ["T5", "T7", "T9", "New"])
+        # Compaction rewrites the snapshot, so the next load starts over.
+        writer.compact()
+        with mock.patch.object(JsonFileBackend, "_replay", autospec=True, side_effect=JsonFileBackend._replay) as replay:
+            self.assertEqual(watcher.load(), records)
+        replay.assert_called_once()
+
+    def test_rows_are_rebuilt_only_when_their_task_changes(self):
+        made = []
+        rows = live_view.LiveRows(lambda record, today: made.append(record["id"]) or (record["title"],))
+        records = [dict(r, id=i + 1) for i, r in enumerate(self.records)]
+        self.assertTrue(rows.update(records, "2025-04-05"))
+        self.assertEqual(len(made), 10)
+        self.assertFalse(rows.update([dict(r) for r in records], "2025-04-05"))
+        records[3] = dict(records[3], title="Changed")
+        self.assertTrue(rows.update(records, "2025-04-05"))
+        self.assertEqual(made[10:], [4])
+        self.assertTrue(rows.update(records[:-1], "2025-04-05"))
+        self.assertEqual(rows.cells()[3], ("Changed",))
+        self.assertEqual(len(made), 11)
+        # A new day recolours overdue dates, so every row is rebuilt.
+        rows.update(records, "2025-04-06")
+        self.assertEqual(len(made), 21)
+
+    def test_watch_refreshes_on_changes_only(self):
+        stamps = iter([1, 1, 1, 2, 2, 3])
+        refreshes = []
+
+        def stamp():
+            try:
+                return next(stamps)
+            except StopIteration:
+                raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            live_view.watch(stamp, lambda: refreshes.append(1), sleep=lambda seconds: None)
+        self.assertEqual(len(refreshes), 3)
+
+    def test_cli_table_follows_the_store(self):
+        task_app.backend.save([dict(r) for r in self.records])
+
+        def watch(stamp, refresh, check_every):
+            refresh()
+            JsonFileBackend("tasks.json").update(4, {"title": "Renamed"})
+            refresh()
+            raise KeyboardInterrupt
+
+        with mock.patch.object(live_view, "watch", watch):
+            result = CliRunner().invoke(task_app.app, ["list", "--watch", "--filter-tag", "wall"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Renamed", result.output)
+        self.assertNotIn("T0", result.output)
+        result = CliRunner().invoke(task_app.app, ["list", "--watch", "--format", "json"])
+        self.assertIn("--watch only works", result.output)
+
+
+class TestProjection(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.records = [task_app.Task("T%d" % i, ("long text %d " % i) * 50, "low", "2025-04-%02d" % (i % 28 + 1),
+                                      ["work"] if i % 2 else [], recurring="weekly" if i == 3 else None).to_dict()
+                        for i in range(40)]
+
+    def test_row_head_leaves_out_the_description(self):
+        record = {"id": 7, "title": 'say ,"description": here', "description": "x" * 20, "tags": ["description"]}
+        data, head = storage.encode_row(record)
+        self.assertEqual(json.loads(data), record)
+        self.assertEqual(json.loads(data[:head] + b"}"), {k: v for k, v in record.items() if k != "description"})
+        self.assertEqual(storage.encode_row({"id": 1, "title": "t"}), (b'{"id":1,"title":"t"}', 0))
+
+    def test_heads_skip_the_descriptions(self):
+        for journal in (False, True):
+            for name in os.listdir("."):
+                os.remove(name)
+            JsonFileBackend("tasks.json", journal=journal).save([dict(r) for r in self.records])
+            writer = JsonFileBackend("tasks.json", journal=journal)
+            writer.update(2, {"title": "Renamed", "description": "short"})
+            writer.update(5, {"description": "much longer than before " * 40})
+            writer.delete(9)
+            full = JsonFileBackend("tasks.json", journal=journal).load()
+            backend = JsonFileBackend("tasks.json", journal=journal)
+            with mock.patch.object(timings, "enabled", True), mock.patch.object(timings, "phases", []), \
+                    mock.patch.object(timings, "counters", Counter()):
+                heads = backend.load_fields(task_app.TABLE_FIELDS)
+                read = timings.counters["bytes read"]
+            self.assertEqual(heads, [{k: v for k, v in r.items() if k != "description"} for r in full])
+            self.assertLess(read, os.path.getsize("tasks.json") / 3)
+            self.assertEqual([r["id"] for r in backend.query(sort_by="due", fields=["title"])],
+                             [r["id"] for r in JsonFileBackend("tasks.json").query(sort_by="due")])
+            # Searches still see the descriptions.
+            self.assertEqual([r["id"] for r in backend.query(search="text 7 ", fields=["title"])], [8])
+            self.assertEqual(backend.query(search="longer", fields=["title"])[0]["id"], 5)
+            # A change by another writer is picked up.
+            writer.update(1, {"priority": "high"})
+            self.assertEqual(backend.load_fields(["priority"])[0]["priority"], "high")
+
+    def test_rollover_reads_only_stale_tasks_in_full(self):
+        backend = JsonFileBackend("tasks.json")
+        backend.save([dict(r) for r in self.records])
+        backend = JsonFileBackend("tasks.json")
+        with mock.patch.object(JsonFileBackend, "get_many", autospec=True, side_effect=JsonFileBackend.get_many) as get_many:
+            self.assertEqual(backend.roll_over("2025-05-01", lambda r: "2025-05-02"), 1)
+        self.assertEqual(get_many.call_args[0][1], [4])
+        record = JsonFileBackend("tasks.json").get(4)
+        self.assertEqual((record["due_date"], record["description"]), ("2025-05-02", self.records[3]["description"]))
+
+    def test_sqlite_reads_only_the_columns_asked_for(self):
+        backend = SqliteBackend("tasks.db")
+        backend.save([dict(r) for r in self.records])
+        self.assertEqual(backend.query(status="Pending", limit=2, fields=["title", "due_date"]),
+                         [{"id": 1, "title": "T0", "due_date": "2025-04-01"}, {"id": 2, "title": "T1", "due_date": "2025-04-02"}])
+        self.assertEqual(backend.query(limit=1, fields=["tags"]), [{"id": 1, "tags": []}])
+
+    def test_task_reads_its_description_on_first_use(self):
+        task_app.backend.save([dict(r) for r in self.records])
+        result = CliRunner().invoke(task_app.app, ["list", "--sort-by", "due", "--limit", "3"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("T28", result.output)
+        task = task_app.Task.from_dict(JsonFileBackend("tasks.json").load_fields(task_app.TABLE_FIELDS)[6])
+        self.assertIs(task._description, task_app.NOT_LOADED)
+        self.assertEqual(task.to_dict()["description"], self.records[6]["description"])
+        built = task_app.Task.from_dict({"title": "Built", "priority": "low", "due_date": "", "tags": []})
+        self.assertEqual(built.description, "")
+
+
+class TestAgenda(TempDirTestCase):
+
+    def record(self, task_id, due, recurring=None, status="Pending"):
+        return {"id": task_id, "title": "T%d" % task_id, "priority": "low", "due_date": due,
+                "status": status, "recurring": recurring}
+
+    def test_monthly_follows_the_calendar(self):
+        days = list(recurrence.occurrences(date(2025, 1, 15), "monthly", date(2025, 1, 1), date(2025, 4, 30)))
+        self.assertEqual(days, [date(2025, 1, 15), date(2025, 2, 15), date(2025, 3, 15), date(2025, 4, 15)])
+        self.assertEqual(recurrence.add_months(date(2024, 11, 30), 3), date(2025, 2, 28))
+        for due in (date(2024, 1, 29), date(2024, 1, 31), date(2023, 12, 15), date(2020, 3, 31)):
+            for today in (date(2024, 2, 28), date(2024, 2, 29), date(2025, 7, 30), date(2026, 1, 1), date(2031, 5, 2)):
+                # Rolled over one month at a time, each from the date stored before.
+                expected = due
+                while expected <= today:
+                    expected = recurrence.add_months(expected, 1)
+                self.assertEqual(next_due_date(due, "monthly", today), expected)
+
+    def test_month_end_agrees_with_rollover(self):
+        due = date(2027, 1, 31)
+        shown = list(recurrence.occurrences(due, "monthly", date(2027, 1, 1), date(2027, 4, 30)))
+        self.assertEqual(shown, [date(2027, 1, 31), date(2027, 2, 28), date(2027, 3, 28), date(2027, 4, 28)])
+        # Whether list runs in February and again in April, or only in April, the task ends up on a date the agenda showed.
+        in_february = next_due_date(due, "monthly", date(2027, 2, 10))
+        self.assertEqual(in_february, date(2027, 2, 28))
+        self.assertEqual(next_due_date(in_february, "monthly", date(2027, 4, 2)), date(2027, 4, 28))
+        self.assertEqual(next_due_date(due, "monthly", date(2027, 4, 2)), date(2027, 4, 28))
+        self.assertEqual(list(recurrence.occurrences(in_february, "monthly", date(2027, 3, 1), date(2027, 4, 30))),
+                         shown[2:])
+
+    def test_occurrences_stay_in_the_window(self):
+        start, end = date(2025, 4, 10), date(2025, 4, 30)
+        self.assertEqual(list(recurrence.occurrences(date(2025, 1, 1), "weekly", start, end)),
+                         [date(2025, 4, 16), date(2025, 4, 23), date(2025, 4, 30)])
+        self.assertEqual(list(recurrence.occurrences(date(2025, 5, 1), "daily", start, end)), [])
+        self.assertEqual(list(recurrence.occurrences(date(2025, 4, 12), None, start, end)), [date(2025, 4, 12)])
+        self.assertEqual(list(recurrence.occurrences(date(2025, 4, 9), None, start, end)), [])
+
+    def test_merged_by_day_then_id(self):
+        records = [self.record(1, "2025-04-01", "weekly"), self.record(2, "2025-04-03"),
+                   self.record(3, "2025-03-31", "monthly"), self.record(4, "2025-04-02", "daily", "Completed"),
+                   self.record(5, "2025-04-01", "daily"), self.record(6, "2025/04/02", "daily")]
+        entries = [(day.isoformat(), r["id"]) for day, r in agenda.agenda(records, date(2025, 4, 1), date(2025, 4, 8))]
+        self.assertEqual(entries, [("2025-04-01", 1), ("2025-04-01", 5), ("2025-04-02", 5), ("2025-04-03", 2),
+                                   ("2025-04-03", 5), ("2025-04-04", 5), ("2025-04-05", 5), ("2025-04-06", 5),
+                                   ("2025-04-07", 5), ("2025-04-08", 1), ("2025-04-08", 5)])
+
+    def test_only_what_is_taken_is_computed(self):
+        records = [self.record(i, "2000-01-%02d" % i, "daily") for i in range(1, 21)]
+        with mock.patch.object(recurrence, "occurrence", wraps=recurrence.occurrence) as occurrence:
+            first = [r["id"] for _, r in itertools.islice(agenda.agenda(records, date(2025, 1, 1),
+                                                                        date(2124, 12, 31)), 25)]
+        self.assertEqual(first, list(range(1, 21)) + [1, 2, 3, 4, 5])
+        self.assertLess(occurrence.call_count, 100)
+
+    def test_cli(self):
+        task_app.backend.save([self.record(1, "2025-01-31", "monthly"), self.record(2, "2025-02-27"),
+                               self.record(3, "2025-02-26", "daily", "Completed")])
+        result = CliRunner().invoke(task_app.app, ["agenda", "--start", "2025-02-01", "--days", "60",
+                                                   "--format", "json"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual([(e["date"], e["id"]) for e in map(json.loads, result.output.splitlines())],
+                         [("2025-02-27", 2), ("2025-02-28", 1), ("2025-03-28", 1)])
+        result = CliRunner().invoke(task_app.app, ["calendar", "--start", "2025-02-01", "--days", "30", "--limit", "1"])
+        self.assertIn("T2", result.output)
+        self.assertNotIn("T1", result.output)
+        result = CliRunner().invoke(task_app.app, ["agenda", "--start", "01/02/2025"])
+        self.assertIn("Invalid date format", result.output)
+
+class TestRecurrence(TempDirTestCase):
+
+    def test_closed_form_matches_stepping(self):
+        today = date(2025, 4, 20)
+        for recurring, step in RECURRENCE_DAYS.items():
+            for offset in (-800, -31, -7, -1, 0, 1, 45):
+                due = today + timedelta(days=offset)
+                expected = due
+                while expected <= today:
+                    expected += timedelta(days=step)
+                self.assertEqual(next_due_date(due, recurring, today), expected)
+
+    def test_unknown_recurrence_is_left_alone(self):
+        due = date(2020, 1, 1)
+        self.assertEqual(next_due_date(due, "yearly", date(2025, 1, 1)), due)
+
+    def test_roll_over_without_changes_does_not_write(self):
+        backend = JsonFileBackend("tasks.json")
+        backend.save([task_app.Task("A", "", "low", "2999-01-01", [], recurring="daily").to_dict()])
+        before = os.stat("tasks.json").st_mtime_ns
+        self.assertEqual(backend.roll_over("2025-04-20", lambda t: "2025-04-21"), 0)
+        self.assertEqual(os.stat("tasks.json").st_mtime_ns, before)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,84 @@
+from calendar import monthrange
+from datetime import date, timedelta
+from typing import Iterator, Optional
+
+# Days between occurrences for each recurrence kind counted in days.
+RECURRENCE_DAYS = {"daily": 1, "weekly": 7}
+# Calendar months between occurrences for each kind counted in months.
+RECURRENCE_MONTHS = {"monthly": 1}
+RECURRENCES = (*RECURRENCE_DAYS, *RECURRENCE_MONTHS)
+# Steps after which a monthly task's day of the month can no longer change (see occurrence).
+CLAMP_HORIZON = 48
+
+
+def add_months(day: date, months: int) -> date:
+    """`day` moved on by `months` calendar months, kept within shorter months (Jan 31 -> Feb 28)."""
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return date(year, month, min(day.day, monthrange(year, month)[1]))
+
+
+def occurrence(due: date, recurring: str, n: int) -> date:
+    """The nth occurrence (from 0) of a `recurring` task first due on `due`.
+
+    Monthly occurrences follow on from each other, the way rollover moves
+    a task one stored date to the next: once a short month has clamped the
+    day (Jan 31 -> Feb 28) it stays there (Mar 28), whenever the task
+    happens to be rolled over.
+    """
+    months = RECURRENCE_MONTHS.get(recurring)
+    if months is None:
+        return due + timedelta(days=n * RECURRENCE_DAYS[recurring])
+    # The day only ever drops to the length of a month passed through, and any
+    # CLAMP_HORIZON steps take in a 28-day February, so later ones change nothing.
+    day = due.day
+    for step in range(1, min(n, CLAMP_HORIZON) + 1):
+        day = min(day, add_months(due, step * months).day)
+    target = add_months(due, n * months)
+    return target.replace(day=min(day, target.day))
+
+
+def periods_through(due: date, recurring: str, day: date) -> int:
+    """How many occurrences of a `recurring` task first due on `due` fall on or before `day`."""
+    if day < due:
+        return 0
+    step = RECURRENCE_DAYS.get(recurring)
+    if step is not None:
+        return (day - due).days // step + 1
+    n = ((day.year - due.year) * 12 + day.month - due.month) // RECURRENCE_MONTHS[recurring]
+    return n + 1 if occurrence(due, recurring, n) <= day else n
+
+
+def next_due_date(due: date, recurring: str, today: date) -> date:
+    """Return the first occurrence of a `recurring` task due on `due` that falls after today.
+
+    The number of elapsed periods is computed directly, so a task that is
+    years overdue costs the same as one that is a day overdue.
+    """
+    if recurring not in RECURRENCES or due > today:
+        return due
+    return occurrence(due, recurring, periods_through(due, recurring, today))
+
+
+def occurrences(due: date, recurring: Optional[str], start: date, end: date) -> Iterator[date]:
+    """The days from start to end (both included) that a task due on `due` falls on, in order.
+
+    Each one is worked out as it is asked for, starting straight at the
+    first in the window, so a long window costs nothing up front.
+    """
+    if recurring not in RECURRENCES:
+        if start <= due <= end:
+            yield due
+        return
+    n = periods_through(due, recurring, start - timedelta(days=1))
+    day = occurrence(due, recurring, n)
+    months = RECURRENCE_MONTHS.get(recurring)
+    while day <= end:
+        yield day
+        # Each one follows from the last, as rollover would move the task.
+        day = add_months(day, months) if months else day + timedelta(days=RECURRENCE_DAYS[recurring])
+
+
+def roll_forward(due_date: str, recurring: str, today: date) -> str:
+    """next_due_date for a YYYY-MM-DD string, as stored in task records."""
+    return next_due_date(date.fromisoformat(due_date), recurring, today).isoformat()
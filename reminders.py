@@ -0,0 +1,176 @@
+"""Due-date reminders: tasks falling due or going overdue, as it happens.
+
+A pending task due on D is "due" from the start of D and, unless it
+recurs, "overdue" from the start of the day after. A recurring task never
+goes overdue; it is due again on each later occurrence instead, the date
+`list` rolls it over to. Tasks whose stored due date does not parse
+are left out rather than stopping the reminders.
+
+Reminders keeps one heap entry per pending task: the next day something
+happens to it, found with next_due_date rather than by stepping through
+occurrences. watch() sleeps until the earliest entry. When the store
+changes, only the tasks whose title, due date, recurrence or status
+changed are rescheduled; the heap entries they leave behind are dropped
+when they reach the top.
+"""
+import heapq
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from recurrence import RECURRENCES, next_due_date
+
+DAY = timedelta(days=1)
+# Seconds between checks (a stat of the store files) for changes made by other commands.
+CHECK_INTERVAL = 1.0
+
+WATCHED_FIELDS = ("title", "due_date", "recurring", "status")
+
+
+def is_pending(due_date: Optional[str], status: Optional[str]) -> bool:
+    return bool(due_date) and (status or "Pending").lower() != "completed"
+
+
+def parse_due(due_date: str) -> Optional[date]:
+    """The due date of a stored task, or None when it is not a YYYY-MM-DD date (e.g. after a hand edit)."""
+    try:
+        return date.fromisoformat(due_date)
+    except (TypeError, ValueError):
+        return None
+
+
+def next_event_day(due_date: Optional[str], recurring: Optional[str], status: Optional[str],
+                   after: date) -> Optional[date]:
+    """The first day after `after` on which the task falls due or goes overdue; None if it never will."""
+    if not is_pending(due_date, status):
+        return None
+    due = parse_due(due_date)
+    if due is None:
+        return None
+    if recurring in RECURRENCES:
+        return due if due > after else next_due_date(due, recurring, after)
+    if due > after:
+        return due
+    if due == after:
+        return due + DAY
+    return None
+
+
+def current_state(due_date: Optional[str], recurring: Optional[str], status: Optional[str],
+                  today: date) -> Optional[Tuple[str, date]]:
+    """("due", date) for a task due today, ("overdue", date) for one past its due date, else None."""
+    if not is_pending(due_date, status):
+        return None
+    due = parse_due(due_date)
+    if due is None:
+        return None
+    if recurring in RECURRENCES:
+        occurrence = due if due >= today else next_due_date(due, recurring, today - DAY)
+        return ("due", occurrence) if occurrence == today else None
+    if due == today:
+        return "due", due
+    if due < today:
+        return "overdue", due
+    return None
+
+
+class Reminders:
+    """A min-heap of the next event day of every pending task, kept in step with the store."""
+
+    def __init__(self):
+        # (day, task id, version); entries whose version is no longer current are stale.
+        self.heap = []
+        # task id -> (watched fields, version)
+        self.tasks = {}
+        # task id -> the last (event, due date) reported, so nothing is reported twice.
+        self.reported = {}
+
+    def sync(self, records: Iterable[dict], today: date) -> List[dict]:
+        """Take in the store's current tasks, rescheduling those that changed.
+
+        Returns the events of the changed tasks, so the first sync reports
+        everything that is due or overdue today.
+        """
+        events = []
+        seen = set()
+        for record in records:
+            task_id = record["id"]
+            seen.add(task_id)
+            fields = tuple(record.get(name) for name in WATCHED_FIELDS)
+            old = self.tasks.get(task_id)
+            if old is not None and old[0] == fields:
+                continue
+            self.tasks[task_id] = (fields, old[1] + 1 if old else 0)
+            self._schedule(task_id, today)
+            events += self._report(task_id, today)
+        for task_id in self.tasks.keys() - seen:
+            del self.tasks[task_id]
+            self.reported.pop(task_id, None)
+        return events
+
+    def next_day(self) -> Optional[date]:
+        """The earliest day something will happen, or None when nothing is scheduled."""
+        while self.heap and not self._current(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def due(self, today: date) -> List[dict]:
+        """Events of the tasks whose day has come by `today`, each rescheduled for its next one."""
+        events = []
+        while self.heap and self.heap[0][0] <= today:
+            entry = heapq.heappop(self.heap)
+            if self._current(entry):
+                events += self._report(entry[1], today)
+                self._schedule(entry[1], today)
+        return events
+
+    def _current(self, entry: tuple) -> bool:
+        task = self.tasks.get(entry[1])
+        return task is not None and task[1] == entry[2]
+
+    def _schedule(self, task_id: int, today: date):
+        (title, due_date, recurring, status), version = self.tasks[task_id]
+        day = next_event_day(due_date, recurring, status, today)
+        if day is not None:
+            heapq.heappush(self.heap, (day, task_id, version))
+
+    def _report(self, task_id: int, today: date) -> List[dict]:
+        title, due_date, recurring, status = self.tasks[task_id][0]
+        state = current_state(due_date, recurring, status, today)
+        if state is None:
+            self.reported.pop(task_id, None)
+            return []
+        if self.reported.get(task_id) == state:
+            return []
+        self.reported[task_id] = state
+        return [{"event": state[0], "id": task_id, "title": title, "due_date": state[1].isoformat()}]
+
+
+def watch(load: Callable[[], List[dict]], stamp: Callable[[], object], emit: Callable[[dict], None],
+          check_every: float = CHECK_INTERVAL, clock: Callable[[], datetime] = datetime.now,
+          sleep: Callable[[float], None] = time.sleep):
+    """Emit events as tasks fall due or go overdue, until interrupted.
+
+    Sleeps until the next event day begins, waking every `check_every`
+    seconds to stat the store; the tasks are only read again when that
+    `stamp` changed.
+    """
+    reminders = Reminders()
+    last_stamp = stamp()
+    for event in reminders.sync(load(), clock().date()):
+        emit(event)
+    while True:
+        day = reminders.next_day()
+        wait = check_every
+        if day is not None:
+            wait = min(wait, max(0.0, (datetime.combine(day, datetime.min.time()) - clock()).total_seconds()))
+        sleep(wait)
+        today = clock().date()
+        current = stamp()
+        events = []
+        if current != last_stamp:
+            last_stamp = current
+            events += reminders.sync(load(), today)
+        events += reminders.due(today)
+        for event in events:
+            emit(event)
@@ -0,0 +1,107 @@
+"""Start-up helpers shared by the command-line entry points.
+
+Rich is only imported once something is actually printed (LazyConsole),
+and every entry point accepts --startup-profile:
+
+    python app.py --startup-profile list --format json
+
+which runs the command as usual, then prints to stderr how long each
+module took to import, and how much of that was the module's own
+initialization rather than the modules it imports in turn.
+"""
+import os
+import sys
+import time
+
+import timings
+
+PROFILE_FLAG = "--startup-profile"
+
+# Modules that took less than this (in ms, imports included) are left out of the report.
+PROFILE_MIN_MS = 1.0
+# How many levels of imports below the entry point's own are broken down.
+PROFILE_DEPTH = 1
+
+
+class LazyConsole:
+    """Stands in for a rich Console, which is only imported and created on first use."""
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._console = None
+
+    def __getattr__(self, name):
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(**self._kwargs)
+        return getattr(self._console, name)
+
+    # Special methods are looked up on the type, so `with console:` (as used by
+    # rich.live.Live) has to be passed on explicitly.
+    def __enter__(self):
+        return self.__getattr__("__enter__")()
+
+    def __exit__(self, *exc_info):
+        return self._console.__exit__(*exc_info)
+
+
+def parse_importtime(lines):
+    """(depth, module, self ms, cumulative ms) for each line of `python -X importtime` output."""
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(own) / 1000, int(cumulative) / 1000))
+    return entries
+
+
+def format_profile(command: str, entries, wall_ms: float) -> str:
+    """The report: modules imported by the entry point, slowest first, with what they pulled in."""
+    # -X importtime lists each module after the ones it imported.
+    pending = {}
+    for depth, name, own, cumulative in entries:
+        node = (name, own, cumulative, pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(node)
+    children = pending.get(0, [])
+    lines = [f"Startup profile: {command}", f"{'import ms':>10} {'init ms':>9}  module"]
+
+    def add(nodes, indent):
+        for name, own, cumulative, nested in sorted(nodes, key=lambda node: -node[2]):
+            if cumulative < PROFILE_MIN_MS:
+                continue
+            lines.append(f"{cumulative:10.1f} {own:9.1f}  {'  ' * indent}{name}")
+            if indent < PROFILE_DEPTH:
+                add(nested, indent + 1)
+
+    add(children, 0)
+    lines.append(f"{sum(node[2] for node in children):10.1f} {'':9}  all imports")
+    lines.append(f"{wall_ms:10.1f} {'':9}  whole command")
+    return "\n".join(lines)
+
+
+def run(app):
+    """Run a typer app, or profile its start-up when PROFILE_FLAG is given.
+
+    --timings and TASKS_TRACE time the phases of the command itself (see timings.py).
+    """
+    if PROFILE_FLAG not in sys.argv:
+        if timings.TIMINGS_FLAG in sys.argv or os.environ.get(timings.TRACE_ENV):
+            timings.run(app)
+        else:
+            app()
+        return
+    import subprocess
+    argv = [arg for arg in sys.argv if arg != PROFILE_FLAG]
+    # Re-run the command in a fresh interpreter, so every import is timed
+    # from scratch and nothing this process already loaded is counted.
+    started = time.perf_counter()
+    child = subprocess.run([sys.executable, "-X", "importtime"] + argv, stderr=subprocess.PIPE, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    stderr = child.stderr.splitlines()
+    for line in stderr:
+        if not line.startswith("import time:"):
+            print(line, file=sys.stderr)
+    print(format_profile(" ".join(argv), parse_importtime(stderr), wall_ms), file=sys.stderr)
+    sys.exit(child.returncode)
@@ -0,0 +1,1643 @@
+import bisect
+import heapq
+import itertools
+import json
+import mmap
+import os
+import sqlite3
+import stat
+import tempfile
+import uuid
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, writers are not serialized.
+    fcntl = None
+
+import timings
+from client import DaemonBackend, connect
+from indexes import (COUNT_DIMENSIONS, BitmapIndex, CountIndex, FieldIndex, IdIndex, TrigramIndex,
+                     count_records, summarize_counts)
+
+# Fold the journal back into the snapshot once it is larger than both
+# COMPACT_MIN_BYTES and COMPACT_RATIO times the snapshot size.
+COMPACT_MIN_BYTES = 64 * 1024
+COMPACT_RATIO = 0.5
+
+# Padding after each snapshot record, so small edits such as Pending ->
+# Completed still fit where the record already is.
+SNAPSHOT_SLACK = b" " * 16
+
+# Projected loads only read record heads one by one when that skips more
+# than this fraction of the store's bytes; otherwise one full read is faster.
+HEADS_MIN_SAVING = 0.5
+
+# Written last in every stored record, with where it starts kept in the id
+# index, so loads that do not need it never read or decode it.
+WIDE_FIELD = "description"
+WIDE_KEY = b',"' + WIDE_FIELD.encode() + b'":'
+
+PRIORITY_ORDER = {"low": 3, "medium": 2, "high": 1}
+
+
+def matches_search(record: dict, needle: str) -> bool:
+    """Case-insensitive substring match on title, description and status."""
+    return (
+        needle in record["title"].lower()
+        or needle in (record.get("description") or "").lower()
+        or needle in (record.get("status") or "Pending").lower()
+    )
+
+
+def matches_filters(record: dict, tags: Optional[List[str]] = None, tag_mode: str = "all",
+                    priority: Optional[str] = None, status: Optional[str] = None,
+                    due_after: Optional[str] = None, due_before: Optional[str] = None) -> bool:
+    """Check one record against the compound `list` filters.
+
+    Tags match all of `tags` (or any, with tag_mode="any"); priority and
+    status compare case-insensitively; due_after/due_before are exclusive
+    YYYY-MM-DD bounds that never match a task without a due date.
+    """
+    if tags:
+        record_tags = record.get("tags") or []
+        check = any if tag_mode == "any" else all
+        if not check(tag in record_tags for tag in tags):
+            return False
+    if priority and (record.get("priority") or "").lower() != priority.lower():
+        return False
+    if status and (record.get("status") or "Pending").lower() != status.lower():
+        return False
+    if due_after or due_before:
+        due = record.get("due_date")
+        if not due or (due_after and due <= due_after) or (due_before and due >= due_before):
+            return False
+    return True
+
+
+def has_filters(filters: dict) -> bool:
+    return any(value for key, value in filters.items() if key != "tag_mode")
+
+
+SORT_KEYS = {
+    "due": lambda r: r.get("due_date") or "9999-99-99",
+    "priority": lambda r: PRIORITY_ORDER.get(r.get("priority"), 99),
+}
+
+
+def iter_records(records: Iterable[dict], search: Optional[str] = None, sort_by: Optional[str] = None,
+                 limit: Optional[int] = None, offset: int = 0, **filters) -> Iterator[dict]:
+    """Filter, sort and page `records`, yielding results as they are found.
+
+    Unsorted views stop scanning once the page is full. Sorted views with a
+    limit keep only the best offset + limit records in a heap instead of
+    sorting everything.
+    """
+    rows = iter(records)
+    if has_filters(filters):
+        rows = (r for r in rows if matches_filters(r, **filters))
+    if search:
+        needle = search.lower()
+        rows = (r for r in rows if matches_search(r, needle))
+    rows = timings.timed("filter", rows, "tasks matched")
+    key = SORT_KEYS.get(sort_by)
+    if key is not None:
+        with timings.phase("sort"):
+            if limit is not None:
+                rows = iter(heapq.nsmallest(offset + limit, rows, key=key))
+            else:
+                rows = iter(sorted(rows, key=key))
+    stop = offset + limit if limit is not None else None
+    return itertools.islice(rows, offset, stop)
+
+
+def filter_records(records: Iterable[dict], search: Optional[str] = None, sort_by: Optional[str] = None,
+                   limit: Optional[int] = None, offset: int = 0, **filters) -> List[dict]:
+    return list(iter_records(records, search, sort_by, limit, offset, **filters))
+
+
+def query_fields(fields: Iterable[str], search: Optional[str] = None) -> List[str]:
+    """The fields a query needs loaded to return `fields`: those, plus whatever `search` looks at.
+
+    Filters and sorts only look at narrow fields, which every projection carries.
+    """
+    fields = list(fields)
+    if search:
+        fields += ["title", WIDE_FIELD, "status"]
+    return fields
+
+
+def record_position(records: List[dict], task_id: int) -> Optional[int]:
+    """Position of task `task_id` in `records`, which are kept in id order."""
+    pos = bisect.bisect_left(records, task_id, key=itemgetter("id"))
+    if pos < len(records) and records[pos]["id"] == task_id:
+        return pos
+    return None
+
+
+def assign_ids(records: List[dict], start: int = 1) -> List[dict]:
+    """Give every record without an id the next free one, in list order."""
+    next_id = max([start] + [record["id"] + 1 for record in records if record.get("id")])
+    for record in records:
+        if not record.get("id"):
+            record["id"] = next_id
+            next_id += 1
+    return records
+
+
+def encode_record(record: dict) -> bytes:
+    return json.dumps(record, separators=(",", ":")).encode()
+
+
+def encode_row(record: dict) -> tuple:
+    """The record as compact JSON with WIDE_FIELD last, and the length of the part before it (0 if none).
+
+    Closing that head with "}" gives the record without its wide field.
+    """
+    if WIDE_FIELD not in record or len(record) == 1:
+        return encode_record(record), 0
+    if next(reversed(record)) != WIDE_FIELD:
+        record = dict(record)
+        record[WIDE_FIELD] = record.pop(WIDE_FIELD)
+    data = encode_record(record)
+    # Quotes inside strings are escaped, so this only matches the key itself;
+    # being the last key, it is the last match.
+    return data, data.rfind(WIDE_KEY)
+
+
+class FileLock:
+    """Advisory flock on a lock file, reentrant within one process.
+
+    hold(exclusive=False) takes a shared lock for readers; a nested
+    exclusive hold upgrades it. The lock is released when the outermost
+    hold exits.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.depth = 0
+        self.exclusive = False
+
+    @contextmanager
+    def hold(self, exclusive: bool = True):
+        if self.depth == 0:
+            self.file = open(self.path, "a")
+        if fcntl is not None and (self.depth == 0 or (exclusive and not self.exclusive)):
+            fcntl.flock(self.file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self.exclusive = exclusive
+        self.depth += 1
+        try:
+            yield
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                # Closing the file drops the lock.
+                self.file.close()
+                self.file = None
+                self.exclusive = False
+
+
+@contextmanager
+def replacing(path: str):
+    """Yield a file whose contents replace `path` in one step once the block completes.
+
+    Readers and crashes see the old file or the new one, never a mix; if
+    the block raises, `path` is left alone.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_atomic(path: str, data: bytes):
+    """Replace `path` with `data` so readers and crashes see the old file or the new one, never a mix."""
+    with replacing(path) as f:
+        f.write(data)
+
+
+class StorageBackend:
+    """Interface shared by every task store.
+
+    Tasks are exchanged as plain dicts (the output of `Task.to_dict`) and
+    addressed by their "id", which is assigned on add and never reused.
+    """
+
+    def load(self) -> List[dict]:
+        raise NotImplementedError
+
+    def save(self, records: List[dict]):
+        raise NotImplementedError
+
+    def count(self) -> int:
+        return len(self.load())
+
+    def get(self, task_id: int) -> Optional[dict]:
+        records = self.load()
+        pos = record_position(records, task_id)
+        return records[pos] if pos is not None else None
+
+    def get_many(self, task_ids: Iterable[int]) -> List[dict]:
+        """The tasks with these ids, in the order given; unknown ids are skipped."""
+        return [record for record in map(self.get, task_ids) if record is not None]
+
+    def find(self, value: str, fields: List[str]) -> List[dict]:
+        """Tasks whose value in any of `fields` equals `value`, in id order."""
+        return [record for record in self.load() if any(record.get(field) == value for field in fields)]
+
+    def counts(self, today: str) -> dict:
+        """Task totals for a report, as built by indexes.summarize_counts."""
+        return count_records(self.load(), today)
+
+    def recount(self, today: str) -> dict:
+        """Like counts(), but rebuilt from the tasks themselves, replacing any stored counters."""
+        return count_records(self.load(), today)
+
+    def add(self, record: dict) -> int:
+        """Store a new task and return its id."""
+        raise NotImplementedError
+
+    def add_many(self, records: Iterable[dict]) -> int:
+        """Store new tasks from an iterable, which may be too large to hold in memory.
+
+        Returns the number added. Backends that can write them all in one
+        commit do; this fallback adds them one at a time.
+        """
+        count = 0
+        for record in records:
+            self.add(record)
+            count += 1
+        return count
+
+    def update(self, task_id: int, fields: dict):
+        raise NotImplementedError
+
+    def delete(self, task_id: int):
+        raise NotImplementedError
+
+    def update_where(self, fields: dict, search: Optional[str] = None, **filters) -> int:
+        """Set `fields` on every task matching `search` and the `matches_filters` keywords.
+
+        Returns the number of tasks that changed. Backends do this in one
+        pass over the store and one write; this fallback updates one by one.
+        """
+        changed = [r["id"] for r in self.iter_query(search, **filters) if {**r, **fields} != r]
+        for task_id in changed:
+            self.update(task_id, fields)
+        return len(changed)
+
+    def delete_where(self, search: Optional[str] = None, **filters) -> int:
+        """Delete every task matching `search` and the `matches_filters` keywords; returns how many."""
+        task_ids = [r["id"] for r in self.iter_query(search, **filters)]
+        for task_id in task_ids:
+            self.delete(task_id)
+        return len(task_ids)
+
+    def load_fields(self, fields: Iterable[str]) -> List[dict]:
+        """Like load(), but the records only need to carry their id and `fields`.
+
+        Backends that can leave the other fields out do; this fallback loads everything.
+        """
+        return self.load()
+
+    def query(self, search: Optional[str] = None, sort_by: Optional[str] = None,
+              limit: Optional[int] = None, offset: int = 0, fields: Optional[Iterable[str]] = None,
+              **filters) -> List[dict]:
+        """Return the records matching `search` and the `matches_filters` keywords, sorted and paged.
+
+        With `fields`, the records only need to carry their id and those fields.
+        """
+        return list(self.iter_query(search, sort_by, limit, offset, fields, **filters))
+
+    def iter_query(self, search: Optional[str] = None, sort_by: Optional[str] = None,
+                   limit: Optional[int] = None, offset: int = 0, fields: Optional[Iterable[str]] = None,
+                   **filters) -> Iterator[dict]:
+        """Like query(), but yields records as soon as they are found."""
+        records = self.load() if fields is None else self.load_fields(query_fields(fields, search))
+        return iter_records(records, search, sort_by, limit, offset, **filters)
+
+    def roll_over(self, today: str, advance: Callable[[dict], str]) -> int:
+        """Set due_date to advance(record) for recurring tasks due on or before today.
+
+        Returns the number of tasks that changed; nothing is written when that is 0.
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        pass
+
+
+class JsonFileBackend(StorageBackend):
+    """Tasks in a JSON array file, optionally fronted by an append-only journal.
+
+    The snapshot holds one compact record per line, and `<path>.ids` (an
+    IdIndex) maps each task id to the bytes of its current record. Updates
+    that fit overwrite the record where it is, deletes overwrite it with a
+    padded `null`, and anything else is appended before the closing
+    bracket, so a single-task change never rewrites the whole file. The
+    changes are written to `<path>.redo` first and the log is removed once
+    they are in place; if a crash leaves it behind, the next load rewrites
+    the snapshot from its intact records plus the log. The dead space is
+    reclaimed by compact() once it grows past the compaction threshold.
+    Each record is written with its description last, and its slot also
+    keeps where that starts, so load_fields() can decode the other fields
+    of every task without reading any descriptions.
+
+    With journal=True, changes are appended to `<path>.journal` instead and
+    the snapshot is only touched by compaction. Reads replay the journal
+    over the snapshot.
+
+    With resident=True, the backend also keeps a BitmapIndex over the loaded
+    tasks and updates it in place. That only pays off in processes that run
+    many queries against the same store; a one-shot command is better off
+    scanning the records it has to parse anyway.
+
+    Writers serialize on an advisory lock on `<path>.lock`, and full
+    snapshots are written to a temporary file and swapped in with
+    os.replace. With group_commit=True, add/update/delete first queue their
+    change in `<path>.queue`; whichever writer gets the lock next applies
+    everything queued so far in one write, and the writers whose changes it
+    took along return as soon as they get the lock themselves.
+
+    With write_behind=True (meant for a long-running process such as the
+    daemon), changes are applied to the in-memory tasks right away and only
+    written by the next flush(), which commits everything held back so far
+    in one write. Reads that would consult an on-disk index scan the
+    in-memory tasks instead while changes are pending.
+    """
+
+    def __init__(self, path: str, journal: bool = False, resident: bool = False, group_commit: bool = False,
+                 indexed_fields: Iterable[str] = (), write_behind: bool = False):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.journal = journal
+        self.resident = resident
+        self.group_commit = group_commit
+        self.write_behind = write_behind
+        self.indexed_fields = sorted(indexed_fields)
+        self.index_path = path + ".trigrams"
+        self.field_index_path = path + ".fields"
+        self.count_index_path = path + ".counts"
+        self.ids_path = path + ".ids"
+        self.queue_path = path + ".queue"
+        self.redo_path = path + ".redo"
+        # The queue file while _queue_held() holds its flock, with how deeply it is held.
+        self._queue = None
+        self._queue_depth = 0
+        self.lock = FileLock(path + ".lock")
+        self._records = None
+        self._bitmaps = None
+        self._stamp = None
+        self._pending = []
+        # Records without WIDE_FIELD, as of _heads_stamp (see load_fields).
+        self._heads = None
+        self._heads_stamp = None
+
+    def _file_stamp(self):
+        stamp = []
+        for path in (self.path, self.journal_path):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+            else:
+                stamp.append((st.st_ino, st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def _is_cached(self) -> bool:
+        return self._records is not None and self._file_stamp() == self._stamp
+
+    def load(self) -> List[dict]:
+        # Commands often read the store more than once; only re-parse when
+        # the files changed underneath us.
+        stamp = self._file_stamp()
+        if self._records is None or stamp != self._stamp:
+            if os.path.exists(self.redo_path):
+                self._recover()
+            with self.lock.hold(exclusive=False), timings.phase("load"):
+                stamp = self._file_stamp()
+                tail = self._journal_tail(stamp, self._stamp) if self._records is not None else None
+                if tail is not None:
+                    # Only the journal grew: apply its new lines to the tasks already loaded.
+                    for change in tail:
+                        self._apply_cached(change)
+                    self._stamp = stamp
+                    return self._records
+                data = []
+                if os.path.exists(self.path):
+                    with timings.phase("read"):
+                        with open(self.path, "rb") as f:
+                            text = f.read()
+                    timings.count("bytes read", len(text))
+                    with timings.phase("parse"):
+                        data = [record for record in json.loads(text) if record is not None]
+                    del text
+                # Files from before task ids number their tasks in list order.
+                assign_ids(data)
+                # Records appended out of place still come back in id order.
+                data.sort(key=itemgetter("id"))
+                with timings.phase("replay journal"):
+                    self._records = assign_ids(self._replay(data))
+                timings.count("tasks loaded", len(self._records))
+                # Changes held back by write_behind still apply on top of a reload.
+                for change in self._pending:
+                    self._apply(self._records, change)
+                self._bitmaps = None
+                self._stamp = stamp
+        return self._records
+
+    def load_fields(self, fields: Iterable[str]) -> List[dict]:
+        """The tasks without their WIDE_FIELD, unless `fields` include it.
+
+        Each record is decoded from its head alone, found through the id
+        index, so the descriptions are neither read nor decoded. Falls back
+        to load() when the tasks are already in memory, the id index is out
+        of step with the files, or the descriptions are too short for
+        skipping them to pay off.
+        """
+        if WIDE_FIELD in fields or self.resident or self._pending or self._is_cached():
+            return self.load()
+        stamp = self._file_stamp()
+        if self._heads is not None and stamp == self._heads_stamp:
+            return self._heads
+        with self.lock.hold(exclusive=False):
+            stamp = self._file_stamp()
+            tail = self._journal_tail(stamp, self._heads_stamp) if self._heads is not None else None
+            if tail is not None:
+                for change in tail:
+                    if change["op"] == "put":
+                        task = {name: value for name, value in change["task"].items() if name != WIDE_FIELD}
+                        change = {"op": "put", "task": task}
+                    self._apply(self._heads, change)
+                self._heads_stamp = stamp
+                return self._heads
+            index = IdIndex(self.ids_path) if os.path.exists(self.ids_path) else None
+            if index is None or index.stamp != json.dumps(stamp):
+                if index is not None:
+                    index.close()
+                return self.load()
+            slots = index.live()
+            index.close()
+            size = sum(part[2] for part in stamp if part is not None)
+            if sum(head or length for _, _, _, length, head in slots) > (1 - HEADS_MIN_SAVING) * size:
+                del slots  # not held on to through the full load
+                return self.load()
+            with timings.phase("load heads"):
+                self._heads = self._read_heads(slots)
+            self._heads_stamp = stamp
+        timings.count("tasks loaded", len(self._heads))
+        return self._heads
+
+    def _read_heads(self, slots: List[tuple]) -> List[dict]:
+        maps = {}
+        try:
+            with timings.phase("read"):
+                for where in {slot[1] for slot in slots}:
+                    with open(self.path if where == IdIndex.SNAPSHOT else self.journal_path, "rb") as f:
+                        maps[where] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                # Only the pages holding heads are ever touched.
+                data = bytearray(b"[")
+                for _, where, offset, length, head in slots:
+                    if head:
+                        data += maps[where][offset:offset + head]
+                        data += b"},"
+                    else:
+                        data += maps[where][offset:offset + length]
+                        data += b","
+                data[-1:] = b"]"
+        finally:
+            for m in maps.values():
+                m.close()
+        timings.count("bytes read", len(data))
+        with timings.phase("parse"):
+            return json.loads(data) if slots else []
+
+    def _journal_tail(self, stamp, since) -> Optional[List[dict]]:
+        """The changes appended to the journal between file stamps `since` and `stamp`, or None to load afresh.
+
+        That is the case unless the snapshot is as it was and the journal is
+        the same file, only longer, with the old end falling on a line break.
+        """
+        if self._pending or stamp[0] != since[0] or stamp[1] is None:
+            return None
+        old = since[1]
+        if old is not None and (old[0] != stamp[1][0] or old[2] > stamp[1][2]):
+            return None
+        offset = old[2] if old else 0
+        with open(self.journal_path, "rb") as f:
+            f.seek(max(offset - 1, 0))
+            if offset and f.read(1) != b"\n":
+                return None
+            with timings.phase("read journal tail"):
+                text = f.read()
+        timings.count("bytes read", len(text))
+        changes = []
+        for line in text.splitlines():
+            try:
+                change = json.loads(line)
+            except ValueError:
+                continue
+            # Journals written before task ids address records by position.
+            if change["op"] not in ("put", "delete") or "index" in change:
+                return None
+            changes.append(change)
+        return changes
+
+    def save(self, records: List[dict]):
+        with self.lock.hold():
+            # The records given replace the store, held-back changes included.
+            self._pending = []
+            self._write_snapshot(records)
+
+    def _write_snapshot(self, records: List[dict]):
+        # Held until the new id index is in place, so no queued writer reserves the ids handed out here.
+        with self._queue_held() as (_, reserved):
+            start = reserved + 1
+            if os.path.exists(self.ids_path):
+                index = IdIndex(self.ids_path)
+                start = max(start, index.next_id)
+                index.close()
+            assign_ids(records, start)
+            chunks, spans, offset = [b"[\n"], [], 2
+            for i, record in enumerate(records):
+                data, head = encode_row(record)
+                data += SNAPSHOT_SLACK
+                spans.append((record["id"], IdIndex.SNAPSHOT, offset, len(data), head))
+                separator = b",\n" if i < len(records) - 1 else b"\n"
+                chunks += [data, separator]
+                offset += len(data) + len(separator)
+            chunks.append(b"]\n")
+            data = b"".join(chunks)
+            with timings.phase("write"):
+                write_atomic(self.path, data)
+            timings.count("bytes written", len(data))
+            # The snapshot now holds every change, so the journal is obsolete.
+            if os.path.exists(self.journal_path):
+                os.remove(self.journal_path)
+            if records is not self._records:
+                self._records = sorted(records, key=itemgetter("id"))
+                self._bitmaps = None
+            self._stamp = self._file_stamp()
+            index = IdIndex(self.ids_path)
+            index.rebuild(spans, start)
+            index.set_stamp(json.dumps(self._stamp))
+            index.close()
+
+    def count(self) -> int:
+        if self._pending or self._is_cached():
+            return len(self.load())
+        with self.lock.hold():
+            index = self._id_index()
+            count = index.count
+            index.close()
+        return count
+
+    def get(self, task_id: int) -> Optional[dict]:
+        records = self.get_many([task_id])
+        return records[0] if records else None
+
+    def get_many(self, task_ids: Iterable[int]) -> List[dict]:
+        if self._pending or self._is_cached():
+            records = [StorageBackend.get(self, task_id) for task_id in task_ids]
+            return [record for record in records if record is not None]
+        # Exclusive, since a stale id index is rebuilt on the spot.
+        with self.lock.hold():
+            index = self._id_index()
+            spans = [span for span in map(index.get, task_ids) if span is not None]
+            index.close()
+            records = []
+            files = {}
+            try:
+                for where, offset, length in spans:
+                    if where not in files:
+                        files[where] = open(self.path if where == IdIndex.SNAPSHOT else self.journal_path, "rb")
+                    files[where].seek(offset)
+                    records.append(json.loads(files[where].read(length)))
+            finally:
+                for f in files.values():
+                    f.close()
+        return records
+
+    def _stream(self) -> Iterator[dict]:
+        """Every task in id order, each read from its span in the id index as it is asked for.
+
+        Memory stays flat however large the store is. When the index is
+        out of step with the files, this falls back to load().
+        """
+        with self.lock.hold(exclusive=False):
+            if not os.path.exists(self.ids_path):
+                yield from self.load()
+                return
+            index = IdIndex(self.ids_path)
+            files = {}
+            read = 0
+            try:
+                if index.stamp != json.dumps(self._file_stamp()) or os.path.exists(self.redo_path):
+                    yield from self.load()
+                    return
+                for _, where, offset, length, _ in index.iter_live():
+                    if where not in files:
+                        files[where] = open(self.path if where == IdIndex.SNAPSHOT else self.journal_path, "rb")
+                    files[where].seek(offset)
+                    read += length
+                    yield json.loads(files[where].read(length))
+            finally:
+                timings.count("bytes read", read)
+                index.close()
+                for f in files.values():
+                    f.close()
+
+    def find(self, value: str, fields: List[str]) -> List[dict]:
+        if self._pending or not set(fields) <= set(self.indexed_fields):
+            return super().find(value, fields)
+        index = self._field_index()
+        task_ids = index.lookup(value, fields)
+        index.close()
+        return self.get_many(task_ids)
+
+    def add(self, record: dict) -> int:
+        change = {"op": "put", "task": {**record, "id": None}}
+        self.apply([change])
+        return change["task"]["id"]
+
+    def add_many(self, records: Iterable[dict]) -> int:
+        if self.write_behind:
+            # Everything ends up in memory here anyway; the next flush writes it.
+            changes = [{"op": "put", "task": {**record, "id": None}} for record in records]
+            self.apply(changes)
+            return len(changes)
+        with self.lock.hold():
+            index = self._id_index()
+            try:
+                # Until the new snapshot has landed, the slots set below point into nothing.
+                index.set_stamp(None)
+                # Held throughout, so no queued writer reserves the ids handed out here.
+                with self._queue_held() as (_, reserved):
+                    next_id, count = max(index.next_id, reserved + 1), 0
+                    with replacing(self.path) as out:
+                        end = self._copy_open_snapshot(out)
+                        for record in records:
+                            record = {**record, "id": next_id}
+                            data, head = encode_row(record)
+                            data += SNAPSHOT_SLACK
+                            prefix = b"\n" if end == 1 else b",\n"
+                            out.write(prefix + data)
+                            index.set(next_id, IdIndex.SNAPSHOT, end + len(prefix), len(data), head)
+                            end += len(prefix) + len(data)
+                            next_id += 1
+                            count += 1
+                        out.write(b"\n]\n")
+                timings.count("bytes written", end + 3)
+                # Not worth keeping every new task in memory, or the secondary
+                # indexes in step one task at a time: they are rebuilt on next use.
+                self._records = None
+                index.set_stamp(json.dumps(self._file_stamp()))
+            finally:
+                index.close()
+        return count
+
+    def _copy_open_snapshot(self, out) -> int:
+        """Copy the snapshot without its closing bracket to `out`, returning the bytes written."""
+        if not os.path.exists(self.path):
+            out.write(b"[")
+            return 1
+        with open(self.path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(-3, os.SEEK_END)
+            if f.read(3) != b"\n]\n":
+                raise ValueError(f"{self.path} is not in one-record-per-line form")
+            f.seek(0)
+            remaining = size - 3
+            while remaining:
+                chunk = f.read(min(remaining, 1 << 20))
+                out.write(chunk)
+                remaining -= len(chunk)
+        return size - 3
+
+    def update(self, task_id: int, fields: dict):
+        if self.get(task_id) is None:
+            raise KeyError(task_id)
+        # Merged into the record current at commit time, so concurrent
+        # updates to different fields of one task do not undo each other.
+        self.apply([{"op": "update", "id": task_id, "fields": fields}])
+
+    def delete(self, task_id: int):
+        if self.get(task_id) is None:
+            raise KeyError(task_id)
+        self.apply([{"op": "delete", "id": task_id}])
+
+    def update_where(self, fields: dict, search: Optional[str] = None, **filters) -> int:
+        return self._change_where(lambda r: {"op": "put", "task": {**r, **fields, "id": r["id"]}}, search, filters)
+
+    def delete_where(self, search: Optional[str] = None, **filters) -> int:
+        return self._change_where(lambda r: {"op": "delete", "id": r["id"]}, search, filters)
+
+    def _change_where(self, change: Callable[[dict], dict], search: Optional[str], filters: dict) -> int:
+        """Turn every matching task into change(task), all written at once."""
+        with self.lock.hold(), timings.phase("batch"):
+            changes = []
+            for record in self.iter_query(search, **filters):
+                c = change(record)
+                if c["op"] == "delete" or c["task"] != record:
+                    changes.append(c)
+            if self.write_behind:
+                self._hold_back(changes)
+            else:
+                self._commit(changes)
+        timings.count("tasks rewritten", len(changes))
+        return len(changes)
+
+    def apply(self, changes: List[dict]):
+        """Commit a batch of changes in one write, now or through the group-commit queue.
+
+        Changes are {"op": "put", "task": record}, {"op": "update", "id": ..., "fields": {...}}
+        or {"op": "delete", "id": ...}. Puts whose task id is None get a new
+        id, filled in in place.
+        """
+        if self.write_behind:
+            with self.lock.hold():
+                index = self._id_index()
+                self._allocate_ids(changes, max([index.next_id] + [change["task"]["id"] + 1
+                                                                  for change in self._pending
+                                                                  if change["op"] == "put"]))
+                index.close()
+                self._hold_back(changes)
+            return
+        if not self.group_commit:
+            with self.lock.hold():
+                index = self._id_index()
+                # Another process may be queueing with group_commit on the same store.
+                with self._queue_held() as (_, reserved):
+                    self._allocate_ids(changes, max(index.next_id, reserved + 1))
+                    index.close()
+                    self._commit(changes)
+            return
+        token = self._enqueue(changes)
+        with self.lock.hold():
+            batch = self._take_queue(token)
+            if batch is not None:
+                tokens, queued = batch
+                self._commit(queued)
+                self._clear_queue(tokens)
+
+    def flush(self):
+        """Write the changes held back by write_behind, in one commit."""
+        if not self._pending:
+            return
+        with self.lock.hold():
+            changes, self._pending = self._pending, []
+            self._commit(changes)
+
+    def _hold_back(self, changes: List[dict]):
+        """Apply changes to the in-memory tasks only, until the next flush()."""
+        self.load()
+        changes = self._resolve(changes)
+        for change in changes:
+            self._apply_cached(change)
+        self._pending.extend(changes)
+
+    @staticmethod
+    def _allocate_ids(changes: List[dict], next_id: int):
+        for change in changes:
+            if change["op"] == "put" and change["task"]["id"] is None:
+                change["task"]["id"] = next_id
+                next_id += 1
+
+    def _enqueue(self, changes: List[dict]) -> str:
+        if not os.path.exists(self.ids_path):
+            # Ids are handed out below from the index, so it must exist first.
+            with self.lock.hold():
+                self._id_index().close()
+        token = uuid.uuid4().hex
+        with self._queue_held() as (f, reserved):
+            index = IdIndex(self.ids_path)
+            self._allocate_ids(changes, max(index.next_id, reserved + 1))
+            index.close()
+            f.write(encode_record({"token": token, "changes": changes}) + b"\n")
+        return token
+
+    @contextmanager
+    def _queue_held(self):
+        """Hold the flock on the group-commit queue, yielding (queue file, highest id its puts reserved, or 0).
+
+        Every path that hands out new ids does so under this flock and from
+        past that id, so a queued add and a direct write never pick the same
+        one. Re-entrant within the backend, since flock on a second open of
+        the file would wait on the first.
+        """
+        if self._queue_depth == 0:
+            self._queue = open(self.queue_path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(self._queue, fcntl.LOCK_EX)
+        self._queue_depth += 1
+        try:
+            self._queue.seek(0)
+            reserved = max([0] + [change["task"]["id"] for entry in self._read_queue(self._queue)
+                                  for change in entry["changes"] if change["op"] == "put"])
+            yield self._queue, reserved
+        finally:
+            self._queue_depth -= 1
+            if self._queue_depth == 0:
+                # Closing the file drops the flock.
+                self._queue.close()
+                self._queue = None
+
+    @staticmethod
+    def _read_queue(f) -> List[dict]:
+        entries = []
+        for line in f.read().splitlines():
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # Torn by a crash mid-append; its writer never got an answer.
+                continue
+        return entries
+
+    def _take_queue(self, token: str) -> Optional[tuple]:
+        """Everything queued, if `token` is still among it; None once another writer committed it."""
+        with open(self.queue_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            entries = self._read_queue(f)
+        tokens = {entry["token"] for entry in entries}
+        if token not in tokens:
+            return None
+        return tokens, [change for entry in entries for change in entry["changes"]]
+
+    def _clear_queue(self, tokens: set):
+        with open(self.queue_path, "r+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            # Keep whatever was queued while the batch was being written.
+            rest = [entry for entry in self._read_queue(f) if entry["token"] not in tokens]
+            f.seek(0)
+            f.truncate()
+            f.write(b"".join(encode_record(entry) + b"\n" for entry in rest))
+
+    def iter_query(self, search: Optional[str] = None, sort_by: Optional[str] = None,
+                   limit: Optional[int] = None, offset: int = 0, fields: Optional[Iterable[str]] = None,
+                   **filters) -> Iterator[dict]:
+        if (fields is None and not search and sort_by is None and not has_filters(filters)
+                and not self._pending and not self._is_cached()):
+            # Everything in id order (export, csv backups): read a record at a time rather than load them all.
+            return iter_records(self._stream(), limit=limit, offset=offset)
+        candidates = None
+        if search and not self._pending:
+            index = self._search_index()
+            with timings.phase("search index"):
+                candidates = index.candidates(search)
+            index.close()
+        if candidates is not None and fields is not None and not self.resident and not self._is_cached():
+            # Only the candidates' descriptions are needed for the final check, so read just those.
+            return iter_records(self.get_many(candidates), search, sort_by, limit, offset, **filters)
+        records = self.load() if fields is None else self.load_fields(query_fields(fields, search))
+        positions = None
+        if self.resident and has_filters(filters):
+            if self._bitmaps is None:
+                self._bitmaps = BitmapIndex(records)
+            positions = self._bitmaps.select(**filters)
+        if candidates is not None:
+            found = [pos for pos in (record_position(records, task_id) for task_id in candidates)
+                     if pos is not None]
+            positions = found if positions is None else sorted(set(positions).intersection(found))
+        if positions is not None:
+            records = [records[pos] for pos in positions]
+        # Index hits are only candidates; the final check runs on those alone.
+        return iter_records(records, search, sort_by, limit, offset, **filters)
+
+    def counts(self, today: str) -> dict:
+        if self._pending:
+            return count_records(self.load(), today)
+        index = self._count_index()
+        rows = index.rows()
+        index.close()
+        return summarize_counts(rows, today)
+
+    def recount(self, today: str) -> dict:
+        self.flush()
+        with self.lock.hold():
+            index = CountIndex(self.count_index_path)
+            index.rebuild(self.load())
+            index.set_stamp(json.dumps(self._file_stamp()))
+            rows = index.rows()
+            index.close()
+        return summarize_counts(rows, today)
+
+    def roll_over(self, today: str, advance: Callable[[dict], str]) -> int:
+        with self.lock.hold(), timings.phase("rollover"):
+            stale = [record["id"] for record in self.load_fields(("recurring", "due_date"))
+                     if record.get("recurring") and record.get("due_date") and record["due_date"] <= today]
+            changes = []
+            # Usually none are stale; only those are read in full.
+            for record in self.get_many(stale) if stale else []:
+                due_date = advance(record)
+                if due_date != record["due_date"]:
+                    changes.append({"op": "put", "task": {**record, "due_date": due_date}})
+            if self.write_behind:
+                self._hold_back(changes)
+            else:
+                self._commit(changes)
+        timings.count("tasks rewritten", len(changes))
+        return len(changes)
+
+    def compact(self):
+        self.flush()
+        with self.lock.hold():
+            # Same tasks, new layout: secondary indexes that were fresh stay valid.
+            indexes = self._secondary_indexes()
+            self.save(self.load())
+            for index in indexes:
+                index.set_stamp(json.dumps(self._file_stamp()))
+                index.close()
+
+    def needs_compaction(self) -> bool:
+        if os.path.exists(self.journal_path):
+            waste = os.path.getsize(self.journal_path)
+        elif os.path.exists(self.ids_path):
+            index = IdIndex(self.ids_path)
+            waste = index.garbage
+            index.close()
+        else:
+            return False
+        snapshot_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        return waste > max(COMPACT_MIN_BYTES, snapshot_size * COMPACT_RATIO)
+
+    def _commit(self, changes: List[dict]):
+        """Write changes to the store; the caller holds the lock."""
+        if not changes:
+            return
+        secondary = self._secondary_indexes()
+        index = self._id_index()
+        changes = self._resolve(changes)
+        cached = self._is_cached()
+        # Until the write below has landed, the spans may not match the files.
+        index.set_stamp(None)
+        with timings.phase("write"):
+            if self.journal:
+                self._append(index, changes)
+            else:
+                self._write_in_place(index, changes)
+        if cached:
+            for change in changes:
+                self._apply_cached(change)
+            self._stamp = self._file_stamp()
+        else:
+            self._records = None
+        stamp = json.dumps(self._file_stamp())
+        index.set_stamp(stamp)
+        index.close()
+        with timings.phase("update indexes"):
+            for other in secondary:
+                other.apply(changes)
+                other.set_stamp(stamp)
+                other.close()
+        if self.needs_compaction():
+            self.compact()
+
+    def _resolve(self, changes: List[dict]) -> List[dict]:
+        """Turn "update" changes into puts of the whole record, as of the changes before them."""
+        pending = {}
+        resolved = []
+        for change in changes:
+            if change["op"] == "update":
+                task_id = change["id"]
+                record = pending[task_id] if task_id in pending else self.get(task_id)
+                if record is None:
+                    # Deleted while the update waited for the lock.
+                    continue
+                change = {"op": "put", "task": {**record, **change["fields"], "id": task_id}}
+            if change["op"] == "put":
+                pending[change["task"]["id"]] = change["task"]
+            else:
+                pending[change["id"]] = None
+            resolved.append(change)
+        return resolved
+
+    def _id_index(self) -> IdIndex:
+        """Open the id index, rebuilding it if the store changed behind its back.
+
+        A rebuild rewrites the snapshot, which also brings files from before
+        task ids (or from journal mode, when journaling is off) up to date.
+        """
+        if os.path.exists(self.redo_path):
+            self._recover()
+        index = IdIndex(self.ids_path)
+        stale = index.stamp != json.dumps(self._file_stamp())
+        if stale or (not self.journal and os.path.exists(self.journal_path)):
+            index.close()
+            self.compact()
+            index = IdIndex(self.ids_path)
+        return index
+
+    def _sidecar(self, path: str, open_index: Callable, fresh_only: bool):
+        """Open a secondary index, rebuilding it if the store changed behind its back.
+
+        With fresh_only=True, return None instead of creating or rebuilding it.
+        """
+        if fresh_only and not os.path.exists(path):
+            return None
+        index = open_index()
+        stamp = json.dumps(self._file_stamp())
+        if index.stamp != stamp:
+            if fresh_only:
+                index.close()
+                return None
+            records = self.load()
+            with timings.phase("build " + os.path.basename(path)):
+                index.rebuild(records)
+            index.set_stamp(stamp)
+        return index
+
+    def _search_index(self, fresh_only: bool = False) -> Optional[TrigramIndex]:
+        return self._sidecar(self.index_path, lambda: TrigramIndex(self.index_path), fresh_only)
+
+    def _field_index(self, fresh_only: bool = False) -> Optional[FieldIndex]:
+        # A writer that only keeps the index in step uses the fields stored in it.
+        fields = None if fresh_only else self.indexed_fields
+        return self._sidecar(self.field_index_path, lambda: FieldIndex(self.field_index_path, fields), fresh_only)
+
+    def _count_index(self, fresh_only: bool = False) -> Optional[CountIndex]:
+        return self._sidecar(self.count_index_path, lambda: CountIndex(self.count_index_path), fresh_only)
+
+    def _secondary_indexes(self) -> list:
+        """The trigram, field and count indexes that are currently fresh, to be kept in step with a write."""
+        indexes = (self._search_index(fresh_only=True), self._field_index(fresh_only=True),
+                   self._count_index(fresh_only=True))
+        return [index for index in indexes if index is not None]
+
+    def _apply_cached(self, change: dict):
+        """Apply a change to the cached records and keep the bitmaps in step."""
+        if self._bitmaps is not None:
+            task_id = change["task"]["id"] if change["op"] == "put" else change["id"]
+            pos = record_position(self._records, task_id)
+            if change["op"] == "put":
+                if pos is None:
+                    self._bitmaps.add(change["task"])
+                else:
+                    self._bitmaps.replace(pos, self._records[pos], change["task"])
+            elif pos is not None:
+                self._bitmaps.delete(pos)
+        self._apply(self._records, change)
+
+    @staticmethod
+    def _apply(data: List[dict], change: dict):
+        op = change["op"]
+        if op == "put":
+            task = change["task"]
+            pos = record_position(data, task["id"])
+            if pos is None:
+                data.insert(bisect.bisect_left(data, task["id"], key=itemgetter("id")), task)
+            else:
+                data[pos] = task
+        elif op == "delete" and "id" in change:
+            pos = record_position(data, change["id"])
+            if pos is not None:
+                data.pop(pos)
+        # Journals written before task ids address records by position.
+        elif op == "add":
+            data.append(change["task"])
+        elif op == "update":
+            data[change["index"]].update(change["fields"])
+        elif op == "delete":
+            data.pop(change["index"])
+
+    def _replay(self, data: List[dict]) -> List[dict]:
+        if not os.path.exists(self.journal_path):
+            return data
+        with open(self.journal_path, "r") as f:
+            for line in f:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    # A torn record left behind by a crash mid-append.
+                    continue
+                self._apply(data, change)
+        return data
+
+    def _recover(self):
+        """Finish an in-place write that a crash interrupted, by rewriting the snapshot."""
+        with self.lock.hold():
+            # Whoever held the lock before us may have finished or recovered it already.
+            if not os.path.exists(self.redo_path):
+                return
+            with open(self.redo_path, "rb") as f:
+                lines = f.read().splitlines()
+            try:
+                changes = [json.loads(line) for line in lines]
+            except ValueError:
+                # Torn while the log itself was written, so the snapshot was not touched yet.
+                changes = []
+            data = []
+            if os.path.exists(self.path):
+                with open(self.path, "rb") as f:
+                    rows = f.read().split(b"\n")
+                # Skip "[" and whatever the interrupted write left unreadable; every
+                # record it was touching is in the log.
+                for row in rows[1:]:
+                    row = row.strip().rstrip(b",")
+                    try:
+                        record = json.loads(row)
+                    except ValueError:
+                        continue
+                    if isinstance(record, dict):
+                        data.append(record)
+            data.sort(key=itemgetter("id"))
+            for change in changes:
+                self._apply(data, change)
+            self._write_snapshot(self._replay(data))
+            os.remove(self.redo_path)
+
+    def _write_in_place(self, index: IdIndex, changes: List[dict]):
+        # Log the changes before touching the snapshot, so a torn write can be redone.
+        with open(self.redo_path, "wb") as f:
+            f.write(b"".join(encode_record(change) + b"\n" for change in changes))
+            f.flush()
+            os.fsync(f.fileno())
+        self._patch(index, changes)
+        os.remove(self.redo_path)
+
+    def _patch(self, index: IdIndex, changes: List[dict]):
+        with open(self.path, "r+b") as f:
+            for change in changes:
+                if change["op"] == "delete":
+                    span = index.get(change["id"])
+                    if span is not None:
+                        self._tombstone(f, index, span)
+                        index.clear(change["id"])
+                    continue
+                task = change["task"]
+                data, head = encode_row(task)
+                span = index.get(task["id"])
+                if span is not None and len(data) <= span[2]:
+                    f.seek(span[1])
+                    f.write(data.ljust(span[2]))
+                    index.set(task["id"], *span, head)
+                    timings.count("bytes written", span[2])
+                    continue
+                if span is not None:
+                    self._tombstone(f, index, span)
+                f.seek(-3, os.SEEK_END)
+                if f.read(3) != b"\n]\n":
+                    raise ValueError(f"{self.path} is not in one-record-per-line form")
+                end = f.tell()
+                # "[\n]\n" is the empty store; anything longer has a record to follow.
+                prefix = b"\n" if end == 4 else b",\n"
+                data += SNAPSHOT_SLACK
+                f.seek(end - 3)
+                f.write(prefix + data + b"\n]\n")
+                timings.count("bytes written", len(prefix) + len(data) + 3)
+                index.set(task["id"], IdIndex.SNAPSHOT, end - 3 + len(prefix), len(data), head)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _tombstone(f, index: IdIndex, span: tuple):
+        _, offset, length = span
+        f.seek(offset)
+        f.write(b"null".ljust(length))
+        index.add_garbage(length)
+
+    def _append(self, index: IdIndex, changes: List[dict]):
+        put_prefix = b'{"op":"put","task":'
+        with open(self.journal_path, "a+b") as f:
+            end = f.seek(0, os.SEEK_END)
+            chunks = []
+            if end:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # Terminate a torn record so it cannot swallow these.
+                    chunks.append(b"\n")
+                    end += 1
+            for change in changes:
+                if change["op"] == "put":
+                    data, head = encode_row(change["task"])
+                    index.set(change["task"]["id"], IdIndex.JOURNAL, end + len(put_prefix), len(data), head)
+                    line = put_prefix + data + b"}\n"
+                else:
+                    index.clear(change["id"])
+                    line = encode_record(change) + b"\n"
+                chunks.append(line)
+                end += len(line)
+            data = b"".join(chunks)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        timings.count("bytes written", len(data))
+
+
+SQLITE_COLUMNS = ("title", "description", "priority", "due_date", "status",
+                  "recurring", "assigned_to", "created_by")
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT,
+    priority TEXT,
+    due_date TEXT,
+    status TEXT,
+    recurring TEXT,
+    assigned_to TEXT,
+    created_by TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status_nocase ON tasks(status COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_tasks_priority_nocase ON tasks(priority COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks(due_date);
+CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks(assigned_to);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_by ON tasks(created_by);
+CREATE TABLE IF NOT EXISTS task_tags (
+    task_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    tag TEXT NOT NULL,
+    PRIMARY KEY (task_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_task_tags_tag ON task_tags(tag);
+-- The highest id ever deleted, so ids are never handed out twice.
+CREATE TABLE IF NOT EXISTS task_id_seq (
+    last_id INTEGER NOT NULL
+);
+INSERT INTO task_id_seq (last_id) SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM task_id_seq);
+CREATE TRIGGER IF NOT EXISTS tasks_id_seq AFTER DELETE ON tasks BEGIN
+    UPDATE task_id_seq SET last_id = max(last_id, old.id);
+END;
+CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+    title, description, status, content='tasks', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+    INSERT INTO tasks_fts (rowid, title, description, status)
+    VALUES (new.id, new.title, new.description, coalesce(new.status, 'Pending'));
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description, status)
+    VALUES ('delete', old.id, old.title, old.description, coalesce(old.status, 'Pending'));
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description, status ON tasks BEGIN
+    INSERT INTO tasks_fts (tasks_fts, rowid, title, description, status)
+    VALUES ('delete', old.id, old.title, old.description, coalesce(old.status, 'Pending'));
+    INSERT INTO tasks_fts (rowid, title, description, status)
+    VALUES (new.id, new.title, new.description, coalesce(new.status, 'Pending'));
+END;
+"""
+
+
+def sqlite_count_keys(row: str, source: str = "") -> str:
+    """SQL yielding the count_keys() of `row` (new, old, or tasks with source="FROM tasks")."""
+    status = f"coalesce({row}.status, 'Pending')"
+    selects = [f"SELECT 'all' AS dimension, '' AS value, {status} AS status {source}"]
+    for dimension in COUNT_DIMENSIONS:
+        selects.append(f"SELECT '{dimension}', {row}.{dimension}, {status} {source}"
+                       f" WHERE coalesce({row}.{dimension}, '') != ''")
+    return " UNION ALL ".join(selects)
+
+
+# Report counters, kept in step with the tasks table by triggers.
+SQLITE_COUNT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task_counts (
+    dimension TEXT NOT NULL,
+    value TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (dimension, value, status)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS tasks_count_insert AFTER INSERT ON tasks BEGIN
+    {count_new}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_count_delete AFTER DELETE ON tasks BEGIN
+    {uncount_old}
+END;
+CREATE TRIGGER IF NOT EXISTS tasks_count_update AFTER UPDATE OF status, {dimensions} ON tasks BEGIN
+    {uncount_old}
+    {count_new}
+END;
+""".format(
+    dimensions=", ".join(COUNT_DIMENSIONS),
+    count_new="INSERT INTO task_counts (dimension, value, status, n) SELECT dimension, value, status, 1 FROM ("
+              + sqlite_count_keys("new") + ") WHERE true"
+              " ON CONFLICT (dimension, value, status) DO UPDATE SET n = n + 1;",
+    uncount_old="UPDATE task_counts SET n = n - 1 WHERE (dimension, value, status) IN ("
+                + sqlite_count_keys("old") + ");",
+)
+
+SQLITE_RECOUNT = (
+    "INSERT INTO task_counts (dimension, value, status, n) SELECT dimension, value, status, COUNT(*) FROM ("
+    + sqlite_count_keys("tasks", "FROM tasks") + ") GROUP BY dimension, value, status"
+)
+
+# Bumped whenever an existing database needs a one-off migration on open.
+SQLITE_SCHEMA_VERSION = 3
+
+SQLITE_TAGS = (
+    "(SELECT json_group_array(tag) FROM "
+    "(SELECT tag FROM task_tags WHERE task_id = tasks.id ORDER BY position)) AS tags"
+)
+
+SQLITE_SELECT = "SELECT id, " + ", ".join(SQLITE_COLUMNS) + ", " + SQLITE_TAGS + " FROM tasks"
+
+SQLITE_SORTS = {
+    "due": "CASE WHEN due_date IS NULL OR due_date = '' THEN '9999-99-99' ELSE due_date END, id",
+    "priority": "CASE priority WHEN 'high' THEN 1 WHEN 'medium' THEN 2 WHEN 'low' THEN 3 ELSE 99 END, id",
+}
+
+
+class SqliteBackend(StorageBackend):
+    """Tasks in a SQLite database with indexes on status, priority, due_date and tags.
+
+    Filters, sorts and single-row changes run inside the engine, so commands
+    only materialize the rows they actually touch.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Wait for other writers instead of failing, and let readers run
+        # alongside a writer.
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SQLITE_SCHEMA + SQLITE_COUNT_SCHEMA)
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SQLITE_SCHEMA_VERSION:
+            with self.conn:
+                if version < 1:
+                    # Databases from before the search index existed.
+                    self.conn.execute(
+                        "INSERT INTO tasks_fts (rowid, title, description, status) "
+                        "SELECT id, title, description, coalesce(status, 'Pending') FROM tasks"
+                    )
+                # Superseded by the case-insensitive indexes used for filters.
+                self.conn.execute("DROP INDEX IF EXISTS idx_tasks_status")
+                self.conn.execute("DROP INDEX IF EXISTS idx_tasks_priority")
+                if version < 3:
+                    # Databases from before the report counters existed.
+                    self.conn.execute("DELETE FROM task_counts")
+                    self.conn.execute(SQLITE_RECOUNT)
+                self.conn.execute("PRAGMA user_version = %d" % SQLITE_SCHEMA_VERSION)
+        # SQLite's own lower() only folds ASCII; match Python's str.lower.
+        self.conn.create_function("py_lower", 1, lambda s: (s or "").lower(), deterministic=True)
+
+    def _to_record(self, row) -> dict:
+        record = {"id": row[0], **dict(zip(SQLITE_COLUMNS, row[1:-1]))}
+        record["tags"] = json.loads(row[-1])
+        return record
+
+    def _insert(self, record: dict) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO tasks (id, " + ", ".join(SQLITE_COLUMNS) + ") VALUES ("
+            "coalesce(?, (SELECT max(coalesce((SELECT max(id) FROM tasks), 0), last_id) + 1 FROM task_id_seq)), "
+            + ", ".join("?" * len(SQLITE_COLUMNS)) + ")",
+            [record.get("id")] + [record.get(c) for c in SQLITE_COLUMNS],
+        )
+        self.conn.executemany(
+            "INSERT INTO task_tags (task_id, position, tag) VALUES (?, ?, ?)",
+            [(cur.lastrowid, i, tag) for i, tag in enumerate(record.get("tags") or [])],
+        )
+        return cur.lastrowid
+
+    def load(self) -> List[dict]:
+        with timings.phase("load"):
+            records = [self._to_record(row) for row in self.conn.execute(SQLITE_SELECT + " ORDER BY id")]
+        timings.count("tasks loaded", len(records))
+        return records
+
+    def save(self, records: List[dict]):
+        with self.conn, timings.phase("write"):
+            self.conn.execute("DELETE FROM task_tags")
+            self.conn.execute("DELETE FROM tasks")
+            for record in records:
+                self._insert(record)
+
+    def count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def get(self, task_id: int) -> Optional[dict]:
+        row = self.conn.execute(SQLITE_SELECT + " WHERE id = ?", (task_id,)).fetchone()
+        return self._to_record(row) if row else None
+
+    def get_many(self, task_ids: Iterable[int]) -> List[dict]:
+        task_ids = list(task_ids)
+        rows = self.conn.execute(
+            SQLITE_SELECT + " WHERE id IN (SELECT value FROM json_each(?))", (json.dumps(task_ids),)
+        )
+        by_id = {row[0]: self._to_record(row) for row in rows}
+        return [by_id[task_id] for task_id in task_ids if task_id in by_id]
+
+    def find(self, value: str, fields: List[str]) -> List[dict]:
+        for field in fields:
+            if field not in SQLITE_COLUMNS:
+                raise ValueError(f"Unknown task field: {field}")
+        # One indexed lookup per field, merged by the OR optimization.
+        sql = SQLITE_SELECT + " WHERE " + " OR ".join(field + " = ?" for field in fields) + " ORDER BY id"
+        return [self._to_record(row) for row in self.conn.execute(sql, [value] * len(fields))]
+
+    def add(self, record: dict) -> int:
+        with self.conn:
+            return self._insert({**record, "id": None})
+
+    def add_many(self, records: Iterable[dict]) -> int:
+        count = 0
+        with self.conn:
+            for record in records:
+                self._insert({**record, "id": None})
+                count += 1
+        return count
+
+    def update(self, task_id: int, fields: dict):
+        if self.get(task_id) is None:
+            raise KeyError(task_id)
+        with self.conn:
+            self._update_row(task_id, fields)
+
+    def _update_row(self, task_id: int, fields: dict):
+        columns = [c for c in fields if c in SQLITE_COLUMNS]
+        if columns:
+            self.conn.execute(
+                "UPDATE tasks SET " + ", ".join(c + " = ?" for c in columns) + " WHERE id = ?",
+                [fields[c] for c in columns] + [task_id],
+            )
+        if "tags" in fields:
+            self.conn.execute("DELETE FROM task_tags WHERE task_id = ?", (task_id,))
+            self.conn.executemany(
+                "INSERT INTO task_tags (task_id, position, tag) VALUES (?, ?, ?)",
+                [(task_id, i, tag) for i, tag in enumerate(fields["tags"])],
+            )
+
+    def delete(self, task_id: int):
+        with self.conn:
+            self.conn.execute("DELETE FROM task_tags WHERE task_id = ?", (task_id,))
+            if not self.conn.execute("DELETE FROM tasks WHERE id = ?", (task_id,)).rowcount:
+                raise KeyError(task_id)
+
+    def load_fields(self, fields: Iterable[str]) -> List[dict]:
+        return list(self.iter_query(fields=fields))
+
+    def iter_query(self, search: Optional[str] = None, sort_by: Optional[str] = None,
+                   limit: Optional[int] = None, offset: int = 0, fields: Optional[Iterable[str]] = None,
+                   tags: Optional[List[str]] = None, tag_mode: str = "all",
+                   priority: Optional[str] = None, status: Optional[str] = None,
+                   due_after: Optional[str] = None, due_before: Optional[str] = None) -> Iterator[dict]:
+        where, params = self._where(search, tags, tag_mode, priority, status, due_after, due_before)
+        if fields is None:
+            select, to_record = SQLITE_SELECT, self._to_record
+        else:
+            # Only the columns asked for are read; the tags lookup is skipped unless they are wanted.
+            fields = set(fields)
+            columns = ["id"] + [c for c in SQLITE_COLUMNS if c in fields] + (["tags"] if "tags" in fields else [])
+            select = "SELECT " + ", ".join(SQLITE_TAGS if c == "tags" else c for c in columns) + " FROM tasks"
+            to_record = lambda row: self._to_projection(columns, row)
+        sql = select + where + " ORDER BY " + SQLITE_SORTS.get(sort_by, "id")
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, offset])
+        # SQLite filters and sorts as the rows are fetched, so the query is timed as one step.
+        return timings.timed("query", (to_record(row) for row in self.conn.execute(sql, params)),
+                             "tasks matched")
+
+    @staticmethod
+    def _to_projection(columns: List[str], row) -> dict:
+        record = dict(zip(columns, row))
+        if "tags" in record:
+            record["tags"] = json.loads(record["tags"])
+        return record
+
+    @staticmethod
+    def _where(search: Optional[str] = None, tags: Optional[List[str]] = None, tag_mode: str = "all",
+               priority: Optional[str] = None, status: Optional[str] = None,
+               due_after: Optional[str] = None, due_before: Optional[str] = None) -> tuple:
+        """The WHERE clause (or "") and its parameters for the query() filters."""
+        # SQLite's planner picks the most selective index from these itself.
+        where, params = [], []
+        if tags:
+            placeholders = ", ".join("?" * len(tags))
+            if tag_mode == "any":
+                where.append("id IN (SELECT task_id FROM task_tags WHERE tag IN (%s))" % placeholders)
+                params.extend(tags)
+            else:
+                where.append(
+                    "id IN (SELECT task_id FROM task_tags WHERE tag IN (%s)"
+                    " GROUP BY task_id HAVING COUNT(DISTINCT tag) = ?)" % placeholders
+                )
+                params.extend([*tags, len(set(tags))])
+        if priority:
+            where.append("priority = ? COLLATE NOCASE")
+            params.append(priority)
+        if status:
+            where.append("coalesce(status, 'Pending') = ? COLLATE NOCASE" if status.lower() == "pending"
+                         else "status = ? COLLATE NOCASE")
+            params.append(status)
+        if due_after:
+            where.append("due_date > ?")
+            params.append(due_after)
+        if due_before:
+            where.append("due_date < ? AND due_date != ''")
+            params.append(due_before)
+        if search:
+            if len(search) >= 3 and search.isascii():
+                # The trigram index narrows the candidates; the instr() check
+                # below keeps Python's case folding as the final word.
+                where.append("id IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH ?)")
+                params.append('"' + search.replace('"', '""') + '"')
+            where.append(
+                "(instr(py_lower(title), ?) > 0 OR instr(py_lower(description), ?) > 0"
+                " OR instr(py_lower(coalesce(status, 'Pending')), ?) > 0)"
+            )
+            params.extend([search.lower()] * 3)
+        return (" WHERE " + " AND ".join(where) if where else ""), params
+
+    def update_where(self, fields: dict, search: Optional[str] = None, **filters) -> int:
+        with self.conn:
+            task_ids = [r["id"] for r in self.iter_query(search, **filters) if {**r, **fields} != r]
+            for task_id in task_ids:
+                self._update_row(task_id, fields)
+        return len(task_ids)
+
+    def delete_where(self, search: Optional[str] = None, **filters) -> int:
+        where, params = self._where(search, **filters)
+        with self.conn:
+            task_ids = [(row[0],) for row in self.conn.execute("SELECT id FROM tasks" + where, params)]
+            self.conn.executemany("DELETE FROM task_tags WHERE task_id = ?", task_ids)
+            self.conn.executemany("DELETE FROM tasks WHERE id = ?", task_ids)
+        return len(task_ids)
+
+    def counts(self, today: str) -> dict:
+        return summarize_counts(self.conn.execute("SELECT dimension, value, status, n FROM task_counts WHERE n != 0"),
+                                today)
+
+    def recount(self, today: str) -> dict:
+        with self.conn:
+            self.conn.execute("DELETE FROM task_counts")
+            self.conn.execute(SQLITE_RECOUNT)
+        return self.counts(today)
+
+    def roll_over(self, today: str, advance: Callable[[dict], str]) -> int:
+        with timings.phase("rollover"):
+            rows = self.conn.execute(
+                SQLITE_SELECT + " WHERE due_date != '' AND due_date <= ?"
+                " AND recurring IS NOT NULL AND recurring != ''",
+                (today,),
+            ).fetchall()
+            changes = []
+            for row in rows:
+                record = self._to_record(row)
+                due_date = advance(record)
+                if due_date != record["due_date"]:
+                    changes.append((due_date, row[0]))
+            if changes:
+                with self.conn:
+                    self.conn.executemany("UPDATE tasks SET due_date = ? WHERE id = ?", changes)
+        timings.count("tasks rewritten", len(changes))
+        return len(changes)
+
+    def compact(self):
+        self.conn.execute("ANALYZE")
+        self.conn.execute("VACUUM")
+
+
+def store_stamp(data_file: str) -> list:
+    """[path, mtime, size] of each file the store for `data_file` can live in, whichever TASKS_STORAGE is in use.
+
+    Only stats the files, so it is a cheap way to tell whether the store changed.
+    """
+    base = os.path.splitext(data_file)[0]
+    stamp = []
+    for path in (data_file, data_file + ".journal", base + ".db", base + ".db-wal"):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        stamp.append([path, st.st_mtime_ns, st.st_size])
+    return stamp
+
+
+def get_backend(data_file: str, indexed_fields: Iterable[str] = ()) -> StorageBackend:
+    """Pick the backend for `data_file` from the TASKS_STORAGE environment variable.
+
+    "json" (the default) edits the JSON file in place, "journal" appends
+    changes to a journal next to it, and "sqlite" keeps the tasks in a
+    database named after the JSON file (tasks.json -> tasks.db).
+    TASKS_GROUP_COMMIT=1 lets concurrent JSON writers share one write.
+    `indexed_fields` get a FieldIndex next to a JSON store for find().
+    JSON stores are served by the task daemon instead whenever one is
+    running for `data_file`, unless TASKS_DAEMON=0.
+    """
+    mode = os.environ.get("TASKS_STORAGE", "json")
+    if mode == "sqlite":
+        return SqliteBackend(os.path.splitext(data_file)[0] + ".db")
+    if os.environ.get("TASKS_DAEMON") != "0":
+        client = connect(data_file)
+        if client is not None:
+            return DaemonBackend(client)
+    group_commit = os.environ.get("TASKS_GROUP_COMMIT") == "1"
+    return JsonFileBackend(data_file, journal=(mode == "journal"), group_commit=group_commit,
+                           indexed_fields=indexed_fields)
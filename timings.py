@@ -0,0 +1,154 @@
+"""Per-phase wall times and counters, off unless asked for.
+
+    python app.py --timings list --search report
+    TASKS_TRACE=trace.json python app.py list
+
+--timings prints to stderr, once the command is done, how long each
+phase took and the counters: tasks loaded, matched and rewritten, bytes
+read and written. Phases nest, so "parse" shows up under "load".
+TASKS_TRACE writes the same phases as a Chrome trace, which
+chrome://tracing and ui.perfetto.dev open.
+
+When both are off, phase() hands back one shared do-nothing context,
+count() returns at once and timed() returns its iterable untouched.
+Call sites only pay for a function call, and none of them are per task.
+"""
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import Iterable, Iterator, Optional
+
+TIMINGS_FLAG = "--timings"
+TRACE_ENV = "TASKS_TRACE"
+
+enabled = False
+# (name, depth, start ns, duration ns) of every phase, in the order they ended.
+phases = []
+counters = Counter()
+_depth = 0
+_NOTHING = nullcontext()
+
+
+class Phase:
+    __slots__ = ("name", "depth", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        global _depth
+        self.depth = _depth
+        _depth += 1
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc_info):
+        global _depth
+        phases.append((self.name, self.depth, self.start, time.perf_counter_ns() - self.start))
+        _depth -= 1
+
+
+def phase(name: str):
+    """Context manager timing one phase of the command."""
+    if not enabled:
+        return _NOTHING
+    return Phase(name)
+
+
+def count(name: str, n: int = 1):
+    if enabled:
+        counters[name] += n
+
+
+def timed(name: str, items: Iterable, counter: Optional[str] = None) -> Iterable:
+    """Time a lazy step: the time spent producing `items`, counting them under `counter`.
+
+    Consumers pull items one at a time, so this phase's time is the sum of
+    those pulls, and it sits under whichever phase did the first one.
+    """
+    if not enabled:
+        return items
+    return _timed(name, items, counter)
+
+
+def _timed(name: str, items: Iterable, counter: Optional[str]) -> Iterator:
+    items = iter(items)
+    first = depth = None
+    busy = n = 0
+    try:
+        while True:
+            started = time.perf_counter_ns()
+            if first is None:
+                first, depth = started, _depth
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+            finally:
+                busy += time.perf_counter_ns() - started
+            n += 1
+            yield item
+    finally:
+        if first is not None:
+            phases.append((name, depth, first, busy))
+        if counter:
+            counters[counter] += n
+
+
+def summary(command: str) -> str:
+    """Total time and number of runs of each phase, nested in the order they started."""
+    totals = {}
+    for name, depth, start, duration in phases:
+        total = totals.setdefault((depth, name), [start, 0, 0])
+        total[0] = min(total[0], start)
+        total[1] += duration
+        total[2] += 1
+    lines = [f"Timings: {command}", f"{'ms':>10} {'calls':>6}  phase"]
+    for (depth, name), (_, duration, calls) in sorted(totals.items(), key=lambda item: item[1][0]):
+        lines.append(f"{duration / 1e6:10.1f} {calls:6}  {'  ' * depth}{name}")
+    for name, n in sorted(counters.items()):
+        if name.startswith("bytes"):
+            lines.append(f"{n / 2 ** 20:10.2f} {'MB':>6}  {name}")
+        else:
+            lines.append(f"{n:10} {'':6}  {name}")
+    return "\n".join(lines)
+
+
+def chrome_trace() -> dict:
+    """The phases as Chrome trace events; timed() steps span only the time they were busy."""
+    if not phases:
+        return {"traceEvents": []}
+    origin = min(start for _, _, start, _ in phases)
+    end = max(start + duration for _, _, start, duration in phases)
+    pid = os.getpid()
+    events = [{"name": name, "ph": "X", "ts": (start - origin) / 1000, "dur": duration / 1000,
+               "pid": pid, "tid": 0, "args": {"depth": depth}}
+              for name, depth, start, duration in phases]
+    if counters:
+        events.append({"name": "counters", "ph": "C", "ts": (end - origin) / 1000, "pid": pid, "tid": 0,
+                       "args": dict(counters)})
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def run(app):
+    """Run a typer app with timing on, then print the summary and/or write the trace."""
+    global enabled
+    show = TIMINGS_FLAG in sys.argv
+    if show:
+        sys.argv = [arg for arg in sys.argv if arg != TIMINGS_FLAG]
+    trace_path = os.environ.get(TRACE_ENV)
+    phases.clear()
+    counters.clear()
+    enabled = True
+    try:
+        with phase("command"):
+            app()
+    finally:
+        enabled = False
+        if show:
+            print(summary(" ".join(sys.argv)), file=sys.stderr)
+        if trace_path:
+            with open(trace_path, "w") as f:
+                json.dump(chrome_trace(), f)